@@ -1,62 +1,299 @@
 const express = require('express')
-const morgan = require('morgan');
 const bodyParser = require('body-parser');
 const cors = require('cors')
 const helmet = require('helmet')
 const basicAuth = require('basic-auth')
 const passwordHash = require('password-hash');
-const pgp = require('pg-promise')(/* init options */)
-const winston = require('winston')
-const util = require('util');
+const CredentialsCache = require('./credentials_cache');
+const events = require('./events');
+const jobs = require('./jobs');
+const metrics = require('./metrics');
+const Replicas = require('./replicas');
+const statements = require('./statements');
+const log = require('./log');
+
+const pgp = require('pg-promise')({
+    extend(obj) {
+        // like func, timed into the db_function_duration_seconds histogram
+        obj.callFunction = (name, values, qrm) => {
+            return metrics.timeDbFunction(name, obj.func(name, values, qrm));
+        };
+        // the same for one of statements.js, prepared once per connection
+        obj.callStatement = (statement, values, qrm) => {
+            return metrics.timeDbFunction(
+                statement.name,
+                obj.query(statement, values, qrm)
+            );
+        };
+    },
+    error(error) {
+        metrics.countDbError(error);
+    }
+});
 
 const app = express()
-const db = pgp(process.env.DATABASE_URL)
-app.use(morgan('dev'));
+const connect = (connectionString, max) => pgp({
+    connectionString,
+    max,
+    idleTimeoutMillis: parseInt(process.env.PG_IDLE_TIMEOUT || 30000),
+    connectionTimeoutMillis: parseInt(process.env.PG_CONNECTION_TIMEOUT || 5000)
+});
+// one pool per process: with cluster.js the database sees
+// WEB_CONCURRENCY * PG_POOL_MAX connections at most
+const db = connect(process.env.DATABASE_URL, parseInt(process.env.PG_POOL_MAX || 10));
+// and each of the comma separated DATABASE_REPLICA_URLS, if any, one of
+// PG_REPLICA_POOL_MAX. Users read from the primary for READ_YOUR_WRITES
+// milliseconds after they write, see writes below.
+const replicas = new Replicas(
+    db,
+    (process.env.DATABASE_REPLICA_URLS || '')
+        .split(',')
+        .map(url => url.trim())
+        .filter(url => url)
+        .map(url => connect(url, parseInt(
+            process.env.PG_REPLICA_POOL_MAX || process.env.PG_POOL_MAX || 10
+        ))),
+    parseInt(process.env.READ_YOUR_WRITES || 5000),
+    parseInt(process.env.READ_YOUR_WRITES_USERS || 100000)
+);
+if (db.$pool) {
+    const pools = {primary: db.$pool};
+    replicas.replicas.forEach((replica, i) => {
+        pools[`replica_${i}`] = replica.$pool;
+    });
+    metrics.watchPools(pools);
+}
+// logger for the routes called on every turn of the game
+const hotLog = log.sampled(parseFloat(process.env.LOG_SAMPLE_RATE || 1));
+
+// requests being served, waited for by shutdown()
+let inFlight = 0;
+let shuttingDown = false;
+let drained = () => {};
+
+app.use((req, res, next) => {
+    let done = false;
+    const finished = () => {
+        if (!done) {
+            done = true;
+            inFlight--;
+            if (shuttingDown && inFlight === 0) {
+                drained();
+            }
+        }
+    };
+    inFlight++;
+    res.on('finish', finished);
+    res.on('close', finished);
+    if (shuttingDown) {
+        // do not keep the connection around for the next request
+        res.set('Connection', 'close');
+    }
+    next();
+});
+app.use(metrics.middleware);
+app.use((req, res, next) => {
+    const start = process.hrtime();
+    res.on('finish', () => {
+        hotLog.info('request', () => {
+            const [seconds, nanoseconds] = process.hrtime(start);
+            return {
+                method: req.method,
+                url: req.originalUrl,
+                status: res.statusCode,
+                ms: seconds * 1e3 + nanoseconds / 1e6
+            };
+        });
+    });
+    next();
+});
 app.use(helmet());
-app.use(cors());
+app.use(cors({exposedHeaders: ['ETag']}));
 app.use(bodyParser.json());
 app.use(bodyParser.urlencoded({ extended: true }));
 
+const credentialsCache = new CredentialsCache(
+    parseInt(process.env.AUTH_CACHE_SIZE || 10000),
+    parseInt(process.env.AUTH_CACHE_TTL || 60000) // milliseconds
+);
+
+// Resolves to the player of the user, {character_id, dungeon_id} with
+// nulls for what they do not have yet, or to null if the password is wrong.
 const checkPassword = (user, password) => {
-    return db.one('SELECT password_hash FROM users WHERE email = $1', user)
+    return replicas.read(user, source => source.one(statements.authenticate, [user]))
         .then(data => {
-            return passwordHash.verify(password, data.password_hash);
+            if (!passwordHash.verify(password, data.password_hash)) {
+                return null;
+            }
+            return {character_id: data.character_id, dungeon_id: data.dungeon_id};
         })
         .catch(error => {
             if (error instanceof pgp.errors.QueryResultError && error.code === pgp.errors.queryResultErrorCode.noData) {
-                return false;
+                return null;
             }
-            winston.error(error);
-            res.sendStatus(500);
+            throw error;
         });
 };
 
+// true when If-None-Match lists the given ETag
+const notModified = (req, tag) => {
+    const header = req.get('If-None-Match');
+    return Boolean(header) && header.split(',').some(t => t.trim() === tag);
+};
+
+// routes open to anyone, as [method, path]
+const publicRoutes = [
+    ['POST', '/user'],
+    ['GET', '/catalog'],
+    ['GET', '/metrics'],
+    ['GET', '/ready']
+];
+
 const verifyAuth = function (req, res, next) {
-    if (req.method == 'POST' && req.path == '/user') {
+    if (publicRoutes.some(([method, path]) => req.method == method && req.path == path)) {
        return next();
     }
     const auth = basicAuth(req);
-    winston.info(auth);
     if (!auth) {
         return res.status(401).set('WWW-Authenticate', 'Basic').send();
     }
+    const endAuthTimer = metrics.authDuration.startTimer();
+    if (credentialsCache.has(auth.name, auth.pass)) {
+        endAuthTimer({result: 'cached'});
+        req.auth = { user: auth.name, player: credentialsCache.player(auth.name) };
+        return next();
+    }
     checkPassword(auth.name, auth.pass)
-        .then(verified => {
-            if (!verified) {
+        .then(player => {
+            if (!player) {
+                endAuthTimer({result: 'rejected'});
                 res.status(401).set('WWW-Authenticate', 'Basic').send();
             }
             else {
-                req.auth = { user: auth.name };
+                endAuthTimer({result: 'verified'});
+                credentialsCache.set(auth.name, auth.pass, player);
+                req.auth = { user: auth.name, player };
                 next();
             }
+        })
+        .catch(error => {
+            endAuthTimer({result: 'error'});
+            log.error('auth', error);
+            res.sendStatus(500);
         });
 };
 app.use(verifyAuth);
 
+// GET routes that write all the same
+const writingReads = [/^\/dices$/, /^\/dungeon\/gate\/[^/]+$/, /^\/dungeon\/search$/];
+const writes = req => !['GET', 'HEAD', 'OPTIONS'].includes(req.method)
+    || writingReads.some(path => path.test(req.path));
+
+// Users who write read from the primary for a while, from when they start
+// to when they are answered, so that they see what they wrote whichever
+// replica they would read from and however far behind it is.
+app.use((req, res, next) => {
+    if (req.auth && writes(req)) {
+        replicas.wrote(req.auth.user);
+        res.on('finish', () => replicas.wrote(req.auth.user));
+    }
+    next();
+});
+
+// what the *_by_id functions raise when the dungeon they are given is over
+const noDungeon = error => error.code === 'P0002'; // no_data_found
+
+// Calls `call` with the player of the request, as resolved when
+// authenticating. The dungeon may have been ended or started since, by
+// another process too: when there was none, or `call` fails with
+// noDungeon, the player is resolved again and `call` retried with it.
+const withPlayer = (req, call) => {
+    const resolve = () => db.callStatement(
+        statements.get_player,
+        [req.auth.user],
+        pgp.queryResult.one | pgp.queryResult.none
+    ).then(player => {
+        player = player || {character_id: null, dungeon_id: null};
+        credentialsCache.setPlayer(req.auth.user, player);
+        return player;
+    });
+    const player = req.auth.player;
+    if (!player || !player.dungeon_id) {
+        return resolve().then(call);
+    }
+    return call(player).catch(error => {
+        if (!noDungeon(error)) {
+            throw error;
+        }
+        return resolve().then(call);
+    });
+};
+
+app.get('/metrics', metrics.handler);
+
+// load balancer readiness: fails while shutting down or without a database
+app.get('/ready', (req, res) => {
+    if (shuttingDown) {
+        return res.sendStatus(503);
+    }
+    db.one('SELECT 1')
+        .then(() => res.sendStatus(200))
+        .catch(error => {
+            log.warn('ready', error);
+            res.sendStatus(503);
+        });
+});
+
+
+// The catalog of items and enemies, what the compact dungeon state refers
+// to by id. It only changes with its version, so each process keeps the
+// last one it read and only checks the version is still the same.
+// Asked for as /catalog?version=N, with N the current version, it is
+// cacheable for good: clients find N in the compact state.
+let catalog = null; // {catalog, version}
+const catalogMaxAge = parseInt(process.env.CATALOG_MAX_AGE || 60); // seconds
+
+app.get('/catalog', (req, res) => {
+    replicas.read(null, source => source.callStatement(
+        statements.get_catalog_version, [], pgp.queryResult.one
+    )
+        .then(({version}) => {
+            if (catalog && catalog.version === version) {
+                return catalog;
+            }
+            return source.callStatement(statements.get_catalog, [], pgp.queryResult.one)
+                .then(data => {
+                    catalog = data;
+                    return data;
+                });
+        }))
+        .then(data => {
+            const tag = `W/"catalog.${data.version}"`;
+            res.set('ETag', tag);
+            if (req.query.version === String(data.version)) {
+                res.set('Cache-Control', 'public, max-age=31536000, immutable');
+            } else {
+                res.set('Cache-Control', `public, max-age=${catalogMaxAge}`);
+            }
+            if (notModified(req, tag)) {
+                return res.sendStatus(304);
+            }
+            res.type('json').send(data.catalog);
+        })
+        .catch(error => {
+            log.error('get_catalog', error);
+            res.sendStatus(500);
+        });
+});
 
 app.post('/user', (req, res) => {
-    winston.info(req.body);
+    log.info('signup', () => ({
+        email: req.body.email,
+        nickname: req.body.nickname
+    }));
     hashedPassword = passwordHash.generate(req.body.password);
+    credentialsCache.invalidate(req.body.email);
+    replicas.wrote(req.body.email);
     db.none(
         'INSERT INTO users(email, nickname, password_hash) VALUES (${email}, ${nickname}, ${password_hash})',
         {
@@ -67,38 +304,44 @@ app.post('/user', (req, res) => {
     ).then(() => {
         res.sendStatus(204);
     }).catch(error => {
-        winston.error(error);
+        log.error('signup', error);
         res.sendStatus(409);
     });
 });
 
 app.get('/user', (req, res) => {
-    db.one(
+    replicas.read(req.auth.user, source => source.one(
         'SELECT email, nickname FROM users WHERE email = $1',
         req.auth.user
-    )
+    ))
         .then(user => {
             res.json(user);
         })
         .catch(error => {
-            winston.error(error);
+            log.error('get user', error);
             res.sendStatus(500);
         });
 });
 
 app.delete('/user', (req, res) => {
-    db.func('delete_user', req.auth.user)
+    db.callFunction('delete_user', req.auth.user)
         .then(() => {
+            // once deleted: a request meanwhile could cache them again
+            credentialsCache.invalidate(req.auth.user);
             res.sendStatus(200);
         })
         .catch(error => {
-            winston.error(error);
+            log.error('delete_user', error);
             res.sendStatus(500);
         });
 });
 
 app.get('/dices', (req, res) => {
-    db.func('get_character_dices', req.auth.user, pgp.queryResult.many)
+    db.callStatement(
+        statements.get_character_dices,
+        [req.auth.user],
+        pgp.queryResult.many
+    )
         .then(dices => {
             res.status(200).json(dices);
         })
@@ -108,15 +351,18 @@ app.get('/dices', (req, res) => {
             ) {
                 res.sendStatus(404);
             } else {
-                winston.error(error);
+                log.error('get_character_dices', error);
                 res.sendStatus(500);
             }
         });
 });
 
 app.post('/character', (req, res) => {
-    winston.info(req.body);
-    db.func('create_character', [
+    log.debug('create_character', () => ({
+        user: req.auth.user,
+        character: req.body
+    }));
+    db.callStatement(statements.create_character, [
         req.body.name,
         req.body.description,
         req.body.strength,
@@ -129,7 +375,7 @@ app.post('/character', (req, res) => {
             res.sendStatus(201);
         })
         .catch(error => {
-            winston.error(util.inspect(error));
+            log.warn('create_character', error);
             if (error.code == 23502) { // not_null_violation
                 res.sendStatus(400);
             } else if (error.code == 23505) { // unique_violation
@@ -143,113 +389,310 @@ app.post('/character', (req, res) => {
 });
 
 app.post('/dungeon', (req, res) => {
-    db.func('create_dungeon', req.auth.user)
+    db.callFunction('create_dungeon', req.auth.user)
         .then( () => {
+            credentialsCache.setPlayer(req.auth.user, undefined);
             res.sendStatus(201);
         })
         .catch( error => {
             if (error.code == 23505) { // unique_violation
                 res.sendStatus(409);
+            } else if (error.code === 'P0001') { // no character
+                res.sendStatus(400);
+            } else {
+                log.error('create_dungeon', error);
+                res.sendStatus(500);
             }
         });
 });
 
+// the compact state also changes with the catalog it refers to
+const dungeonTag = (data, compact) => compact
+    ? `W/"${data.version}.${data.catalog_version}.compact"`
+    : `W/"${data.version}"`;
+
+// Clients revalidate their last state with If-None-Match: while the
+// dungeon version is the same only that is read, and the answer is a 304.
+// With ?format=compact items and enemies are ids into /catalog, see
+// get_dungeon_parts_by_id.
 app.get('/dungeon', (req, res) => {
-    db.tx(t => {
-        return t.batch([
-            db.func('get_character', req.auth.user).then(d => d[0]),
-            db.func('get_character_items', req.auth.user),
-            db.func('get_room', req.auth.user).then(d => d[0]),
-            db.func('get_room_items', req.auth.user),
-            db.func('get_room_enemies', req.auth.user),
-            db.func('get_room_gates', req.auth.user)
-        ]);
-    })
+    const compact = req.query.format === 'compact';
+    withPlayer(req, player => replicas.read(req.auth.user, source => {
+        const checkVersion = req.get('If-None-Match')
+            ? source.callStatement(
+                statements.get_dungeon_version,
+                [player.dungeon_id],
+                pgp.queryResult.one
+            )
+            : Promise.resolve(null);
+        return checkVersion.then(current => {
+            if (current && notModified(req, dungeonTag(current, compact))) {
+                return Object.assign({notModified: true}, current);
+            }
+            return source.callStatement(
+                statements.get_dungeon_state,
+                [player.dungeon_id, compact],
+                pgp.queryResult.one
+            );
+        });
+    }))
         .then(data => {
-            winston.info(util.inspect(data));
-            const dungeonStatus = {};
-            dungeonStatus.character = data[0];
-            dungeonStatus.character.bag = data[1];
-            dungeonStatus.room = data[2];
-            dungeonStatus.room.items = data[3];
-            dungeonStatus.room.enemies = data[4];
-            dungeonStatus.room.gates = data[5];
-            res.json(dungeonStatus);
+            res.set('ETag', dungeonTag(data, compact));
+            if (data.notModified) {
+                return res.sendStatus(304);
+            }
+            hotLog.debug('get_dungeon_state', () => ({
+                user: req.auth.user,
+                state: data.state
+            }));
+            // the state document is built by postgres, pass its text through
+            res.set('Cache-Control', 'no-cache');
+            res.type('json').send(data.state);
         })
         .catch(error => {
-            winston.error(util.inspect(error));
-            res.sendStatus(404);
+            if (noDungeon(error)) {
+                res.sendStatus(404);
+            } else {
+                log.error('get_dungeon_state', error);
+                res.sendStatus(500);
+            }
         });
 });
 
 app.delete('/dungeon', (req, res) => {
-    db.func('end_dungeon', req.auth.user)
+    db.callFunction('end_dungeon', req.auth.user)
         .then(() => {
+            credentialsCache.setPlayer(req.auth.user, undefined);
             res.sendStatus(200);
         })
         .catch(error => {
-            winston.error(util.inspect(error));
+            log.error('end_dungeon', error);
+            res.sendStatus(500);
         });
 });
 
+app.get('/dungeon/events', (req, res) => {
+    events.subscribe(db, req.auth.user, req, res);
+});
+
 app.get('/dungeon/gate/:gateId', (req, res) => {
-    db.func('follow_gate', [req.auth.user, req.params.gateId])
+    withPlayer(req, player => db.callStatement(
+        statements.follow_gate,
+        [player.dungeon_id, req.params.gateId]
+    ))
         .then(data => {
-            winston.info(util.inspect(data));
+            hotLog.debug('follow_gate', () => ({user: req.auth.user, fights: data}));
             res.json(data);
         })
         .catch(error => {
-            winston.error(util.inspect(error));
+            if (noDungeon(error)) {
+                res.sendStatus(404);
+            } else {
+                log.error('follow_gate', error);
+                res.sendStatus(500);
+            }
         });
 });
 
 app.post('/dungeon/enemy/:enemyId', (req, res) => {
-    db.func('fight_enemy', [req.auth.user, req.params.enemyId])
+    withPlayer(req, player => db.callStatement(
+        statements.fight_enemy,
+        [player.dungeon_id, req.params.enemyId]
+    ))
         .then(data => {
-            winston.info(util.inspect(data));
+            hotLog.debug('fight_enemy', () => ({user: req.auth.user, fights: data}));
             res.json(data);
         })
         .catch(error => {
-            winston.error(util.inspect(error));
+            if (noDungeon(error)) {
+                res.sendStatus(404);
+            } else {
+                log.error('fight_enemy', error);
+                res.sendStatus(500);
+            }
         });
 });
 
 app.post('/dungeon/item/:itemId', (req, res) => {
-    db.func('take_item', [req.auth.user, req.params.itemId])
+    withPlayer(req, player => db.callStatement(
+        statements.take_item,
+        [player.dungeon_id, req.params.itemId]
+    ))
         .then(([data]) => {
-            const id = {'id': data.take_item};
-            winston.info(util.inspect(id));
-            res.json(id);
+            hotLog.debug('take_item', () => ({user: req.auth.user, item: data}));
+            res.json(data);
         })
         .catch(error => {
-            winston.error(util.inspect(error));
+            if (noDungeon(error)) {
+                res.sendStatus(404);
+            } else {
+                log.error('take_item', error);
+                res.sendStatus(500);
+            }
         });
 });
 
 app.post('/dungeon/bag/:itemId', (req, res) => {
-    db.func('use_item', [req.auth.user, req.params.itemId])
+    withPlayer(req, player => db.callStatement(
+        statements.use_item,
+        [player.dungeon_id, req.params.itemId]
+    ))
         .then(() => {
             res.sendStatus(200);
         })
         .catch(error => {
-            winston.error(util.inspect(error));
+            if (noDungeon(error)) {
+                res.sendStatus(404);
+            } else {
+                log.error('use_item', error);
+                res.sendStatus(500);
+            }
         });
 });
 
 app.get('/dungeon/search', (req, res) => {
-    db.func('room_search', req.auth.user)
+    withPlayer(req, player => db.callStatement(
+        statements.room_search,
+        [player.dungeon_id]
+    ))
         .then(([data]) => {
-            winston.info(`search: ${util.inspect(data)}`);
+            hotLog.debug('room_search', () => ({user: req.auth.user, search: data}));
             res.json(data);
         })
         .catch(error => {
             if (error.code === 'P0001') {
                 res.sendStatus(418) // I'm a teapot HTTP response code
+            } else if (noDungeon(error)) {
+                res.sendStatus(404);
             } else {
-                winston.error(util.inspect(error));
+                log.error('room_search', error);
                 res.sendStatus(500);
             }
         });
 });
 
-app.listen(process.env.PORT)
+// Actions accepted by POST /dungeon/actions, each resolving to its result.
+const dungeonActions = {
+    fight: (t, dungeon, id) => t.callStatement(statements.fight_enemy, [dungeon, id]),
+    gate: (t, dungeon, id) => t.callStatement(statements.follow_gate, [dungeon, id]),
+    take: (t, dungeon, id) => t.callStatement(statements.take_item, [dungeon, id])
+        .then(([data]) => data),
+    use: (t, dungeon, id) => t.callStatement(statements.use_item, [dungeon, id])
+        .then(() => null),
+    search: (t, dungeon) => t.callStatement(statements.room_search, [dungeon])
+        .then(([data]) => data)
+};
+const maxBatchActions = 100;
+
+// What a failed action of a batch answers, by SQLSTATE. Other errors are
+// logged and answered as 'error': the database messages stay here.
+const actionErrors = {
+    P0001: 'not allowed', // raised by the action, like searching with enemies left
+    P0002: 'dungeon ended', // no_data_found, see noDungeon
+    '22P02': 'invalid id' // invalid_text_representation
+};
+const actionError = error => {
+    if (actionErrors.hasOwnProperty(error.code)) {
+        return {code: error.code, message: actionErrors[error.code]};
+    }
+    log.error('dungeon actions', error);
+    return {code: 'error', message: 'action failed'};
+};
+
+// Runs a list of actions like [{action: 'fight', id: 1}, {action: 'search'}]
+// in one transaction and answers with their results and the dungeon state.
+// Each action runs in its own savepoint: the first failing one is rolled
+// back and stops the batch, the ones before it are kept. The state is
+// compact with ?format=compact, like for GET /dungeon.
+app.post('/dungeon/actions', (req, res) => {
+    const actions = req.body.actions;
+    const compact = req.query.format === 'compact';
+    if (!Array.isArray(actions)
+        || actions.length > maxBatchActions
+        || !actions.every(a => a && dungeonActions.hasOwnProperty(a.action))
+    ) {
+        return res.sendStatus(400);
+    }
+    withPlayer(req, player => db.tx(t => {
+        const dungeon = player.dungeon_id;
+        const results = [];
+        const run = i => {
+            if (i == actions.length) {
+                return Promise.resolve();
+            }
+            const {action, id} = actions[i];
+            return t.tx(sp => dungeonActions[action](sp, dungeon, id))
+                .then(result => {
+                    results.push({action, id, result});
+                    return run(i + 1);
+                })
+                .catch(error => {
+                    results.push({action, id, error: actionError(error)});
+                });
+        };
+        // a dungeon that is over fails the batch here, before any action,
+        // so that withPlayer can retry it
+        return t.callStatement(statements.get_dungeon_version, [dungeon])
+            .then(() => run(0))
+            // the character may die on the way: no state then
+            .then(() => t.tx(sp => sp.callStatement(
+                statements.get_dungeon_state,
+                [dungeon, compact],
+                pgp.queryResult.one
+            )).catch(error => {
+                if (noDungeon(error)) {
+                    return {state: null};
+                }
+                throw error;
+            }))
+            .then(data => ({results, state: data.state}));
+    }))
+        .then(({results, state}) => {
+            // the state is JSON text already, embed it without parsing it
+            res.type('json').send(
+                `{"results":${JSON.stringify(results)},"dungeon":${state || 'null'}}`
+            );
+        })
+        .catch(error => {
+            if (noDungeon(error)) {
+                res.sendStatus(404);
+            } else {
+                log.error('dungeon actions', error);
+                res.sendStatus(500);
+            }
+        });
+});
+
+jobs.start(db);
+
+const server = app.listen(process.env.PORT);
+
+// On SIGTERM stops accepting connections, waits for the requests in flight,
+// and with them their transactions, then closes the pool and exits.
+// Gives up after SHUTDOWN_TIMEOUT milliseconds.
+const shutdown = signal => {
+    if (shuttingDown) {
+        return;
+    }
+    shuttingDown = true;
+    log.info('shutting down', {signal, inFlight});
+    server.close();
+    events.close();
+    if (server.closeIdleConnections) {
+        server.closeIdleConnections();
+    }
+    setTimeout(() => {
+        log.warn('shutdown timed out', {inFlight});
+        process.exit(1);
+    }, parseInt(process.env.SHUTDOWN_TIMEOUT || 10000)).unref();
+    drained = () => {
+        pgp.end();
+        log.info('shut down');
+        setImmediate(() => process.exit(0));
+    };
+    if (inFlight === 0) {
+        drained();
+    }
+};
+process.on('SIGTERM', shutdown);
+process.on('SIGINT', shutdown);
@@ -0,0 +1,141 @@
+"""Asyncio client for the dungeon REST API.
+
+Same surface as client.DungeonClient, but every call is a coroutine and
+many clients can share one aiohttp.ClientSession, whose connector caps
+the requests in flight across all of them.
+
+    async with aiohttp.ClientSession(connector=TCPConnector(limit=100)) as s:
+        client = AsyncDungeonClient(s, 'http://localhost:8000/', auth)
+        await client.start_dungeon()
+        room = (await client.dungeon()).body['room']
+"""
+
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+# called after every request with (endpoint, seconds, status_code)
+Observer = Callable[[str, float, int], None]
+
+
+class Response(NamedTuple):
+    status: int
+    body: Any
+
+
+class AsyncDungeonClient:
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        host: str,
+        auth: Optional[Tuple[str, str]] = None,
+        observer: Optional[Observer] = None
+    ) -> None:
+        self.session = session
+        self.host = host if host.endswith('/') else host + '/'
+        self.auth = aiohttp.BasicAuth(*auth) if auth else None
+        self.observer = observer
+
+    async def request(
+        self, method: str, endpoint: str, path: str, **kwargs
+    ) -> Response:
+        kwargs.setdefault('auth', self.auth)
+        start = time.perf_counter()
+        async with self.session.request(
+            method, self.host + path, **kwargs
+        ) as response:
+            if response.content_type == 'application/json':
+                body = await response.json()
+            else:
+                body = await response.text()
+        if self.observer is not None:
+            self.observer(
+                '{} {}'.format(method, endpoint),
+                time.perf_counter() - start,
+                response.status
+            )
+        return Response(response.status, body)
+
+    # /user
+
+    async def signup(
+        self, email: str, nickname: str, password: str
+    ) -> Response:
+        return await self.request('POST', '/user', 'user', auth=None, data={
+            'email': email,
+            'nickname': nickname,
+            'password': password
+        })
+
+    async def user(self) -> Response:
+        return await self.request('GET', '/user', 'user')
+
+    async def delete_user(self) -> Response:
+        return await self.request('DELETE', '/user', 'user')
+
+    # character creation
+
+    async def dices(self) -> Response:
+        return await self.request('GET', '/dices', 'dices')
+
+    async def create_character(
+        self,
+        name: str,
+        description: str,
+        strength: int,
+        intellect: int,
+        dexterity: int,
+        constitution: int
+    ) -> Response:
+        return await self.request('POST', '/character', 'character', data={
+            'name': name,
+            'description': description,
+            'strength': strength,
+            'intellect': intellect,
+            'dexterity': dexterity,
+            'constitution': constitution
+        })
+
+    # /dungeon
+
+    async def start_dungeon(self) -> Response:
+        return await self.request('POST', '/dungeon', 'dungeon')
+
+    async def dungeon(self) -> Response:
+        return await self.request('GET', '/dungeon', 'dungeon')
+
+    async def end_dungeon(self) -> Response:
+        return await self.request('DELETE', '/dungeon', 'dungeon')
+
+    async def follow_gate(self, gate_id: int) -> Response:
+        return await self.request(
+            'GET', '/dungeon/gate/:id', 'dungeon/gate/{}'.format(gate_id)
+        )
+
+    async def fight_enemy(self, enemy_id: int) -> Response:
+        return await self.request(
+            'POST', '/dungeon/enemy/:id', 'dungeon/enemy/{}'.format(enemy_id)
+        )
+
+    async def take_item(self, item_id: int) -> Response:
+        return await self.request(
+            'POST', '/dungeon/item/:id', 'dungeon/item/{}'.format(item_id)
+        )
+
+    async def use_item(self, item_id: int) -> Response:
+        return await self.request(
+            'POST', '/dungeon/bag/:id', 'dungeon/bag/{}'.format(item_id)
+        )
+
+    async def search(self) -> Response:
+        return await self.request('GET', '/dungeon/search', 'dungeon/search')
+
+    async def actions(self, actions: List[Dict[str, Any]]) -> Response:
+        """Runs [{'action': 'fight', 'id': 1}, {'action': 'search'}, ...]
+        in one request, see POST /dungeon/actions."""
+        return await self.request(
+            'POST', '/dungeon/actions', 'dungeon/actions',
+            json={'actions': actions}
+        )
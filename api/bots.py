@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Plays full dungeon runs with thousands of concurrent asyncio bots.
+
+Each bot signs up, creates a character, starts a dungeon and then fights,
+searches and walks gates until it reaches the final room or dies. All the
+bots share one connection pool, so --in-flight caps the requests sent to
+the API at any time, whatever the number of bots.
+
+    ./bots.py --bots 5000 --in-flight 200
+    ./bots.py --duration 3600 --bots 500      # soak test, one hour
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+
+import aiohttp
+
+from async_client import AsyncDungeonClient
+
+# rooms_descriptions entry of the final room, see db/data.sql
+FINAL_ROOM_DESCRIPTION = 'FINAL_ROOM'
+
+
+class Bot:
+
+    def __init__(self, session, host, max_steps):
+        self.max_steps = max_steps
+        name = uuid.uuid4().hex[:15]
+        self.user = {
+            'email': 'bot_{}@example.com'.format(name),
+            'nickname': 'b_{}'.format(name),
+            'password': 'bot_password'
+        }
+        self.client = AsyncDungeonClient(
+            session, host, auth=(self.user['email'], self.user['password'])
+        )
+
+    async def dungeon(self):
+        """The dungeon state, None once it is over."""
+        response = await self.client.dungeon()
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise ValueError('GET /dungeon answered {}'.format(response.status))
+        return response.body
+
+    async def fight_til_clear_or_die(self, dungeon):
+        while dungeon and dungeon['room']['enemies']:
+            await self.client.fight_enemy(dungeon['room']['enemies'][0]['id'])
+            dungeon = await self.dungeon()
+        return dungeon
+
+    async def play(self):
+        """Returns 'completed', 'died' or 'lost'."""
+        await self.client.signup(**self.user)
+        try:
+            response = await self.client.dices()
+            if response.status != 200:
+                return 'error'
+            rolls = response.body
+            await self.client.create_character(
+                name='bot',
+                description='asyncio bot',
+                strength=rolls[0]['id'],
+                intellect=rolls[1]['id'],
+                dexterity=rolls[2]['id'],
+                constitution=rolls[3]['id']
+            )
+            await self.client.start_dungeon()
+            dungeon = await self.dungeon()
+            visited = set()
+            for _ in range(self.max_steps):
+                dungeon = await self.fight_til_clear_or_die(dungeon)
+                if not dungeon:
+                    return 'died'
+                room = dungeon['room']
+                if room['description'] == FINAL_ROOM_DESCRIPTION:
+                    return 'completed'
+                visited.add(room['id'])
+                if dungeon['character']['hit_points'] > 1:
+                    await self.client.search()
+                    dungeon = await self.dungeon()
+                    if not dungeon:
+                        return 'died'
+                    room = dungeon['room']
+                if not room['gates']:
+                    return 'lost'
+                unvisited = [
+                    gate for gate in room['gates']
+                    if gate['room'] not in visited
+                ]
+                gate = random.choice(unvisited or room['gates'])
+                await self.client.follow_gate(gate['id'])
+                dungeon = await self.dungeon()
+            return 'lost'
+        finally:
+            await self.client.delete_user()
+
+
+async def run(args):
+    outcomes = Counter()
+    connector = aiohttp.TCPConnector(limit=args.in_flight)
+    deadline = time.monotonic() + args.duration if args.duration else None
+    started = 0
+
+    async def bot_loop(session):
+        nonlocal started
+        while True:
+            if deadline is None:
+                if started >= args.bots:
+                    return
+            elif time.monotonic() >= deadline:
+                return
+            started += 1
+            try:
+                outcomes[await Bot(session, args.host, args.max_steps).play()] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError, LookupError,
+                    TypeError, ValueError):
+                # unexpected answers, like error pages where JSON should be
+                outcomes['error'] += 1
+
+    start = time.monotonic()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(
+            bot_loop(session) for _ in range(min(args.bots, args.concurrency))
+        ))
+    wall_time = time.monotonic() - start
+
+    runs = sum(outcomes.values())
+    print('runs: {} in {:.1f}s, {:.2f} runs/s'.format(
+        runs, wall_time, runs / wall_time
+    ))
+    print('completed: {:.2f} runs/s'.format(outcomes['completed'] / wall_time))
+    for outcome, count in sorted(outcomes.items()):
+        print('{:>10}: {}'.format(outcome, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='http://localhost:8000/')
+    parser.add_argument('--bots', type=int, default=1000,
+                        help='total runs to play, or bots alive with --duration')
+    parser.add_argument('--concurrency', type=int, default=1000,
+                        help='bots playing at the same time')
+    parser.add_argument('--in-flight', type=int, default=100,
+                        help='max concurrent requests to the API')
+    parser.add_argument('--max-steps', type=int, default=50,
+                        help='max gates walked by each bot')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='keep playing new runs for this many seconds')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
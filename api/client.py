@@ -0,0 +1,172 @@
+"""Pooled HTTP client for the dungeon REST API.
+
+One DungeonClient keeps a keep-alive requests.Session, so consecutive
+calls reuse the same TCP/TLS connection instead of opening a new one.
+
+    client = DungeonClient('http://localhost:8000/', auth=(email, password))
+    client.start_dungeon()
+    room = client.dungeon().json()['room']
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# called after every request with (endpoint, seconds, status_code)
+Observer = Callable[[str, float, int], None]
+
+
+class DungeonClient:
+
+    def __init__(
+        self,
+        host: str,
+        auth: Optional[Tuple[str, str]] = None,
+        pool_connections: int = 1,
+        pool_maxsize: int = 10,
+        observer: Optional[Observer] = None
+    ) -> None:
+        self.host = host if host.endswith('/') else host + '/'
+        self.observer = observer
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # last 200 answer of GET /dungeon, by format, revalidated with its
+        # ETag
+        self._dungeon = {}  # type: Dict[bool, requests.Response]
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> 'DungeonClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def request(
+        self, method: str, endpoint: str, path: str, **kwargs
+    ) -> requests.Response:
+        start = time.perf_counter()
+        response = self.session.request(method, self.host + path, **kwargs)
+        if self.observer is not None:
+            self.observer(
+                '{} {}'.format(method, endpoint),
+                time.perf_counter() - start,
+                response.status_code
+            )
+        return response
+
+    # /user
+
+    def signup(
+        self, email: str, nickname: str, password: str
+    ) -> requests.Response:
+        return self.request('POST', '/user', 'user', auth=None, data={
+            'email': email,
+            'nickname': nickname,
+            'password': password
+        })
+
+    def user(self) -> requests.Response:
+        return self.request('GET', '/user', 'user')
+
+    def delete_user(self) -> requests.Response:
+        return self.request('DELETE', '/user', 'user')
+
+    # character creation
+
+    def dices(self) -> requests.Response:
+        return self.request('GET', '/dices', 'dices')
+
+    def create_character(
+        self,
+        name: str,
+        description: str,
+        strength: int,
+        intellect: int,
+        dexterity: int,
+        constitution: int
+    ) -> requests.Response:
+        return self.request('POST', '/character', 'character', data={
+            'name': name,
+            'description': description,
+            'strength': strength,
+            'intellect': intellect,
+            'dexterity': dexterity,
+            'constitution': constitution
+        })
+
+    def catalog(self, version: Optional[int] = None) -> requests.Response:
+        """The items and enemies the compact dungeon state refers to. Asked
+        for by its current version, the answer is cacheable for good."""
+        params = {'version': version} if version is not None else None
+        return self.request(
+            'GET', '/catalog', 'catalog', auth=None, params=params
+        )
+
+    # /dungeon
+
+    def start_dungeon(self) -> requests.Response:
+        return self.request('POST', '/dungeon', 'dungeon')
+
+    def dungeon(self, compact: bool = False) -> requests.Response:
+        """The dungeon state, with items and enemies as ids into catalog()
+        if `compact`. While it has not changed the server answers 304 and
+        the response cached from the previous call is returned."""
+        headers = {}
+        params = {'format': 'compact'} if compact else None
+        cached = self._dungeon.get(compact)
+        if cached is not None:
+            headers['If-None-Match'] = cached.headers['ETag']
+        response = self.request(
+            'GET', '/dungeon', 'dungeon', headers=headers, params=params
+        )
+        if response.status_code == 304:
+            return cached
+        if response.status_code == 200 and 'ETag' in response.headers:
+            self._dungeon[compact] = response
+        else:
+            self._dungeon.pop(compact, None)
+        return response
+
+    def end_dungeon(self) -> requests.Response:
+        return self.request('DELETE', '/dungeon', 'dungeon')
+
+    def follow_gate(self, gate_id: int) -> requests.Response:
+        return self.request(
+            'GET', '/dungeon/gate/:id', 'dungeon/gate/{}'.format(gate_id)
+        )
+
+    def fight_enemy(self, enemy_id: int) -> requests.Response:
+        return self.request(
+            'POST', '/dungeon/enemy/:id', 'dungeon/enemy/{}'.format(enemy_id)
+        )
+
+    def take_item(self, item_id: int) -> requests.Response:
+        return self.request(
+            'POST', '/dungeon/item/:id', 'dungeon/item/{}'.format(item_id)
+        )
+
+    def use_item(self, item_id: int) -> requests.Response:
+        return self.request(
+            'POST', '/dungeon/bag/:id', 'dungeon/bag/{}'.format(item_id)
+        )
+
+    def search(self) -> requests.Response:
+        return self.request('GET', '/dungeon/search', 'dungeon/search')
+
+    def actions(self, actions: List[Dict[str, Any]]) -> requests.Response:
+        """Runs [{'action': 'fight', 'id': 1}, {'action': 'search'}, ...]
+        in one request, see POST /dungeon/actions."""
+        return self.request(
+            'POST', '/dungeon/actions', 'dungeon/actions',
+            json={'actions': actions}
+        )
@@ -0,0 +1,67 @@
+const cluster = require('cluster');
+const http = require('http');
+const os = require('os');
+const prometheus = require('prom-client');
+const CredentialsCache = require('./credentials_cache');
+const log = require('./log');
+const Replicas = require('./replicas');
+
+// Runs app.js in WEB_CONCURRENCY worker processes, one per core by default,
+// sharing the PORT. Workers that die are replaced; on SIGTERM every worker
+// drains its requests and exits, then so does the master.
+//
+// With METRICS_PORT set, the master serves the metrics of all the workers
+// summed up, GET /metrics on a worker only has its own.
+
+if (cluster.isMaster) {
+    const workers = parseInt(process.env.WEB_CONCURRENCY || os.cpus().length);
+    let shuttingDown = false;
+
+    for (let i = 0; i < workers; i++) {
+        cluster.fork();
+    }
+    log.info('cluster started', {workers});
+    CredentialsCache.relay();
+    Replicas.relay();
+
+    cluster.on('exit', (worker, code, signal) => {
+        if (!shuttingDown) {
+            log.error('worker died', {pid: worker.process.pid, code, signal});
+            cluster.fork();
+        }
+    });
+
+    let metricsServer = null;
+    if (process.env.METRICS_PORT) {
+        const registry = new prometheus.AggregatorRegistry();
+        metricsServer = http.createServer((req, res) => {
+            registry.clusterMetrics((error, metrics) => {
+                if (error) {
+                    log.error('cluster metrics', error);
+                    res.statusCode = 500;
+                    return res.end();
+                }
+                res.setHeader('Content-Type', registry.contentType);
+                res.end(metrics);
+            });
+        }).listen(process.env.METRICS_PORT);
+    }
+
+    const shutdown = signal => {
+        if (shuttingDown) {
+            return;
+        }
+        shuttingDown = true;
+        log.info('cluster shutting down', {signal});
+        if (metricsServer) {
+            metricsServer.close();
+        }
+        Object.values(cluster.workers).forEach(worker => {
+            worker.process.kill('SIGTERM');
+        });
+    };
+    process.on('SIGTERM', shutdown);
+    process.on('SIGINT', shutdown);
+} else {
+    require('./app');
+}
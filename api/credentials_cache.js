@@ -0,0 +1,104 @@
+const cluster = require('cluster');
+const crypto = require('crypto');
+
+// Bounded in-process cache of recently verified Basic-auth credentials.
+// Passwords are kept only as an HMAC keyed with a per-process secret.
+// Each entry also keeps the player resolved with the credentials, the ids
+// of their character and dungeon, for the requests that follow.
+// Entries expire after `ttl` milliseconds; when full, the least recently
+// used entry is evicted (a Map iterates in insertion order, and hits are
+// re-inserted at the end).
+//
+// Each worker of cluster.js has its own: invalidating credentials tells
+// the others through the master, see relay, so that none of them keeps
+// accepting the password of a deleted account.
+class CredentialsCache {
+    constructor(maxEntries, ttl) {
+        this.maxEntries = maxEntries;
+        this.ttl = ttl;
+        this.entries = new Map();
+        this.secret = crypto.randomBytes(32);
+        if (cluster.isWorker) {
+            process.on('message', message => {
+                if (message && message.credentialsInvalidated) {
+                    this.entries.delete(message.credentialsInvalidated);
+                }
+            });
+        }
+    }
+
+    digest(password) {
+        return crypto.createHmac('sha256', this.secret)
+            .update(password)
+            .digest('hex');
+    }
+
+    has(user, password) {
+        const entry = this.entries.get(user);
+        if (!entry) {
+            return false;
+        }
+        if (entry.expires < Date.now()) {
+            this.entries.delete(user);
+            return false;
+        }
+        if (entry.digest !== this.digest(password)) {
+            return false;
+        }
+        this.entries.delete(user);
+        this.entries.set(user, entry);
+        return true;
+    }
+
+    set(user, password, player) {
+        if (this.maxEntries <= 0) {
+            return;
+        }
+        this.entries.delete(user);
+        while (this.entries.size >= this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+        this.entries.set(user, {
+            digest: this.digest(password),
+            expires: Date.now() + this.ttl,
+            player
+        });
+    }
+
+    // the player of a user with cached credentials, undefined if unknown
+    player(user) {
+        const entry = this.entries.get(user);
+        return entry && entry.player;
+    }
+
+    setPlayer(user, player) {
+        const entry = this.entries.get(user);
+        if (entry) {
+            entry.player = player;
+        }
+    }
+
+    // in every worker
+    invalidate(user) {
+        this.entries.delete(user);
+        if (cluster.isWorker) {
+            process.send({credentialsInvalidated: user});
+        }
+    }
+}
+
+// In the master of cluster.js: passes the invalidations a worker tells of
+// on to the others.
+CredentialsCache.relay = () => {
+    cluster.on('message', (sender, message) => {
+        if (message && message.credentialsInvalidated) {
+            Object.values(cluster.workers).forEach(worker => {
+                if (worker !== sender) {
+                    worker.send(message);
+                }
+            });
+        }
+    });
+};
+
+module.exports = CredentialsCache;
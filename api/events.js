@@ -0,0 +1,139 @@
+const log = require('./log');
+
+// GET /dungeon/events: Server-Sent Events of the changes notify_dungeon
+// reports. Each process LISTENs on a single connection of its own, opened
+// with the first subscriber, and writes every notification to the streams
+// of the user it is about. The data of an event is the notification:
+//
+//     data: {"user": ..., "event": "fight_enemy", "state": {...}}
+//
+// A stream gets {"user": ..., "refetch": true} once notifications reach
+// it: then, and only then, nothing it should know of can be missed.
+
+const channel = 'dungeon_changes';
+const heartbeat = 25000; // ms, a comment keeps proxies from closing streams
+const retry = 1000; // ms, before listening again and for clients to reconnect
+
+const streams = new Map(); // user => Set of responses
+let listener = null; // the LISTEN connection
+let listening = false;
+let active = false; // LISTEN is done, notifications are coming
+let closed = false;
+
+const send = (user, data) => {
+    const subscribers = streams.get(user);
+    if (subscribers) {
+        const event = `data: ${data}\n\n`;
+        subscribers.forEach(res => res.write(event));
+    }
+};
+
+const refetch = user => JSON.stringify({user, refetch: true});
+
+const onNotification = message => {
+    let user;
+    try {
+        user = JSON.parse(message.payload).user;
+    } catch (error) {
+        return log.warn('dungeon events', error);
+    }
+    send(user, message.payload);
+};
+
+// every notification sent while not listening is lost: clients refetch
+const onListening = () => {
+    active = true;
+    streams.forEach((subscribers, user) => {
+        send(user, refetch(user));
+    });
+};
+
+const listen = db => {
+    if (listening || closed) {
+        return;
+    }
+    listening = true;
+    let failed = false;
+    const lost = error => {
+        if (failed) {
+            return;
+        }
+        failed = true;
+        active = false;
+        log.error('dungeon events connection', error);
+        if (listener) {
+            listener.done();
+            listener = null;
+        }
+        listening = false;
+        setTimeout(() => listen(db), retry).unref();
+    };
+    db.connect({direct: true})
+        .then(connection => {
+            listener = connection;
+            connection.client.on('notification', onNotification);
+            connection.client.on('error', lost);
+            return connection.none('LISTEN $1~', channel);
+        })
+        .then(() => {
+            if (closed) {
+                return close();
+            }
+            onListening();
+        })
+        .catch(lost);
+};
+
+const subscribe = (db, user, req, res) => {
+    if (closed) {
+        // shutting down: reconnect to another process
+        return res.sendStatus(503);
+    }
+    listen(db);
+    res.status(200).set({
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' // nginx
+    });
+    res.flushHeaders();
+    res.write(`retry: ${retry}\n\n`);
+    if (active) {
+        res.write(`data: ${refetch(user)}\n\n`);
+    }
+    if (!streams.has(user)) {
+        streams.set(user, new Set());
+    }
+    streams.get(user).add(res);
+    req.on('close', () => {
+        const subscribers = streams.get(user);
+        if (!subscribers) {
+            return; // ended by close()
+        }
+        subscribers.delete(res);
+        if (subscribers.size === 0) {
+            streams.delete(user);
+        }
+    });
+};
+
+setInterval(() => {
+    streams.forEach(subscribers => {
+        subscribers.forEach(res => res.write(':\n\n'));
+    });
+}, heartbeat).unref();
+
+// On shutdown: ends every stream, clients reconnect to another process.
+const close = () => {
+    closed = true;
+    active = false;
+    streams.forEach(subscribers => {
+        subscribers.forEach(res => res.end());
+    });
+    streams.clear();
+    if (listener) {
+        listener.done();
+        listener = null;
+    }
+};
+
+module.exports = { close, subscribe };
@@ -1,35 +1,30 @@
 const pgp = require('pg-promise')();
 const fs = require('fs');
+const path = require('path');
+
+// Loads schema.sql, functions.sql and data.sql in a single transaction:
+// either the whole database is rebuilt or nothing changes.
 
 pgp.pg.defaults.ssl = true;
 const db = pgp(process.env.DATABASE_URL);
 
-const files = process.argv.slice(2);
+const files = ['schema.sql', 'functions.sql', 'data.sql'];
+const read = file => fs.readFileSync(
+    path.join(__dirname, '..', 'db', file),
+    'utf8'
+);
 
-fs.readFile('../db/schema.sql', 'utf8', (error, data) => {
-    db.none(data)
-        .then(() => {
-            console.log('done loading schema');
-            fs.readFile('../db/functions.sql', 'utf8', (error, data) => {
-                db.none(data)
-                    .then(() => {
-                        console.log('done loading functions');
-                        fs.readFile('../db/data.sql', 'utf8', (error, data) => {
-                            db.none(data)
-                                .then(() => {
-                                    console.log('done loading data');
-                                })
-                                .catch(error => {
-                                    console.log(error);
-                                });
-                        });
-                    })
-                    .catch(error => {
-                        console.log(error);
-                    });
-            });
-        })
-        .catch(error => {
-            console.log(error);
-        });
-});
+db.tx(t => files.reduce(
+    (loaded, file) => loaded
+        .then(() => t.none(read(file)))
+        .then(() => console.log(`done loading ${file}`)),
+    Promise.resolve()
+))
+    .then(() => {
+        pgp.end();
+    })
+    .catch(error => {
+        console.log(error);
+        pgp.end();
+        process.exitCode = 1;
+    });
@@ -0,0 +1,54 @@
+const log = require('./log');
+
+// Background jobs, run by the API process off the request path.
+
+// Runs `job` every `interval` milliseconds. When the job resolves to true
+// it has more work to do right away, so it runs again without waiting.
+const every = (name, interval, job) => {
+    const schedule = delay => setTimeout(run, delay).unref();
+    const run = () => {
+        job()
+            .then(again => schedule(again ? 0 : interval))
+            .catch(error => {
+                log.error(name, error);
+                schedule(interval);
+            });
+    };
+    schedule(0);
+};
+
+// Keeps DUNGEON_POOL_SIZE pre-generated dungeons ready for create_dungeon,
+// generating at most DUNGEON_POOL_BATCH of them per transaction.
+const refillDungeonPool = db => {
+    const size = parseInt(process.env.DUNGEON_POOL_SIZE || 100);
+    const batch = parseInt(process.env.DUNGEON_POOL_BATCH || 10);
+    const interval = parseInt(process.env.DUNGEON_POOL_INTERVAL || 1000);
+    if (size <= 0) {
+        return;
+    }
+    every('refill_dungeon_pool', interval, () => {
+        return db.callFunction('refill_dungeon_pool', [size, batch])
+            .then(([data]) => data.refill_dungeon_pool === batch);
+    });
+};
+
+// Deletes the dungeons finish_dungeon left behind, PRUNE_BATCH per
+// transaction, keeping the live tables sized to the active players.
+const pruneFinishedDungeons = db => {
+    const batch = parseInt(process.env.PRUNE_BATCH || 100);
+    const interval = parseInt(process.env.PRUNE_INTERVAL || 10000);
+    if (batch <= 0) {
+        return;
+    }
+    every('prune_finished_dungeons', interval, () => {
+        return db.callFunction('prune_finished_dungeons', [batch])
+            .then(([data]) => data.prune_finished_dungeons === batch);
+    });
+};
+
+const start = db => {
+    refillDungeonPool(db);
+    pruneFinishedDungeons(db);
+};
+
+module.exports = { start };
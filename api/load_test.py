@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Concurrent load generator replaying the tests.py player flows.
+
+Every simulated player signs up with its own account, rolls the dices,
+creates a character, starts a dungeon and then plays: it clears rooms,
+walks gates and looks for wearable items, like TestDungeonAsDB does.
+At the end it prints throughput and p50/p95/p99 latency per endpoint.
+
+    ./load_test.py --players 1000 --concurrency 64
+"""
+
+import argparse
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from client import DungeonClient
+
+
+class Stats:
+    """Thread safe latency samples, grouped by endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, seconds, status_code):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if status_code >= 500:
+                self.errors[endpoint] += 1
+
+    def report(self, wall_time):
+        lines = ['{:<32} {:>8} {:>7} {:>9} {:>8} {:>8} {:>8}'.format(
+            'endpoint', 'requests', 'errors', 'req/s',
+            'p50 ms', 'p95 ms', 'p99 ms'
+        )]
+        for endpoint in sorted(self.latencies):
+            samples = sorted(self.latencies[endpoint])
+            lines.append(
+                '{:<32} {:>8} {:>7} {:>9.1f} {:>8.1f} {:>8.1f} {:>8.1f}'.format(
+                    endpoint,
+                    len(samples),
+                    self.errors[endpoint],
+                    len(samples) / wall_time,
+                    percentile(samples, 50) * 1000,
+                    percentile(samples, 95) * 1000,
+                    percentile(samples, 99) * 1000
+                )
+            )
+        total = sum(len(s) for s in self.latencies.values())
+        lines.append('total: {} requests in {:.1f}s, {:.1f} req/s'.format(
+            total, wall_time, total / wall_time
+        ))
+        return '\n'.join(lines)
+
+
+def percentile(sorted_samples, p):
+    # nearest-rank percentile
+    if not sorted_samples:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_samples))), 1)
+    return sorted_samples[rank - 1]
+
+
+class Player:
+    """One simulated player, replaying the flows from tests.py."""
+
+    def __init__(self, host, stats, gate_steps):
+        self.gate_steps = gate_steps
+        name = uuid.uuid4().hex[:15]
+        self.user = {
+            'email': 'load_{}@example.com'.format(name),
+            'nickname': 'l_{}'.format(name),
+            'password': 'load_password'
+        }
+        self.client = DungeonClient(
+            host,
+            auth=(self.user['email'], self.user['password']),
+            observer=stats.record
+        )
+
+    def dungeon(self):
+        response = self.client.dungeon()
+        return response.json() if response.status_code == 200 else None
+
+    def follow_random_gate(self, dungeon):
+        self.client.follow_gate(random.choice(dungeon['room']['gates'])['id'])
+        return self.dungeon()
+
+    def create_character(self):
+        rolls = self.client.dices().json()
+        self.client.create_character(
+            name='load_character',
+            description='load test character',
+            strength=rolls[0]['id'],
+            intellect=rolls[1]['id'],
+            dexterity=rolls[2]['id'],
+            constitution=rolls[3]['id']
+        )
+
+    def fight_til_clear_or_die(self, dungeon):
+        while dungeon and dungeon['room']['enemies']:
+            enemy = dungeon['room']['enemies'][0]
+            self.client.fight_enemy(enemy['id'])
+            dungeon = self.dungeon()
+        return dungeon
+
+    def search_wearable_item(self, dungeon):
+        for _ in range(self.gate_steps):
+            wearable = [
+                item for item in dungeon['room']['items']
+                if item['category'] != 'consumable'
+            ]
+            if wearable:
+                dungeon = self.fight_til_clear_or_die(dungeon)
+                if dungeon:
+                    self.client.take_item(random.choice(wearable)['id'])
+                return dungeon
+            dungeon = self.follow_random_gate(dungeon)
+            if not dungeon:
+                return None
+        return dungeon
+
+    def play(self):
+        self.client.signup(**self.user)
+        try:
+            self.create_character()
+            self.client.start_dungeon()
+            dungeon = self.fight_til_clear_or_die(self.dungeon())
+            if dungeon:
+                dungeon = self.search_wearable_item(dungeon)
+            for _ in range(self.gate_steps):
+                if not dungeon or not dungeon['room']['gates']:
+                    break
+                dungeon = self.fight_til_clear_or_die(
+                    self.follow_random_gate(dungeon)
+                )
+            if dungeon and dungeon['room']['enemies'] == []:
+                self.client.search()
+        finally:
+            self.client.delete_user()
+            self.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='http://localhost:8000/')
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--gate-steps', type=int, default=10,
+                        help='max gates walked by each player')
+    args = parser.parse_args()
+
+    stats = Stats()
+    failures = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        players = [
+            executor.submit(Player(args.host, stats, args.gate_steps).play)
+            for _ in range(args.players)
+        ]
+        for player in as_completed(players):
+            if player.exception() is not None:
+                failures += 1
+    wall_time = time.perf_counter() - start
+
+    print(stats.report(wall_time))
+    print('players: {}, failed: {}'.format(args.players, failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+const fs = require('fs');
+
+// Structured, leveled logging.
+//
+// Records are JSON lines, buffered and written once per turn of the event
+// loop, to LOG_FILE (an asynchronous file stream) or else to stdout.
+// Levels above LOG_LEVEL return before doing any work: pass a function
+// instead of an object when the fields are costly to build, it is called
+// only if the record is written.
+//
+//     log.info('fight', () => ({user, fights}));
+
+const levels = { error: 0, warn: 1, info: 2, debug: 3 };
+const level = process.env.LOG_LEVEL || 'info';
+const known = levels.hasOwnProperty(level);
+const threshold = known ? levels[level] : levels.info;
+const maxBuffered = 1000; // records
+
+const stream = process.env.LOG_FILE
+    ? fs.createWriteStream(process.env.LOG_FILE, { flags: 'a' })
+    : process.stdout;
+
+let buffer = [];
+let flushScheduled = false;
+
+const flush = () => {
+    flushScheduled = false;
+    if (buffer.length > 0) {
+        const lines = buffer.join('');
+        buffer = [];
+        stream.write(lines);
+    }
+};
+
+process.on('exit', () => {
+    // the event loop is gone, only synchronous writes make it out
+    if (buffer.length > 0) {
+        const lines = buffer.join('');
+        buffer = [];
+        if (process.env.LOG_FILE) {
+            fs.appendFileSync(process.env.LOG_FILE, lines);
+        } else {
+            process.stdout.write(lines);
+        }
+    }
+});
+
+const errorFields = error => ({
+    error: error.message,
+    code: error.code,
+    stack: error.stack
+});
+
+const write = (level, message, fields) => {
+    if (typeof fields === 'function') {
+        fields = fields();
+    }
+    if (fields instanceof Error) {
+        fields = errorFields(fields);
+    }
+    buffer.push(JSON.stringify(Object.assign(
+        { time: new Date().toISOString(), level, message },
+        fields
+    )) + '\n');
+    if (buffer.length >= maxBuffered) {
+        flush();
+    } else if (!flushScheduled) {
+        flushScheduled = true;
+        setImmediate(flush);
+    }
+};
+
+if (!known) {
+    write('warn', 'unknown LOG_LEVEL, using info', { LOG_LEVEL: level });
+}
+
+// A logger writing only a `rate` fraction of its info and debug records,
+// for high-volume routes. Errors and warnings are always written.
+const sampled = rate => {
+    const logger = {};
+    Object.keys(levels).forEach(level => {
+        const always = levels[level] <= levels.warn;
+        logger[level] = levels[level] > threshold
+            ? () => {}
+            : (message, fields) => {
+                if (always || rate >= 1 || Math.random() < rate) {
+                    write(level, message, fields);
+                }
+            };
+    });
+    return logger;
+};
+
+module.exports = Object.assign(sampled(1), { sampled, flush });
@@ -0,0 +1,104 @@
+const client = require('prom-client');
+
+// Prometheus metrics, served by GET /metrics.
+
+client.collectDefaultMetrics();
+
+const latencyBuckets = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5];
+
+const requestDuration = new client.Histogram({
+    name: 'http_request_duration_seconds',
+    help: 'HTTP request latency by route',
+    labelNames: ['method', 'route', 'status'],
+    buckets: latencyBuckets
+});
+
+const dbFunctionDuration = new client.Histogram({
+    name: 'db_function_duration_seconds',
+    help: 'Time spent in each database function, pool wait included',
+    labelNames: ['function'],
+    buckets: latencyBuckets
+});
+
+const authDuration = new client.Histogram({
+    name: 'auth_duration_seconds',
+    help: 'Time spent verifying Basic-auth credentials',
+    labelNames: ['result'],
+    buckets: latencyBuckets
+});
+
+const dbErrors = new client.Counter({
+    name: 'db_errors_total',
+    help: 'Database errors by postgres error code',
+    labelNames: ['code']
+});
+
+// pg-promise's pool: total and idle connections, and queries waiting for one
+// pools by name, like {primary: pool, replica_0: pool}
+const watchPools = pools => {
+    new client.Gauge({
+        name: 'db_pool_connections',
+        help: 'Connections in the database pools by state',
+        labelNames: ['pool', 'state'],
+        collect() {
+            Object.entries(pools).forEach(([name, pool]) => {
+                this.set({pool: name, state: 'total'}, pool.totalCount);
+                this.set({pool: name, state: 'idle'}, pool.idleCount);
+            });
+        }
+    });
+    new client.Gauge({
+        name: 'db_pool_waiting',
+        help: 'Queries waiting for a connection of the database pools',
+        labelNames: ['pool'],
+        collect() {
+            Object.entries(pools).forEach(([name, pool]) => {
+                this.set({pool: name}, pool.waitingCount);
+            });
+        }
+    });
+};
+
+const middleware = (req, res, next) => {
+    const end = requestDuration.startTimer();
+    res.on('finish', () => {
+        end({
+            method: req.method,
+            route: req.route ? req.route.path : 'none',
+            status: res.statusCode
+        });
+    });
+    next();
+};
+
+const timeDbFunction = (name, promise) => {
+    const end = dbFunctionDuration.startTimer({function: name});
+    return promise.then(data => {
+        end();
+        return data;
+    }, error => {
+        end();
+        throw error;
+    });
+};
+
+const countDbError = error => {
+    // postgres errors carry their SQLSTATE, pg-promise's own ones a number
+    const code = typeof error.code === 'string' ? error.code
+        : error.name === 'QueryResultError' ? 'query_result' : 'other';
+    dbErrors.inc({code});
+};
+
+const handler = (req, res) => {
+    res.set('Content-Type', client.register.contentType);
+    res.send(client.register.metrics());
+};
+
+module.exports = {
+    authDuration,
+    countDbError,
+    handler,
+    middleware,
+    timeDbFunction,
+    watchPools
+};
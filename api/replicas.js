@@ -0,0 +1,113 @@
+const cluster = require('cluster');
+
+// Routes the reads that tolerate replication lag to read replicas, in turn,
+// and everything else to the primary.
+//
+// Users read their own writes: for `stickiness` milliseconds after each of
+// their writes their reads go to the primary too. The next request of a
+// user may reach any worker of cluster.js, so workers tell each other of
+// the writes through the master, see relay. Not of each: a user is made
+// sticky for half as long again, and told of only when a write would
+// outlast that, so the master relays once per user every stickiness / 2
+// milliseconds at most, however fast they play. At most `maxUsers` users
+// are remembered, the ones who wrote last.
+class Replicas {
+    constructor(primary, replicas, stickiness, maxUsers) {
+        this.primary = primary;
+        this.replicas = replicas;
+        this.stickiness = stickiness;
+        this.maxUsers = maxUsers;
+        this.next = 0;
+        // user => when they stop reading from the primary, in the order
+        // they were set, so the first to expire come first
+        this.sticky = new Map();
+        if (cluster.isWorker && replicas.length) {
+            process.on('message', message => {
+                if (message && message.replicasWrote) {
+                    const {user, until} = message.replicasWrote;
+                    if (!(this.sticky.get(user) >= until)) {
+                        this.remember(user, until);
+                    }
+                }
+            });
+        }
+    }
+
+    remember(user, until) {
+        const now = Date.now();
+        for (const [first, firstUntil] of this.sticky) {
+            if (firstUntil > now && this.sticky.size < this.maxUsers) {
+                break;
+            }
+            this.sticky.delete(first);
+        }
+        this.sticky.delete(user);
+        this.sticky.set(user, until);
+    }
+
+    // `user` wrote, or is writing, to the primary
+    wrote(user) {
+        if (!this.replicas.length || !user) {
+            return;
+        }
+        const now = Date.now();
+        if (this.sticky.get(user) >= now + this.stickiness) {
+            return; // the workers know already
+        }
+        const until = now + this.stickiness * 1.5;
+        this.remember(user, until);
+        if (cluster.isWorker) {
+            process.send({replicasWrote: {user, until}});
+        }
+    }
+
+    // the database `user` reads from, user may be null for shared data
+    pick(user) {
+        if (!this.replicas.length) {
+            return this.primary;
+        }
+        const until = user && this.sticky.get(user);
+        if (until && until > Date.now()) {
+            return this.primary;
+        }
+        this.next = (this.next + 1) % this.replicas.length;
+        return this.replicas[this.next];
+    }
+
+    // Resolves to call(db) with the database `user` reads from. When that
+    // is a replica which cannot answer, it is called with the primary.
+    read(user, call) {
+        const db = this.pick(user);
+        if (db === this.primary) {
+            return call(db);
+        }
+        return call(db).catch(error => {
+            if (!replicaFailure(error)) {
+                throw error;
+            }
+            return call(this.primary);
+        });
+    }
+}
+
+// A replica that is down, or that cancelled a query conflicting with the
+// changes it was replaying. Errors from the database itself, and no rows
+// where some were expected, are the answer.
+const replicaFailure = error => error.name !== 'QueryResultError'
+    && (!error.severity || error.code === '40001'); // serialization_failure
+
+// In the master of cluster.js: passes the writes a worker tells of on to
+// the others.
+Replicas.relay = () => {
+    cluster.on('message', (sender, message) => {
+        if (message && message.replicasWrote) {
+            Object.values(cluster.workers).forEach(worker => {
+                if (worker !== sender) {
+                    worker.send(message);
+                }
+            });
+        }
+    });
+};
+
+module.exports = Replicas;
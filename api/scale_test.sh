@@ -0,0 +1,33 @@
+#!/usr/bin/env bash
+# Throughput of the API by number of workers: starts cluster.js with each
+# WEB_CONCURRENCY given, runs load_test.py against it and prints one total
+# line per run. The database at DATABASE_URL must be initialized.
+#
+#     ./scale_test.sh 1 2 4 8
+#
+# PLAYERS and CONCURRENCY are passed to load_test.py, PG_POOL_MAX and the
+# other settings of app.js are passed to the workers.
+set -e
+cd "$(dirname "$0")"
+
+counts=("$@")
+if [ ${#counts[@]} -eq 0 ]; then
+    counts=(1 2 4)
+fi
+port=${SCALE_TEST_PORT:-5100}
+players=${PLAYERS:-400}
+concurrency=${CONCURRENCY:-64}
+
+for workers in "${counts[@]}"; do
+    WEB_CONCURRENCY=$workers PORT=$port LOG_LEVEL=warn node cluster.js &
+    pid=$!
+    until curl -fs "http://localhost:$port/ready" > /dev/null; do
+        kill -0 $pid
+        sleep 0.2
+    done
+    result=$(./load_test.py --host "http://localhost:$port/" \
+        --players "$players" --concurrency "$concurrency" | grep '^total:')
+    echo "workers: $workers, $result"
+    kill -TERM $pid
+    wait $pid || true
+done
@@ -0,0 +1,51 @@
+const {PreparedStatement} = require('pg-promise');
+
+// Named prepared statements for the queries run on every turn of the game.
+// A connection parses and plans each of them the first time it runs it and
+// keeps it, later calls only bind the values and execute. Names are those
+// of the functions called, they label db_function_duration_seconds too.
+//
+// The game is played through the functions keyed by dungeon id, with the
+// player resolved when authenticating, see withPlayer in app.js:
+//
+//     db.callStatement(statements.fight_enemy, [dungeonId, enemyId])
+
+const statement = (name, text) => new PreparedStatement(name, text);
+
+module.exports = {
+    authenticate: statement('authenticate',
+        'SELECT U.password_hash, P.character_id, P.dungeon_id ' +
+        'FROM users AS U LEFT JOIN get_player(U.email) AS P ON true ' +
+        'WHERE U.email = $1'),
+    get_player: statement('get_player',
+        'SELECT * FROM get_player($1)'),
+    get_character_dices: statement('get_character_dices',
+        'SELECT * FROM get_character_dices($1)'),
+    create_character: statement('create_character',
+        'SELECT * FROM create_character($1, $2, $3, $4, $5, $6, $7)'),
+    // the catalog version is in the compact state, and so in its ETag
+    get_dungeon_version: statement('get_dungeon_version_by_id',
+        'SELECT get_dungeon_version_by_id($1) AS version, ' +
+        'get_catalog_version() AS catalog_version'),
+    // $2 is true for the compact state, see get_dungeon_parts_by_id
+    get_dungeon_state: statement('get_dungeon_state_by_id',
+        'SELECT state::TEXT AS state, state->>\'version\' AS version, ' +
+        '(state->>\'catalog_version\')::INTEGER AS catalog_version ' +
+        'FROM get_dungeon_state_by_id($1, $2) AS S(state)'),
+    get_catalog_version: statement('get_catalog_version',
+        'SELECT get_catalog_version() AS version'),
+    get_catalog: statement('get_catalog',
+        'SELECT catalog::TEXT AS catalog, ' +
+        '(catalog->>\'version\')::INTEGER AS version ' +
+        'FROM get_catalog() AS C(catalog)'),
+    follow_gate: statement('follow_gate_by_id',
+        'SELECT * FROM follow_gate_by_id($1, $2)'),
+    fight_enemy: statement('fight_enemy_by_id',
+        'SELECT * FROM fight_enemy_by_id($1, $2)'),
+    take_item: statement('take_item_by_id',
+        'SELECT take_item_by_id($1, $2) AS id'),
+    use_item: statement('use_item_by_id',
+        'SELECT use_item_by_id($1, $2)'),
+    room_search: statement('room_search_by_id',
+        'SELECT * FROM room_search_by_id($1)')
+};
@@ -1,70 +1,86 @@
 #!/usr/bin/env python3
 
+import json
 import unittest
-import requests
 from requests import codes
 from sys import argv as args
 import sys
 from os.path import dirname, realpath
+from uuid import uuid4
+
+from client import DungeonClient
 
 heroku = len(args) >= 2 and args[1] == 'heroku'
 if heroku:
     sys.argv = args[:1] + args[2:]
 
+jobs = 1
+if len(sys.argv) >= 3 and sys.argv[1] in ('-j', '--jobs'):
+    jobs = int(sys.argv[2])
+    sys.argv = sys.argv[:1] + sys.argv[3:]
+
 if heroku:
     host = 'https://progetto-db.herokuapp.com/'
 else:
     host = 'http://localhost:8000/'
 
 if heroku:
-    init_db_script = (
-        'heroku run node db/heroku_init_db.js '
-        ' db/schema.sql'
-        ' db/data.sql'
-        ' db/functions.sql'
-    )
+    init_db_script = 'heroku run node db/heroku_init_db.js'
 else:
-    init_db_script = dirname(realpath(__file__)) + (
-        '/../db/docker_init_db.sh '
-        'schema.sql '
-        'functions.sql '
-        'data.sql '
-    )
+    # a fresh copy of the template database, rebuilt when the sql changes
+    init_db_script = dirname(realpath(__file__)) + '/../db/bootstrap.sh clone'
 
 
-def url(path):
-    return host + path
+# when running in parallel the database is initialized once, before forking
+init_db = True
 
 
-user = {
-    'email': 'test@example.com',
-    'nickname': 'test_nickname',
-    'password': 'test_password'
-}
+def new_user():
+    # every test gets its own account, so tests can run concurrently
+    name = uuid4().hex[:15]
+    return {
+        'email': 'test_{}@example.com'.format(name),
+        'nickname': 't_{}'.format(name),
+        'password': 'test_password'
+    }
 
-auth = (
-    user['email'],
-    user['password']
-)
+
+def init_database():
+    import subprocess
+    result = subprocess.run(
+        init_db_script,
+        shell=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError('{} failed:\n{}'.format(
+            init_db_script, result.stderr
+        ))
 
 
 class TestDungeonAsDB(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        from os import devnull
-        import subprocess
-        with open(devnull, 'w') as DEVNULL:
-            # TODO: if db init fails, fail tests, too
-            subprocess.call(init_db_script, shell=True,
-                            stdout=DEVNULL, stderr=subprocess.STDOUT)
+        if init_db:
+            init_database()
+
+    def setUp(self):
+        self.user = new_user()
+        self.auth = (
+            self.user['email'],
+            self.user['password']
+        )
+        self.client = DungeonClient(host, auth=self.auth)
 
     def tearDown(self):
-        requests.delete(url('user'), auth=auth)
+        self.client.delete_user()
+        self.client.close()
 
     def test_signup(self):
-        request_data = user
-        response = requests.post(url('user'), data=request_data)
+        response = self.client.signup(**self.user)
         self.assertIn(
             response.status_code,
             [codes.no_content, codes.conflict]
@@ -72,21 +88,22 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_login(self):
         self.test_signup()
-        response = requests.get(url('user'), auth=auth)
+        response = self.client.user()
         self.assertEqual(
             response.status_code,
             codes.ok
         )
-        self.assertEqual(response.json()['email'], user['email'])
-        self.assertEqual(response.json()['nickname'], user['nickname'])
+        self.assertEqual(response.json()['email'], self.user['email'])
+        self.assertEqual(response.json()['nickname'], self.user['nickname'])
 
     def test_cant_login_with_wrong_password(self):
         self.test_signup()
         auth = (
-            user['email'],
-            user['password'] + '_wrong'
+            self.user['email'],
+            self.user['password'] + '_wrong'
         )
-        response = requests.get(url('user'), auth=auth)
+        with DungeonClient(host, auth=auth) as client:
+            response = client.user()
         self.assertEqual(
             response.status_code,
             codes.unauthorized
@@ -94,7 +111,7 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_create_character(self):
         self.test_signup()
-        rolls = requests.get(url('dices'), auth=auth).json()
+        rolls = self.client.dices().json()
         self.assertEqual(len(rolls), 5)
         for roll in rolls:
             self.assertTrue(roll['dice_1'] >= 1 and roll['dice_1'] <= 6)
@@ -108,7 +125,7 @@ class TestDungeonAsDB(unittest.TestCase):
             'dexterity': rolls[2]['id'],
             'constitution': rolls[3]['id']
         }
-        response = requests.post(url('character'), auth=auth, data=data)
+        response = self.client.create_character(**data)
         self.assertEqual(
             response.status_code,
             codes.created
@@ -116,13 +133,13 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_cant_roll_twice_character_dices(self):
         self.test_signup()
-        rolls_response = requests.get(url('dices'), auth=auth)
+        rolls_response = self.client.dices()
         self.assertEqual(
             rolls_response.status_code,
             codes.ok
         )
         rolls = rolls_response.json()
-        another_rolls_response = requests.get(url('dices'), auth=auth)
+        another_rolls_response = self.client.dices()
         self.assertEqual(
             another_rolls_response.status_code,
             codes.ok
@@ -136,19 +153,19 @@ class TestDungeonAsDB(unittest.TestCase):
             'dexterity': rolls[2]['id'],
             'constitution': rolls[3]['id']
         }
-        response = requests.post(url('character'), auth=auth, data=data)
+        response = self.client.create_character(**data)
         self.assertEqual(
             response.status_code,
             codes.created
         )
         self.assertEqual(
-            requests.get(url('dices'), auth=auth).status_code,
+            self.client.dices().status_code,
             codes.not_found
         )
 
     def test_cant_create_another_character(self):
         self.test_signup()
-        rolls = requests.get(url('dices'), auth=auth).json()
+        rolls = self.client.dices().json()
         data = {
             'name': 'test_character_name',
             'description': 'test character not very long description',
@@ -158,11 +175,11 @@ class TestDungeonAsDB(unittest.TestCase):
             'constitution': rolls[3]['id']
         }
         self.assertEqual(
-            requests.post(url('character'), auth=auth, data=data).status_code,
+            self.client.create_character(**data).status_code,
             codes.created
         )
         self.assertIn(
-            requests.post(url('character'), auth=auth, data=data).status_code,
+            self.client.create_character(**data).status_code,
             [
                 codes.conflict,
                 codes.bad_request
@@ -171,7 +188,7 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_cant_create_wrong_character(self):
         self.test_signup()
-        rolls = requests.get(url('dices'), auth=auth).json()
+        rolls = self.client.dices().json()
         data = {
             'name': 'test_character_name',
             'description': 'test_character_not_very_long_description',
@@ -180,7 +197,7 @@ class TestDungeonAsDB(unittest.TestCase):
             'dexterity': rolls[0]['id'],
             'constitution': rolls[2]['id']
         }
-        response = requests.post(url('character'), auth=auth, data=data)
+        response = self.client.create_character(**data)
         self.assertEqual(
             response.status_code,
             codes.bad_request
@@ -188,7 +205,7 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_start_dungeon(self):
         self.test_create_character()
-        response = requests.post(url('dungeon'), auth=auth)
+        response = self.client.start_dungeon()
         self.assertEqual(
             response.status_code,
             codes.created
@@ -196,8 +213,8 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_cant_start_another_dungeon(self):
         self.test_start_dungeon()
-        requests.post(url('dungeon'), auth=auth)
-        response = requests.post(url('dungeon'), auth=auth)
+        self.client.start_dungeon()
+        response = self.client.start_dungeon()
         self.assertEqual(
             response.status_code,
             codes.conflict
@@ -205,7 +222,7 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_dungeon_status(self):
         self.test_start_dungeon()
-        response = requests.get(url('dungeon'), auth=auth)
+        response = self.client.dungeon()
         self.assertEqual(
             response.status_code,
             codes.ok
@@ -278,24 +295,90 @@ class TestDungeonAsDB(unittest.TestCase):
             self.assertIn('id', gate)
             self.assertIn('room', gate)
 
+    def test_dungeon_not_modified(self):
+        self.test_start_dungeon()
+        response = self.client.request('GET', '/dungeon', 'dungeon')
+        self.assertEqual(response.status_code, codes.ok)
+        etag = response.headers['ETag']
+        response = self.client.request(
+            'GET', '/dungeon', 'dungeon', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, codes.not_modified)
+        gate_id = self.client.dungeon().json()['room']['gates'][0]['id']
+        self.client.follow_gate(gate_id)
+        response = self.client.request(
+            'GET', '/dungeon', 'dungeon', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, codes.ok)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_catalog(self):
+        response = self.client.catalog()
+        self.assertEqual(response.status_code, codes.ok)
+        catalog = response.json()
+        self.assertIn('version', catalog)
+        self.assertTrue(len(catalog['items']) > 0)
+        self.assertTrue(len(catalog['enemies']) > 0)
+        response = self.client.catalog(catalog['version'])
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        response = self.client.request(
+            'GET', '/catalog', 'catalog', auth=None,
+            headers={'If-None-Match': response.headers['ETag']}
+        )
+        self.assertEqual(response.status_code, codes.not_modified)
+
+    def test_compact_dungeon_state(self):
+        self.test_start_dungeon()
+        response = self.client.dungeon(compact=True)
+        self.assertEqual(response.status_code, codes.ok)
+        state = response.json()
+        catalog = self.client.catalog(state['catalog_version']).json()
+        items = {item['id'] for item in catalog['items']}
+        enemies = {enemy['id'] for enemy in catalog['enemies']}
+        for item in state['character']['bag'] + state['room']['items']:
+            self.assertIn(item['item'], items)
+            self.assertNotIn('name', item)
+        for enemy in state['room']['enemies']:
+            self.assertIn(enemy['enemy'], enemies)
+            self.assertIn('hit_points', enemy)
+            self.assertNotIn('name', enemy)
+        self.assertEqual(
+            self.client.dungeon(compact=True).json(),
+            state
+        )
+        bag = self.client.dungeon().json()['character']['bag']
+        self.assertIn('name', bag[0])
+
     def test_end_dungeon(self):
         self.test_start_dungeon()
         self.assertEqual(
-            requests.post(url('dungeon'), auth=auth).status_code,
+            self.client.start_dungeon().status_code,
             codes.conflict
         )
         self.assertEqual(
-            requests.delete(url('dungeon'), auth=auth).status_code,
+            self.client.end_dungeon().status_code,
             codes.ok
         )
         self.assertEqual(
-            requests.post(url('dungeon'), auth=auth).status_code,
+            self.client.start_dungeon().status_code,
             codes.created
         )
 
+    def test_cant_play_ended_dungeon(self):
+        self.test_start_dungeon()
+        enemy = self.client.dungeon().json()['room']['enemies'][0]
+        self.assertEqual(self.client.end_dungeon().status_code, codes.ok)
+        self.assertEqual(
+            self.client.fight_enemy(enemy['id']).status_code,
+            codes.not_found
+        )
+        self.assertEqual(self.client.dungeon().status_code, codes.not_found)
+        self.assertEqual(self.client.start_dungeon().status_code, codes.created)
+        self.assertEqual(self.client.dungeon().status_code, codes.ok)
+
     def test_delete_user(self):
         self.test_signup()
-        response = requests.delete(url('user'), auth=auth)
+        response = self.client.delete_user()
         self.assertEqual(
             response.status_code,
             codes.ok
@@ -303,17 +386,14 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_follow_gate_to_other_room(self):
         self.test_start_dungeon()
-        old_room = requests.get(url('dungeon'), auth=auth).json()['room']
+        old_room = self.client.dungeon().json()['room']
         gate_id = old_room['gates'][0]['id']
-        response = requests.get(
-            url('dungeon/gate/{gate_id}'.format(gate_id=gate_id)),
-            auth=auth
-        )
+        response = self.client.follow_gate(gate_id)
         self.assertEqual(
             response.status_code,
             codes.ok
         )
-        new_room = requests.get(url('dungeon'), auth=auth).json()['room']
+        new_room = self.client.dungeon().json()['room']
         self.assertNotEqual(
             old_room['id'],
             new_room['id']
@@ -329,19 +409,16 @@ class TestDungeonAsDB(unittest.TestCase):
         # if X + 1d20 > 12 then
         #   B.pf = B.pf - (A.arma.pf || A.danno)
         self.test_start_dungeon()
-        response = requests.get(url('dungeon'), auth=auth)
+        response = self.client.dungeon()
         character = response.json()['character']
 
         enemies = response.json()['room']['enemies']
         if len(enemies) < 1:
             self.skipTest('no enemies to fight')
         enemy = enemies[0]
-        response = requests.post(
-            url('dungeon/enemy/{enemy_id}'.format(enemy_id=enemy['id'])),
-            auth=auth
-        )
+        response = self.client.fight_enemy(enemy['id'])
         self.assertEqual(response.status_code, codes.ok)
-        after_attack_status = requests.get(url('dungeon'), auth=auth).json()
+        after_attack_status = self.client.dungeon().json()
         fights = response.json()
         self.assertEqual(len(fights), len(enemies) + 1)
         for fight in fights:
@@ -392,47 +469,39 @@ class TestDungeonAsDB(unittest.TestCase):
             )
 
     def fight_til_clear_or_die(self):
-        dungeon = requests.get(url('dungeon'), auth=auth).json()
+        dungeon = self.client.dungeon().json()
         there_are_enemies = len(dungeon['room']['enemies']) > 0
         me_alive = dungeon['character']['hit_points'] > 0
         while there_are_enemies and me_alive :
             enemies = dungeon['room']['enemies']
             enemy = enemies[0]
-            requests.post(
-                url('dungeon/enemy/{enemy_id}'.format(enemy_id=enemy['id'])),
-                auth=auth)
-            dungeon = requests.get(url('dungeon'), auth=auth).json()
+            self.client.fight_enemy(enemy['id'])
+            dungeon = self.client.dungeon().json()
             there_are_enemies = len(dungeon['room']['enemies']) > 0
             me_alive = dungeon['character']['hit_points'] > 0
         return me_alive
 
     def test_take_item_from_room(self):
         self.test_start_dungeon()
-        dungeon = requests.get(url('dungeon'), auth=auth).json()
+        dungeon = self.client.dungeon().json()
         items = dungeon['room']['items']
         while len(items) == 0:
             import random
             gate_id = random.choice(dungeon['room']['gates'])['id']
-            requests.get(
-                url('dungeon/gate/{gate_id}'.format(gate_id=gate_id)),
-                auth=auth
-            )
-            dungeon = requests.get(url('dungeon'), auth=auth).json()
+            self.client.follow_gate(gate_id)
+            dungeon = self.client.dungeon().json()
             items = dungeon['room']['items']
         if not self.fight_til_clear_or_die():
             self.skipTest('died while clearing room from enemies')
         character_items = dungeon['character']['bag']
         item_id = items[0]['id']
-        response = requests.post(
-            url('dungeon/item/{item}'.format(item=item_id)),
-            auth=auth
-        )
+        response = self.client.take_item(item_id)
         self.assertEqual(
             response.status_code,
             codes.ok
         )
         self.assertEqual(type(response.json()['id']), type(1))
-        updated_character_items = requests.get(url('dungeon'), auth=auth).json()['character']['bag']
+        updated_character_items = self.client.dungeon().json()['character']['bag']
         self.assertEqual(
             len(updated_character_items),
             len(character_items) + 1
@@ -440,7 +509,7 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_use_consumable_item(self):
         self.test_start_dungeon()
-        dungeon = requests.get(url('dungeon'), auth=auth).json()
+        dungeon = self.client.dungeon().json()
         character = dungeon['character']
         items = character['bag']
         consumable_items = list(filter(
@@ -450,15 +519,12 @@ class TestDungeonAsDB(unittest.TestCase):
         if len(consumable_items) == 0:
             self.skipTest('can\'t test, don\'t have consumable items')
         item = consumable_items[0]
-        response = requests.post(
-            url('dungeon/bag/{item}'.format(item=item['id'])),
-            auth=auth
-        )
+        response = self.client.use_item(item['id'])
         self.assertEqual(
             response.status_code,
             codes.ok
         )
-        updated_dungeon = requests.get(url('dungeon'), auth=auth).json()
+        updated_dungeon = self.client.dungeon().json()
         updated_character = updated_dungeon['character']
         self.assertEqual(
             updated_character['attack'],
@@ -482,23 +548,17 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_drop_bonus_on_room_change(self):
         self.test_start_dungeon()
-        before_bonus_character = requests.get(url('dungeon'), auth=auth).json()['character']
+        before_bonus_character = self.client.dungeon().json()['character']
         item_id = list(filter(
             lambda i: i['category'] == 'consumable',
             before_bonus_character['bag']
         ))[0]['id']
-        requests.post(
-            url('dungeon/bag/{itemId}'.format(itemId=item_id)),
-            auth=auth
-        )
-        dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+        self.client.use_item(item_id)
+        dungeon_status = self.client.dungeon().json()
         after_bonus_character = dungeon_status['character']
         gate_id = dungeon_status['room']['gates'][0]['id']
-        fights = requests.get(
-            url('dungeon/gate/{gate_id}'.format(gate_id=gate_id)),
-            auth=auth
-        ).json()
-        after_gate_character = requests.get(url('dungeon'), auth=auth).json()['character']
+        fights = self.client.follow_gate(gate_id).json()
+        after_gate_character = self.client.dungeon().json()['character']
         self.assertEqual(
             after_gate_character['attack'],
             before_bonus_character['attack']
@@ -527,7 +587,7 @@ class TestDungeonAsDB(unittest.TestCase):
     def search_wearable_item(self):
         import random
         wearable_item = None
-        dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+        dungeon_status = self.client.dungeon().json()
         room_wearable_items = [
             item
             for item in dungeon_status['room']['items']
@@ -535,35 +595,26 @@ class TestDungeonAsDB(unittest.TestCase):
         ]
         while len(room_wearable_items) < 1:
             gate_id = random.choice(dungeon_status['room']['gates'])['id']
-            requests.get(
-                url('dungeon/gate/{gate_id}'.format(gate_id=gate_id)),
-                auth=auth
-            )
-            dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+            self.client.follow_gate(gate_id)
+            dungeon_status = self.client.dungeon().json()
             room_wearable_items = [
                 item
                 for item in dungeon_status['room']['items']
                 if item['category'] != 'consumable'
             ]
         self.fight_til_clear_or_die()
-        wearable_item = requests.post(
-                url('dungeon/item/{item}'.format(item=random.choice(room_wearable_items)['id'])),
-                auth=auth
-        ).json()['id']
+        wearable_item = self.client.take_item(random.choice(room_wearable_items)['id']).json()['id']
         return wearable_item
 
     def test_equip_wearable_item(self):
         self.test_start_dungeon()
         wearable_item_id = self.search_wearable_item()
-        response = requests.post(
-            url('dungeon/bag/{item}'.format(item=wearable_item_id)),
-            auth=auth
-        )
+        response = self.client.use_item(wearable_item_id)
         self.assertEqual(
             response.status_code,
             codes.ok
         )
-        dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+        dungeon_status = self.client.dungeon().json()
         updated_character = dungeon_status['character']
         wearable_item = [
                 item for item in updated_character['bag']
@@ -579,18 +630,15 @@ class TestDungeonAsDB(unittest.TestCase):
 
     def test_cant_search_with_enemies(self):
         self.test_start_dungeon()
-        dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+        dungeon_status = self.client.dungeon().json()
         enemies = dungeon_status['room']['enemies']
         while len(enemies) == 0:
             import random
             gate_id = random.choice(dungeon_status['room']['gates']['id'])
-            requests.get(
-                url('dungeon/gate/{gate_id}'.format(gate_id=gate_id)),
-                auth=auth
-            )
-            dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+            self.client.follow_gate(gate_id)
+            dungeon_status = self.client.dungeon().json()
             enemies = dungeon_status['room']['enemies']
-        response = requests.get(url('dungeon/search'), auth=auth)
+        response = self.client.search()
         self.assertEqual(response.status_code, codes.I_AM_A_TEAPOT)
 
     def test_search_item(self):
@@ -598,13 +646,13 @@ class TestDungeonAsDB(unittest.TestCase):
         self.test_start_dungeon()
         if not self.fight_til_clear_or_die():
             self.skipTest('died while clearing room from enemies')
-        old_dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+        old_dungeon_status = self.client.dungeon().json()
         can_search = old_dungeon_status['character']['hit_points'] > 1
         while can_search and not (found_gate and found_item):
-            old_dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+            old_dungeon_status = self.client.dungeon().json()
             old_room_items = old_dungeon_status['room']['items']
             old_gates = old_dungeon_status['room']['gates']
-            response = requests.get(url('dungeon/search'), auth=auth)
+            response = self.client.search()
             if response.status_code == 418:
                 self.assertTrue(
                     response.json()['roll'] >= old_dungeon_status['character']['wisdom']
@@ -616,7 +664,7 @@ class TestDungeonAsDB(unittest.TestCase):
             type_found = response.json()['type']
             found_item = found_item or type_found == 'item'
             found_gate = found_gate or type_found == 'gate'
-            dungeon_status = requests.get(url('dungeon'), auth=auth).json()
+            dungeon_status = self.client.dungeon().json()
             if type_found:
                 id_found = response.json()['id']
             if type_found == 'item':
@@ -643,11 +691,128 @@ class TestDungeonAsDB(unittest.TestCase):
                 )
             )
 
+    def test_dungeon_events(self):
+        self.test_start_dungeon()
+        events = self.client.request(
+            'GET', '/dungeon/events', 'dungeon/events', stream=True, timeout=10
+        )
+        self.assertEqual(events.status_code, codes.ok)
+        lines = events.iter_lines(decode_unicode=True)
+
+        def changes():
+            for line in lines:
+                if line.startswith('data:'):
+                    yield json.loads(line[len('data:'):])
+
+        # notifications reach the stream once it says to refetch
+        self.assertTrue(next(lines).startswith('retry:'))
+        ready = next((c for c in changes() if c.get('refetch')), None)
+        self.assertIsNotNone(ready)
+        gate_id = self.client.dungeon().json()['room']['gates'][0]['id']
+        self.client.follow_gate(gate_id)
+        change = next(
+            (c for c in changes() if c.get('event') == 'follow_gate'), None
+        )
+        events.close()
+        self.assertIsNotNone(change)
+        self.assertEqual(change['user'], self.user['email'])
+        if change['state'] is not None:  # else died running away
+            room = self.client.dungeon().json()['room']
+            self.assertEqual(change['state']['room']['id'], room['id'])
+            self.assertEqual(change['state']['room']['gates'], room['gates'])
+
+    def test_batch_actions(self):
+        self.test_start_dungeon()
+        enemy = self.client.dungeon().json()['room']['enemies'][0]
+        response = self.client.actions([
+            {'action': 'fight', 'id': enemy['id']},
+            {'action': 'fight', 'id': enemy['id']}
+        ])
+        self.assertEqual(response.status_code, codes.ok)
+        batch = response.json()
+        self.assertEqual(len(batch['results']), 2)
+        for result in batch['results']:
+            self.assertEqual(result['action'], 'fight')
+        self.assertNotIn('error', batch['results'][0])
+        if 'error' in batch['results'][1]:
+            # died in the first fight: the dungeon is over
+            self.assertEqual(batch['results'][1]['error']['code'], 'P0002')
+            self.assertIsNone(batch['dungeon'])
+        self.assertIn(
+            enemy['id'],
+            [fight['id'] for fight in batch['results'][0]['result']
+             if fight['type'] == 'attacking']
+        )
+        if batch['dungeon'] is not None:
+            self.assertEqual(
+                batch['dungeon']['character']['hit_points'],
+                self.client.dungeon().json()['character']['hit_points']
+            )
+
+    def test_batch_stops_at_failed_action(self):
+        self.test_start_dungeon()
+        enemies = self.client.dungeon().json()['room']['enemies']
+        self.assertTrue(len(enemies) > 0)
+        response = self.client.actions([
+            {'action': 'search'},
+            {'action': 'fight', 'id': enemies[0]['id']}
+        ])
+        self.assertEqual(response.status_code, codes.ok)
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['error']['code'], 'P0001')
+        self.assertEqual(
+            sorted(e['id'] for e in response.json()['dungeon']['room']['enemies']),
+            sorted(e['id'] for e in enemies)
+        )
+
+    def test_cant_batch_unknown_action(self):
+        self.test_start_dungeon()
+        response = self.client.actions([{'action': 'teleport'}])
+        self.assertEqual(response.status_code, codes.bad_request)
 
     # TODO: test_cant_take_too_many_items
 
 
+def run_test(name):
+    result = unittest.TestResult()
+    unittest.defaultTestLoader.loadTestsFromName(
+        name, sys.modules[__name__]
+    ).run(result)
+    return (
+        name,
+        [trace for _, trace in result.failures + result.errors],
+        len(result.skipped)
+    )
+
+
+def run_parallel(jobs):
+    global init_db
+    from multiprocessing import Pool
+    init_database()
+    init_db = False
+    names = [
+        '{}.{}'.format(TestDungeonAsDB.__name__, name)
+        for name in unittest.defaultTestLoader.getTestCaseNames(TestDungeonAsDB)
+    ]
+    with Pool(jobs) as pool:
+        results = pool.map(run_test, names, chunksize=1)
+    failed = 0
+    for name, traces, skipped in results:
+        status = 'FAIL' if traces else ('skip' if skipped else 'ok')
+        print('{} ... {}'.format(name, status))
+        for trace in traces:
+            print(trace)
+        failed += bool(traces)
+    print('Ran {} tests with {} jobs, {} failed'.format(
+        len(results), jobs, failed
+    ))
+    return failed == 0
+
+
 if __name__ == '__main__':
+    if jobs > 1:
+        sys.exit(0 if run_parallel(jobs) else 1)
     from colour_runner.runner import ColourTextTestRunner
     unittest.main(
         verbosity=2,
@@ -0,0 +1,27 @@
+#!/usr/bin/env bash
+# Compares a function with its legacy copy from legacy.sql:
+#
+#   ./bench.sh generate_rooms --time=30 --client=1
+#
+# runs <benchmark>.pgbench and <benchmark>_legacy.pgbench with pgbench,
+# passing along any other option, and prints their throughput. The
+# scripts share the bench@example.com player, so keep --client=1.
+
+set -e
+cd "$(dirname "$0")"
+
+benchmark=$1
+shift
+options=("$@")
+if [ ${#options[@]} -eq 0 ]; then
+    options=(--time=30)
+fi
+db=${DATABASE_URL:-postgres://dungeon_as_db_superuser@localhost:5432/dungeon_as_db}
+
+psql "$db" --quiet -v ON_ERROR_STOP=1 --file=setup.sql --file=legacy.sql
+
+for script in "$benchmark.pgbench" "${benchmark}_legacy.pgbench"; do
+    echo "== $script"
+    pgbench "$db" --no-vacuum --file="$script" "${options[@]}" \
+        | grep -E '^(tps|latency|number of transactions actually)'
+done
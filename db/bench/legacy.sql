@@ -0,0 +1,221 @@
+-- Copies of functions as they were before being optimized, renamed with
+-- a legacy_ prefix, so bench.sh can measure the old and new versions
+-- against the same database.
+
+DROP FUNCTION IF EXISTS legacy_create_room(INTEGER);
+CREATE FUNCTION legacy_create_room(
+    dungeon INTEGER
+) RETURNS INTEGER AS $$
+    DECLARE
+        max_items CONSTANT SMALLINT := 10;
+        max_enemies CONSTANT SMALLINT := 2;
+        min_enemies CONSTANT SMALLINT := 1;
+        room_id INTEGER;
+    BEGIN
+        INSERT INTO rooms (dungeon, description)
+        VALUES (dungeon, (
+            SELECT id FROM rooms_descriptions 
+            WHERE id != 0 
+            ORDER BY random() 
+            LIMIT 1
+        )) RETURNING id INTO room_id;
+        
+        INSERT INTO room_items (room, hidden, item)
+        SELECT
+            room_id,
+            random() > 0.2, 
+            id
+        FROM items ORDER BY random() 
+        LIMIT floor(random() * (max_items + 1));
+
+        INSERT INTO room_enemies (room, enemy, current_hit_points)
+        SELECT
+            room_id,
+            id,
+            initial_hit_points
+        FROM enemies 
+        ORDER BY random() 
+        LIMIT floor( random() * (max_enemies + 1 - min_enemies) + min_enemies );
+
+        RETURN room_id;
+    END;
+$$ LANGUAGE 'plpgsql';
+
+DROP FUNCTION IF EXISTS legacy_generate_rooms(INTEGER);
+CREATE FUNCTION legacy_generate_rooms(
+    dungeon_id INTEGER, 
+    OUT start_room INTEGER, 
+    OUT final_room INTEGER
+) AS $$
+    DECLARE
+        n_rooms_visible_path CONSTANT SMALLINT := 5;
+        n_other_rooms CONSTANT SMALLINT := 5;
+        previous_room INTEGER;
+    BEGIN
+        -- create start_room
+        SELECT legacy_create_room(dungeon_id) INTO start_room;
+        -- create rooms and visible path from start_room to final_room
+        previous_room := start_room;
+        FOR i IN 3..n_rooms_visible_path LOOP
+            SELECT legacy_create_room(dungeon_id) INTO final_room;
+            INSERT INTO gates(dungeon, room_from, room_to, hidden)
+            VALUES (dungeon_id, previous_room, final_room, false);
+            previous_room := final_room;
+        END LOOP;
+        -- create some other random room
+        FOR i IN 1..n_other_rooms LOOP
+            PERFORM legacy_create_room(dungeon_id);
+        END LOOP;
+        -- create random gates
+        INSERT INTO gates (dungeon, room_from, room_to, hidden)
+        SELECT dungeon_id, legal_gates.from_id, legal_gates.to_id, random() > 0.5
+        FROM (
+            (
+                -- possible gates
+                SELECT "from".id AS from_id, "to".id AS to_id
+                FROM rooms AS "from" JOIN rooms AS "to"
+                ON "from".id < "to".id
+                AND "from".dungeon = dungeon_id
+                AND "to".dungeon = dungeon_id
+            ) EXCEPT (
+                -- existent gates
+                SELECT room_from, room_to FROM gates WHERE dungeon = dungeon_id
+                UNION ALL
+                SELECT room_to, room_from FROM gates WHERE dungeon = dungeon_id
+            )
+        ) AS legal_gates
+        WHERE random() > 0.5; -- with probability of 1/2
+        -- create the final final_room
+        INSERT INTO rooms (dungeon, description)
+        VALUES (
+            dungeon_id, 
+            (
+                SELECT value FROM defaults WHERE key = 'final_room_description'
+            )
+        ) RETURNING id INTO final_room;
+        -- create visible gate from previous final_room to final final_room
+        INSERT INTO gates (dungeon, room_from, room_to, hidden)
+        VALUES (dungeon_id, previous_room, final_room, false);
+    END;
+$$ LANGUAGE 'plpgsql';
+
+DROP FUNCTION IF EXISTS legacy_fight_enemy(VARCHAR, INTEGER);
+CREATE FUNCTION legacy_fight_enemy(user_email VARCHAR(254), enemy_id INTEGER)
+RETURNS TABLE (
+    type VARCHAR,
+    id INTEGER,
+    damage SMALLINT,
+    value SMALLINT,
+    dice SMALLINT,
+    hit BOOLEAN
+) AS $$
+DECLARE
+    fight RECORD;
+BEGIN
+    CREATE TEMP TABLE fights ON COMMIT DROP AS
+    SELECT 
+        R.type::VARCHAR AS type,
+        R.id::INTEGER AS id,
+        R.damage::SMALLINT AS damage,
+        R.value::SMALLINT AS value,
+        R.dice::SMALLINT AS dice,
+        R.value + R.dice > 12 AS hit
+    FROM (
+        (SELECT
+            'attacking' AS type,
+            enemy_id AS id,
+            items.hit_points AS damage,
+            ((characters.strength + characters.dexterity) / 2 + D.room_attack_bonus - enemies.defence) AS value,
+            (floor(random() * 20) + 1) AS dice
+        FROM characters JOIN character_items
+            ON characters.equipped_attack_item = character_items.id
+        JOIN items
+            ON items.id = character_items.item
+        JOIN dungeons AS D
+            ON D."character" = characters.id
+        JOIN room_enemies
+            ON room_enemies.id = enemy_id
+        JOIN enemies
+            ON room_enemies.enemy = enemies.id
+        WHERE characters."user" = user_email
+        LIMIT 1)
+    UNION
+        (SELECT 
+            'defending' AS "type",
+            room_enemies.id AS id,
+            enemies.damage AS damage,
+            enemies.attack - ((characters.constitution + characters.dexterity) / 2 + D.room_defence_bonus) AS value,
+            floor(random() * 20) + 1 AS dice
+            FROM room_enemies JOIN enemies
+                ON room_enemies.enemy = enemies.id
+            JOIN dungeons
+                ON room_enemies.room = dungeons.current_room
+            JOIN characters
+                ON dungeons."character" = characters.id
+            JOIN dungeons AS D
+                ON D."character" = characters.id
+            WHERE characters."user" = user_email)
+    ) AS R;
+    UPDATE dungeons
+        SET current_bonusless_hp = GREATEST(
+            current_bonusless_hp - (
+                SELECT SUM(fights.damage)
+                FROM fights
+                WHERE fights."type" = 'defending'
+                AND fights.hit = true
+            ),
+            0
+        ) WHERE dungeons."character" = (
+            SELECT C.id FROM characters AS C WHERE C."user" = user_email
+        );
+    UPDATE room_enemies AS RE
+        SET current_hit_points = RE.current_hit_points - fights.damage
+        FROM fights
+        WHERE RE.id = fights.id
+        AND fights."type" = 'attacking' AND fights.hit;
+    RETURN QUERY SELECT * FROM fights;
+END;
+$$ LANGUAGE 'plpgsql';
+
+DROP FUNCTION IF EXISTS legacy_follow_gate(VARCHAR, INTEGER);
+CREATE FUNCTION legacy_follow_gate(user_email VARCHAR(254), gate_id INTEGER)
+RETURNS TABLE (
+    type VARCHAR,
+    id INTEGER,
+    damage SMALLINT,
+    value SMALLINT,
+    dice SMALLINT,
+    hit BOOLEAN
+) AS $$
+DECLARE
+    room_over_gate INTEGER;
+    user_character INTEGER;
+    user_dungeon INTEGER;
+    user_current_room INTEGER;
+BEGIN
+    CREATE TEMP TABLE run_away_fights ON COMMIT DROP AS
+        SELECT * FROM legacy_fight_enemy(user_email, NULL);
+    SELECT characters.id
+        FROM characters
+        WHERE characters."user" = user_email
+        LIMIT 1
+        INTO user_character;
+    SELECT dungeons.id, dungeons.current_room
+        FROM dungeons
+        WHERE dungeons."character" = user_character
+        LIMIT 1
+        INTO user_dungeon, user_current_room;
+    SELECT
+        CASE WHEN user_current_room = gates.room_from
+            THEN gates.room_to
+            ELSE gates.room_from
+        END
+        FROM gates
+        WHERE gates.id = gate_id
+        INTO room_over_gate;
+    UPDATE dungeons SET
+        current_room = room_over_gate
+        WHERE dungeons."character" = user_character;
+    RETURN QUERY SELECT * FROM run_away_fights;
+END;
+$$ LANGUAGE 'plpgsql';
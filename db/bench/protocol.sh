@@ -0,0 +1,27 @@
+#!/usr/bin/env bash
+# Parse and plan time saved by prepared statements:
+#
+#   ./protocol.sh --time=30
+#
+# runs hot_path.pgbench with the simple query protocol, the query text with
+# its values in it, parsed and planned every time, as pg-promise's db.func
+# formats them on the client, and then with named prepared statements like
+# api/statements.js. Other options go to pgbench.
+
+set -e
+cd "$(dirname "$0")"
+
+options=("$@")
+if [ ${#options[@]} -eq 0 ]; then
+    options=(--time=30)
+fi
+db=${DATABASE_URL:-postgres://dungeon_as_db_superuser@localhost:5432/dungeon_as_db}
+
+psql "$db" --quiet -v ON_ERROR_STOP=1 --file=setup.sql
+
+for protocol in simple prepared; do
+    echo "== $protocol"
+    pgbench "$db" --no-vacuum --protocol=$protocol --file=hot_path.pgbench \
+        --report-latencies "${options[@]}" \
+        | grep -vE '^(transaction type|scaling factor|query mode|number of (clients|threads)|duration)'
+done
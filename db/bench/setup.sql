@@ -0,0 +1,27 @@
+-- Player used by the benchmarks: bench@example.com, with a character
+-- and a dungeon. The scripts roll back, so its state never changes.
+INSERT INTO users (email, nickname, password_hash)
+VALUES ('bench@example.com', 'bench', 'x')
+ON CONFLICT DO NOTHING;
+
+DO $$
+DECLARE
+    roll_ids INTEGER[];
+BEGIN
+    IF NOT EXISTS (SELECT * FROM characters WHERE "user" = 'bench@example.com') THEN
+        SELECT array_agg(id) FROM get_character_dices('bench@example.com')
+            INTO roll_ids;
+        PERFORM create_character(
+            'bench', 'benchmark character',
+            roll_ids[1], roll_ids[2], roll_ids[3], roll_ids[4],
+            'bench@example.com'
+        );
+    END IF;
+    IF NOT EXISTS (
+        SELECT * FROM characters AS C JOIN dungeons AS D ON D."character" = C.id
+        WHERE C."user" = 'bench@example.com'
+    ) THEN
+        PERFORM create_dungeon('bench@example.com');
+    END IF;
+END;
+$$;
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""Function-level benchmark of functions.sql.
+
+Calls each function the API relies on, and the triggers behind them, many
+times against a seeded database. Every call runs in its own transaction
+after the setup of its case, and is rolled back, so that all of them find
+the same state. For every case the JSON report has:
+
+    ms          client-side timings of the call: min, median, p95, mean, max
+    buffers     shared blocks hit and read by one call, from its plan
+    statements  what pg_stat_statements saw during the case, nested
+                statements included, with their time and buffers
+    plans       the plan auto_explain logged for each nested statement of
+                one more call, as a list of its nodes
+
+Two reports compare, so that a change to the SQL comes with its numbers:
+
+    DATABASE_URL=postgres://postgres@localhost/dungeon_as_db \\
+        ./bench_functions.py --seed 5000 --output before.json
+    # change functions.sql and load it again
+    ./bench_functions.py --output after.json
+    ./bench_functions.py --compare before.json after.json
+
+pg_stat_statements must be in shared_preload_libraries, as it is for the
+db service of docker-compose, and the role a superuser: the statistics of
+the whole server are reset before each case.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import statistics
+import sys
+import time
+
+import psycopg2.extras
+
+from pgtools import PlanCapture, connect, plan_nodes, seed_players
+
+
+def sample_players(cursor, count):
+    """The ids to call the functions with, for up to `count` players
+    standing in a room with enemies. Ids a player has none of are None."""
+    cursor.execute('''
+        SELECT
+            C."user" AS email,
+            D.id AS dungeon,
+            D.current_room AS room,
+            (SELECT RE.id FROM room_enemies AS RE
+             WHERE RE.room = D.current_room
+             ORDER BY RE.id LIMIT 1) AS enemy,
+            (SELECT G.id FROM gates AS G
+             WHERE D.current_room IN (G.room_from, G.room_to)
+             AND G.hidden = false
+             ORDER BY G.id LIMIT 1) AS gate,
+            (SELECT RI.id FROM room_items AS RI
+             WHERE RI.room = D.current_room
+             ORDER BY RI.id LIMIT 1) AS room_item,
+            (SELECT CI.id FROM character_items AS CI
+             JOIN items AS I ON I.id = CI.item
+             WHERE CI."character" = C.id AND I.category = 'consumable'
+             ORDER BY CI.id LIMIT 1) AS consumable,
+            (SELECT CI.id FROM character_items AS CI
+             JOIN items AS I ON I.id = CI.item
+             WHERE CI."character" = C.id AND I.category = 'attack'
+             ORDER BY CI.id LIMIT 1) AS weapon
+        FROM characters AS C JOIN dungeons AS D
+            ON D."character" = C.id
+        WHERE EXISTS (SELECT * FROM room_enemies WHERE room = D.current_room)
+        ORDER BY C.id
+        LIMIT %s
+    ''', (count,))
+    players = [dict(row) for row in cursor.fetchall()]
+    for player in players:
+        player['new_email'] = 'bench_functions@example.com'
+    return players
+
+
+class Case:
+    """A function call, timed, after setup statements that are not."""
+
+    def __init__(self, name, call, setup=(), needs=()):
+        self.name = name
+        self.call = call
+        self.setup = setup
+        self.needs = needs  # keys of the player that must not be None
+
+    def players(self, players):
+        return [p for p in players if all(p[k] is not None for k in self.needs)]
+
+
+NEW_USER = "INSERT INTO users VALUES (%(new_email)s, 'bench_functions', 'x')"
+
+CASES = [
+    Case('get_character_dices',
+         'SELECT * FROM get_character_dices(%(new_email)s)',
+         setup=[NEW_USER]),
+    Case('create_character',
+         '''SELECT create_character('bench', 'bench', R[1], R[2], R[3], R[4],
+                                    %(new_email)s)
+            FROM (SELECT array_agg(id) AS R
+                  FROM get_character_dices(%(new_email)s)) AS rolls''',
+         setup=[NEW_USER]),
+    Case('create_dungeon', 'SELECT create_dungeon(%(email)s)',
+         setup=['SELECT end_dungeon(%(email)s)']),
+    Case('end_dungeon', 'SELECT end_dungeon(%(email)s)'),
+    Case('get_player', 'SELECT * FROM get_player(%(email)s)'),
+    Case('get_character', 'SELECT * FROM get_character(%(email)s)'),
+    Case('get_character_items',
+         'SELECT * FROM get_character_items(%(email)s)'),
+    Case('get_room', 'SELECT * FROM get_room(%(email)s)'),
+    Case('get_room_items', 'SELECT * FROM get_room_items(%(email)s)'),
+    Case('get_room_enemies', 'SELECT * FROM get_room_enemies(%(email)s)'),
+    Case('get_room_gates', 'SELECT * FROM get_room_gates(%(email)s)'),
+    Case('get_dungeon_version_by_id',
+         'SELECT get_dungeon_version_by_id(%(dungeon)s)'),
+    Case('get_dungeon_state_by_id',
+         'SELECT get_dungeon_state_by_id(%(dungeon)s)::TEXT'),
+    Case('get_dungeon_state_by_id_compact',
+         'SELECT get_dungeon_state_by_id(%(dungeon)s, true)::TEXT'),
+    Case('get_catalog', 'SELECT get_catalog()::TEXT'),
+    Case('fight_enemy_by_id',
+         'SELECT * FROM fight_enemy_by_id(%(dungeon)s, %(enemy)s)',
+         needs=['enemy']),
+    Case('follow_gate_by_id',
+         'SELECT * FROM follow_gate_by_id(%(dungeon)s, %(gate)s)',
+         needs=['gate']),
+    Case('take_item_by_id',
+         'SELECT take_item_by_id(%(dungeon)s, %(room_item)s)',
+         needs=['room_item']),
+    Case('use_item_by_id consumable',
+         'SELECT use_item_by_id(%(dungeon)s, %(consumable)s)',
+         needs=['consumable']),
+    Case('use_item_by_id equip',
+         'SELECT use_item_by_id(%(dungeon)s, %(weapon)s)',
+         needs=['weapon']),
+    # searching needs a room without enemies and a character that survives
+    Case('room_search_by_id',
+         'SELECT * FROM room_search_by_id(%(dungeon)s)',
+         setup=[
+             'DELETE FROM room_enemies WHERE room = %(room)s',
+             '''UPDATE dungeons SET current_bonusless_hp = 20
+                WHERE id = %(dungeon)s''',
+         ]),
+    # the triggers, fired by the updates the functions make
+    Case('kill_enemy',
+         'UPDATE room_enemies SET current_hit_points = 0 WHERE id = %(enemy)s',
+         needs=['enemy']),
+    Case('reset_bonuses',
+         '''UPDATE dungeons AS D SET current_room =
+                CASE WHEN D.current_room = G.room_from
+                    THEN G.room_to ELSE G.room_from END
+            FROM gates AS G
+            WHERE D.id = %(dungeon)s AND G.id = %(gate)s''',
+         needs=['gate']),
+    Case('kill_character',
+         'UPDATE dungeons SET current_bonusless_hp = 0 WHERE id = %(dungeon)s'),
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summary(timings):
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'p95': percentile(timings, 0.95),
+        'mean': statistics.mean(timings),
+        'max': max(timings),
+    }
+
+
+def set_autocommitted(connection, statements):
+    """Runs SETs that last for the session: a rollback would undo them."""
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    connection.autocommit = False
+
+
+def stat_statements_columns(cursor):
+    """Column names of pg_stat_statements, renamed in postgres 13."""
+    cursor.execute('SELECT * FROM pg_stat_statements LIMIT 0')
+    columns = {column.name for column in cursor.description}
+    if 'total_exec_time' in columns:
+        return 'total_exec_time', 'toplevel' in columns
+    return 'total_time', False
+
+
+def read_stat_statements(cursor, total_time, has_toplevel):
+    cursor.execute('''
+        SELECT
+            query,
+            {toplevel} AS toplevel,
+            calls,
+            {total_time} AS total_ms,
+            rows,
+            shared_blks_hit,
+            shared_blks_read
+        FROM pg_stat_statements
+        WHERE dbid = (SELECT oid FROM pg_database
+                      WHERE datname = current_database())
+        AND query !~* '^\\s*(BEGIN|ROLLBACK|SET|SELECT pg_stat_statements)'
+        ORDER BY total_ms DESC
+    '''.format(
+        total_time=total_time,
+        toplevel='toplevel' if has_toplevel else 'NULL::BOOLEAN',
+    ))
+    statements = []
+    for row in cursor.fetchall():
+        row = dict(row)
+        row['mean_ms'] = row['total_ms'] / row['calls']
+        if row['toplevel'] is None:
+            del row['toplevel']
+        statements.append(row)
+    return statements
+
+
+def compact_plan(plan):
+    """The nodes of a plan auto_explain logged, one line each."""
+    nodes = []
+    for node in plan_nodes(plan['Plan']):
+        line = node['Node Type']
+        if 'Index Name' in node:
+            line += ' using ' + node['Index Name']
+        if 'Relation Name' in node:
+            line += ' on ' + node['Relation Name']
+        nodes.append(line)
+    return {
+        'query': plan['Query Text'],
+        'ms': plan['Plan'].get('Actual Total Time'),
+        'nodes': nodes,
+    }
+
+
+def call_buffers(plans, call):
+    """Shared blocks of the top-level call, nested statements included:
+    buffer usage is counted for the whole execution of a node."""
+    for plan in plans:
+        if plan['Query Text'].strip() == call.strip():
+            node = plan['Plan']
+            return {
+                'hit': node.get('Shared Hit Blocks'),
+                'read': node.get('Shared Read Blocks'),
+            }
+    return None
+
+
+def run_case(connection, case, players, iterations):
+    cursor = connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    total_time, has_toplevel = stat_statements_columns(cursor)
+    connection.rollback()
+    cursor.execute('SELECT pg_stat_statements_reset()')
+    connection.commit()
+
+    timings = []
+    for i in range(iterations):
+        params = players[i % len(players)]
+        for statement in case.setup:
+            cursor.execute(statement, params)
+        start = time.perf_counter()
+        cursor.execute(case.call, params)
+        timings.append((time.perf_counter() - start) * 1e3)
+        connection.rollback()
+    statements = read_stat_statements(cursor, total_time, has_toplevel)
+    connection.rollback()
+
+    # one more call, with its nested plans
+    capture = PlanCapture(connection, analyze=True)
+    capture.enable()
+    for statement in case.setup:
+        cursor.execute(statement, players[0])
+    with capture.capture() as plans:
+        cursor.execute(case.call, players[0])
+    connection.rollback()
+    call = cursor.mogrify(case.call, players[0]).decode()
+    cursor.close()
+
+    return {
+        'calls': iterations,
+        'ms': summary(timings),
+        'buffers': call_buffers(plans, call),
+        'statements': statements,
+        'plans': [compact_plan(plan) for plan in plans
+                  if plan['Query Text'].strip() != call.strip()],
+    }
+
+
+def benchmark(connection, players, iterations, only):
+    set_autocommitted(connection, [
+        'CREATE EXTENSION IF NOT EXISTS pg_stat_statements',
+        "SET pg_stat_statements.track = 'all'",
+    ])
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW server_version')
+        server_version, = cursor.fetchone()
+    connection.rollback()
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'server_version': server_version,
+        'iterations': iterations,
+        'players': len(players),
+        'cases': {},
+    }
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        case_players = case.players(players)
+        if not case_players:
+            print('{:<28} skipped, no player has {}'.format(
+                case.name, ', '.join(case.needs)), file=sys.stderr)
+            continue
+        result = run_case(connection, case, case_players, iterations)
+        report['cases'][case.name] = result
+        print('{:<28} median {:8.3f} ms  p95 {:8.3f} ms'.format(
+            case.name, result['ms']['median'], result['ms']['p95']),
+            file=sys.stderr)
+    return report
+
+
+def blocks(result):
+    buffers = result.get('buffers')
+    if not buffers or buffers['hit'] is None:
+        return None
+    return buffers['hit'] + (buffers['read'] or 0)
+
+
+def compare(before_path, after_path, threshold):
+    """Prints the cases of two reports side by side; returns the names of
+    those whose median got slower by more than threshold percent."""
+    with open(before_path) as f:
+        before = json.load(f)['cases']
+    with open(after_path) as f:
+        after = json.load(f)['cases']
+    print('{:<28} {:>10} {:>10} {:>8} {:>8} {:>8}'.format(
+        'case', 'before ms', 'after ms', 'change', 'blocks', 'blocks'))
+    slower = []
+    for name in sorted(before.keys() | after.keys()):
+        if name not in before or name not in after:
+            print('{:<28} only in {}'.format(
+                name, 'before' if name in before else 'after'))
+            continue
+        old = before[name]['ms']['median']
+        new = after[name]['ms']['median']
+        change = (new - old) / old * 100 if old else 0.0
+        flag = ''
+        if change > threshold:
+            slower.append(name)
+            flag = ' slower'
+        print('{:<28} {:>10.3f} {:>10.3f} {:>+7.1f}% {:>8} {:>8}{}'.format(
+            name, old, new, change,
+            blocks(before[name]), blocks(after[name]), flag))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', default=None,
+                        help='defaults to $DATABASE_URL')
+    parser.add_argument('--seed', type=int, default=0, metavar='PLAYERS',
+                        help='create this many players before benchmarking')
+    parser.add_argument('--players', type=int, default=20,
+                        help='how many players the calls rotate over')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='calls per case')
+    parser.add_argument('--case', action='append', dest='cases',
+                        metavar='NAME', help='run only this case, repeatable')
+    parser.add_argument('--output', default='-',
+                        help='file for the JSON report, - for stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two reports instead of benchmarking')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent a median may grow in --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        slower = compare(*args.compare, args.threshold)
+        sys.exit(1 if slower else 0)
+
+    connection = connect(args.dsn)
+    with connection.cursor() as cursor:
+        if args.seed:
+            seed_players(cursor, args.seed)
+            connection.commit()
+        connection.autocommit = True
+        cursor.execute('ANALYZE')
+        connection.autocommit = False
+    with connection.cursor(
+            cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        players = sample_players(cursor, args.players)
+    connection.rollback()
+    if not players:
+        sys.exit('no player in a room with enemies, seed some with --seed')
+
+    report = benchmark(connection, players, args.iterations, args.cases)
+    connection.close()
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env bash
+# Builds the database from schema.sql, functions.sql and data.sql in a
+# single psql session and transaction: it either all loads or nothing does,
+# and the exit status says which.
+#
+#   ./bootstrap.sh [load [<db>]]  loads into <db>, dungeon_as_db by default
+#   ./bootstrap.sh template       loads into the dungeon_as_db_template database
+#   ./bootstrap.sh clone [<db>]   recreates <db> as a copy of the template,
+#                                 which takes milliseconds; the template is
+#                                 rebuilt first if the SQL files changed
+#
+# With DATABASE_URL set psql connects to that server, otherwise to the db
+# service of docker-compose.
+
+set -e
+cd "$(dirname "$0")"
+
+template=dungeon_as_db_template
+files=(schema.sql functions.sql data.sql)
+
+if [ -n "$DATABASE_URL" ]; then
+    server=${DATABASE_URL%/*}
+    owner=
+    # run_psql <user> <database> [psql options], the user comes from the url
+    run_psql() {
+        local database=$2
+        shift 2
+        psql "$server/$database" "$@"
+    }
+else
+    owner="OWNER dungeon_as_db_superuser"
+    run_psql() {
+        local user=$1 database=$2
+        shift 2
+        docker-compose exec -T db \
+            psql --username="$user" --dbname="$database" "$@"
+    }
+fi
+
+admin() {
+    run_psql postgres postgres --quiet --no-align --tuples-only \
+        -v ON_ERROR_STOP=1 --command="$1"
+}
+
+load() {
+    { echo 'SET client_min_messages = warning;'; cat "${files[@]}"; } \
+        | run_psql dungeon_as_db_superuser "$1" --quiet \
+            --single-transaction -v ON_ERROR_STOP=1 --file=-
+}
+
+checksum() {
+    cat "${files[@]}" | sha1sum | cut -d ' ' -f 1
+}
+
+build_template() {
+    admin "DROP DATABASE IF EXISTS $template"
+    admin "CREATE DATABASE $template $owner"
+    load $template
+    # the checksum tells clone when the template is stale; nobody may
+    # connect to it, as cloning needs it idle
+    admin "COMMENT ON DATABASE $template IS '$(checksum)'"
+    admin "ALTER DATABASE $template ALLOW_CONNECTIONS false"
+}
+
+clone() {
+    local built
+    built=$(admin "SELECT shobj_description(oid, 'pg_database')
+                   FROM pg_database WHERE datname = '$template'")
+    if [ "$built" != "$(checksum)" ]; then
+        build_template
+    fi
+    admin "DROP DATABASE IF EXISTS $1 WITH (FORCE)"
+    admin "CREATE DATABASE $1 $owner TEMPLATE $template"
+}
+
+case "${1:-load}" in
+    load) load "${2:-dungeon_as_db}" ;;
+    template) build_template ;;
+    clone) clone "${2:-dungeon_as_db}" ;;
+    *)
+        echo "usage: $0 [load [<db>] | template | clone [<db>]]" >&2
+        exit 2
+        ;;
+esac
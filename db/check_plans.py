@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Query-plan regression check for functions.sql.
+
+Calls every function in functions.sql against a seeded database, with
+auto_explain logging the plan of each nested statement, and fails if any
+plan reads a per-player table with a sequential scan. Every call runs in
+its own transaction, which is rolled back.
+
+    DATABASE_URL=postgres://postgres@localhost/dungeon_as_db \\
+        ./check_plans.py --seed 5000
+"""
+
+import argparse
+import sys
+
+import psycopg2
+
+from pgtools import PER_PLAYER_TABLES, PlanCapture, connect, plan_nodes, \
+    seed_players
+
+
+def sample_player(cursor):
+    """Ids to call the functions with, taken from a seeded player."""
+    cursor.execute('''
+        SELECT C."user", D.current_room
+        FROM characters AS C JOIN dungeons AS D
+            ON D."character" = C.id
+        WHERE EXISTS (SELECT * FROM room_enemies WHERE room = D.current_room)
+        ORDER BY C.id
+        LIMIT 1
+    ''')
+    email, room = cursor.fetchone()
+    cursor.execute('SELECT id FROM room_enemies WHERE room = %s LIMIT 1',
+                   (room,))
+    enemy, = cursor.fetchone()
+    cursor.execute('SELECT id FROM get_room_gates(%s) LIMIT 1', (email,))
+    gate, = cursor.fetchone()
+    cursor.execute('SELECT id FROM room_items WHERE room = %s LIMIT 1',
+                   (room,))
+    room_item = cursor.fetchone()
+    cursor.execute('''
+        SELECT CI.id FROM character_items AS CI
+        JOIN characters AS C ON C.id = CI."character"
+        JOIN items AS I ON I.id = CI.item
+        WHERE C."user" = %s AND I.category = 'consumable'
+        LIMIT 1
+    ''', (email,))
+    character_item = cursor.fetchone()
+    return {
+        'email': email,
+        'enemy': enemy,
+        'gate': gate,
+        'room_item': room_item[0] if room_item else None,
+        'character_item': character_item[0] if character_item else None,
+        'new_email': 'check_plans@example.com',
+    }
+
+
+# (name, statements) called with the sample_player parameters
+CASES = [
+    ('get_character_dices', [
+        "INSERT INTO users VALUES (%(new_email)s, 'check_plans', 'x')",
+        'SELECT * FROM get_character_dices(%(new_email)s)',
+    ]),
+    ('create_character', [
+        "INSERT INTO users VALUES (%(new_email)s, 'check_plans', 'x')",
+        '''SELECT create_character('check', 'check', R[1], R[2], R[3], R[4],
+                                   %(new_email)s)
+           FROM (SELECT array_agg(id) AS R
+                 FROM get_character_dices(%(new_email)s)) AS rolls''',
+    ]),
+    ('end_dungeon', ['SELECT end_dungeon(%(email)s)']),
+    ('create_dungeon', [
+        'SELECT end_dungeon(%(email)s)',
+        'SELECT create_dungeon(%(email)s)',
+    ]),
+    ('prune_finished_dungeons', [
+        'SELECT end_dungeon(%(email)s)',
+        'SELECT prune_finished_dungeons(10)',
+    ]),
+    ('get_character', ['SELECT * FROM get_character(%(email)s)']),
+    ('get_character_items', ['SELECT * FROM get_character_items(%(email)s)']),
+    ('get_room', ['SELECT * FROM get_room(%(email)s)']),
+    ('get_room_items', ['SELECT * FROM get_room_items(%(email)s)']),
+    ('get_room_enemies', ['SELECT * FROM get_room_enemies(%(email)s)']),
+    ('get_room_gates', ['SELECT * FROM get_room_gates(%(email)s)']),
+    ('get_player', ['SELECT * FROM get_player(%(email)s)']),
+    ('get_dungeon_version', ['SELECT get_dungeon_version(%(email)s)']),
+    ('get_dungeon_state', ['SELECT get_dungeon_state(%(email)s)']),
+    ('fight_enemy', ['SELECT * FROM fight_enemy(%(email)s, %(enemy)s)']),
+    ('follow_gate', ['SELECT * FROM follow_gate(%(email)s, %(gate)s)']),
+    ('take_item', ['SELECT take_item(%(email)s, %(room_item)s)']),
+    ('use_item', ['SELECT use_item(%(email)s, %(character_item)s)']),
+    ('room_search', ['SELECT * FROM room_search(%(email)s)']),
+    ('delete_user', ['SELECT delete_user(%(email)s)']),
+]
+
+
+def check(connection, cases, params):
+    """Returns the list of (case, relation, statement) seq scans found."""
+    capture = PlanCapture(connection)
+    violations = []
+    for name, statements in cases:
+        capture.enable()
+        with capture.capture() as plans, connection.cursor() as cursor:
+            try:
+                for statement in statements:
+                    cursor.execute(statement, params)
+            except psycopg2.Error as error:
+                # e.g. room_search refusing to search: the plans of the
+                # statements run until then are still worth checking
+                print('{}: {}'.format(name, str(error).strip()))
+        connection.rollback()
+        for plan in plans:
+            for node in plan_nodes(plan['Plan']):
+                relation = node.get('Relation Name')
+                if node['Node Type'] == 'Seq Scan' \
+                        and relation in PER_PLAYER_TABLES:
+                    violations.append((name, relation, plan['Query Text']))
+        print('{:<24} {:>3} plans'.format(name, len(plans)))
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', default=None,
+                        help='defaults to $DATABASE_URL')
+    parser.add_argument('--seed', type=int, default=0, metavar='PLAYERS',
+                        help='create this many players before checking')
+    args = parser.parse_args()
+
+    connection = connect(args.dsn)
+    with connection.cursor() as cursor:
+        if args.seed:
+            seed_players(cursor, args.seed)
+            connection.commit()
+        connection.autocommit = True
+        cursor.execute('ANALYZE')
+        connection.autocommit = False
+        params = sample_player(cursor)
+    connection.rollback()
+
+    violations = check(connection, CASES, params)
+    for name, relation, query in violations:
+        print('\nSEQ SCAN on {} in {}:\n{}'.format(relation, name, query))
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,11 @@ INSERT INTO defaults (key, value) VALUES
 ('final_room_description', 0),
 ('initial_defence_item', 1),
 ('initial_attack_item', 2),
-('initial_consumable_item', 3);
+('initial_consumable_item', 3),
+('dungeon_rooms', 10),
+('dungeon_path_rooms', 5),
+('dungeon_gates_per_room', 2),
+('catalog_version', 1);
 
 INSERT INTO items (name, description, attack, defence, wisdom, hit_points, category)
 VALUES 
@@ -113,43 +113,6 @@ END;
 $$ LANGUAGE 'plpgsql';
 
 DROP FUNCTION IF EXISTS create_room(INTEGER);
-CREATE FUNCTION create_room(
-    dungeon INTEGER
-) RETURNS INTEGER AS $$
-    DECLARE
-        max_items CONSTANT SMALLINT := 10;
-        max_enemies CONSTANT SMALLINT := 2;
-        min_enemies CONSTANT SMALLINT := 1;
-        room_id INTEGER;
-    BEGIN
-        INSERT INTO rooms (dungeon, description)
-        VALUES (dungeon, (
-            SELECT id FROM rooms_descriptions 
-            WHERE id != 0 
-            ORDER BY random() 
-            LIMIT 1
-        )) RETURNING id INTO room_id;
-        
-        INSERT INTO room_items (room, hidden, item)
-        SELECT
-            room_id,
-            random() > 0.2, 
-            id
-        FROM items ORDER BY random() 
-        LIMIT floor(random() * (max_items + 1));
-
-        INSERT INTO room_enemies (room, enemy, current_hit_points)
-        SELECT
-            room_id,
-            id,
-            initial_hit_points
-        FROM enemies 
-        ORDER BY random() 
-        LIMIT floor( random() * (max_enemies + 1 - min_enemies) + min_enemies );
-
-        RETURN room_id;
-    END;
-$$ LANGUAGE 'plpgsql';
 
 DROP FUNCTION IF EXISTS generate_rooms(INTEGER);
 CREATE FUNCTION generate_rooms(
@@ -157,44 +120,56 @@ CREATE FUNCTION generate_rooms(
     OUT start_room INTEGER, 
     OUT final_room INTEGER
 ) AS $$
+    -- Set-based: one statement each for rooms, items, enemies and gates.
+    -- Catalog entries are sampled by probing the primary key from a random
+    -- id in [min, max], so the cost does not grow with the catalog size.
     DECLARE
-        n_rooms_visible_path CONSTANT SMALLINT := 5;
-        n_other_rooms CONSTANT SMALLINT := 5;
-        previous_room INTEGER;
+        max_items CONSTANT SMALLINT := 10;
+        max_enemies CONSTANT SMALLINT := 2;
+        min_enemies CONSTANT SMALLINT := 1;
+        -- rooms including the final one, path from start_room to final_room
+        n_rooms INTEGER := COALESCE(
+            (SELECT value FROM defaults WHERE key = 'dungeon_rooms'), 10);
+        n_path_rooms INTEGER := COALESCE(
+            (SELECT value FROM defaults WHERE key = 'dungeon_path_rooms'), 5);
+        -- random gates tried from each room, besides the path
+        gates_per_room INTEGER := COALESCE(
+            (SELECT value FROM defaults WHERE key = 'dungeon_gates_per_room'), 2);
+        room_ids INTEGER[];
+        path_length INTEGER;
+        description_min INTEGER;
+        description_max INTEGER;
+        item_min INTEGER;
+        item_max INTEGER;
+        enemy_min INTEGER;
+        enemy_max INTEGER;
     BEGIN
-        -- create start_room
-        SELECT create_room(dungeon_id) INTO start_room;
-        -- create rooms and visible path from start_room to final_room
-        previous_room := start_room;
-        FOR i IN 3..n_rooms_visible_path LOOP
-            SELECT create_room(dungeon_id) INTO final_room;
-            INSERT INTO gates(dungeon, room_from, room_to, hidden)
-            VALUES (dungeon_id, previous_room, final_room, false);
-            previous_room := final_room;
-        END LOOP;
-        -- create some other random room
-        FOR i IN 1..n_other_rooms LOOP
-            PERFORM create_room(dungeon_id);
-        END LOOP;
-        -- create random gates
-        INSERT INTO gates (dungeon, room_from, room_to, hidden)
-        SELECT dungeon_id, legal_gates.from_id, legal_gates.to_id, random() > 0.5
-        FROM (
-            (
-                -- possible gates
-                SELECT "from".id AS from_id, "to".id AS to_id
-                FROM rooms AS "from" JOIN rooms AS "to"
-                ON "from".id < "to".id
-                AND "from".dungeon = dungeon_id
-                AND "to".dungeon = dungeon_id
-            ) EXCEPT (
-                -- existent gates
-                SELECT room_from, room_to FROM gates WHERE dungeon = dungeon_id
-                UNION ALL
-                SELECT room_to, room_from FROM gates WHERE dungeon = dungeon_id
-            )
-        ) AS legal_gates
-        WHERE random() > 0.5; -- with probability of 1/2
+        SELECT min(id), max(id) FROM rooms_descriptions WHERE id != 0
+            INTO description_min, description_max;
+        SELECT min(id), max(id) FROM items INTO item_min, item_max;
+        SELECT min(id), max(id) FROM enemies INTO enemy_min, enemy_max;
+        n_rooms := GREATEST(n_rooms, 2);
+        path_length := LEAST(GREATEST(n_path_rooms, 2), n_rooms) - 1;
+
+        -- create all the rooms but the final one, start_room is the first
+        WITH new_rooms AS (
+            INSERT INTO rooms (dungeon, description)
+            SELECT dungeon_id, RD.id
+            FROM (
+                SELECT description_min
+                    + floor(random() * (description_max - description_min + 1))::INTEGER
+                    AS target
+                FROM generate_series(1, n_rooms - 1)
+            ) AS picks
+            CROSS JOIN LATERAL (
+                SELECT id FROM rooms_descriptions
+                WHERE id >= picks.target AND id != 0
+                ORDER BY id LIMIT 1
+            ) AS RD
+            RETURNING id
+        ) SELECT array_agg(id ORDER BY id) FROM new_rooms INTO room_ids;
+        start_room := room_ids[1];
+
         -- create the final final_room
         INSERT INTO rooms (dungeon, description)
         VALUES (
@@ -203,24 +178,85 @@ CREATE FUNCTION generate_rooms(
                 SELECT value FROM defaults WHERE key = 'final_room_description'
             )
         ) RETURNING id INTO final_room;
-        -- create visible gate from previous final_room to final final_room
+
+        INSERT INTO room_items (room, hidden, item)
+        SELECT picks.room, random() > 0.2, I.id
+        FROM (
+            SELECT counts.room,
+                item_min + floor(random() * (item_max - item_min + 1))::INTEGER
+                    AS target
+            FROM (
+                SELECT room, floor(random() * (max_items + 1))::INTEGER AS n
+                FROM unnest(room_ids) AS room
+            ) AS counts
+            CROSS JOIN LATERAL generate_series(1, counts.n)
+        ) AS picks
+        CROSS JOIN LATERAL (
+            SELECT id FROM items
+            WHERE id >= picks.target
+            ORDER BY id LIMIT 1
+        ) AS I;
+
+        INSERT INTO room_enemies (room, enemy, current_hit_points)
+        SELECT picks.room, E.id, E.initial_hit_points
+        FROM (
+            SELECT counts.room,
+                enemy_min + floor(random() * (enemy_max - enemy_min + 1))::INTEGER
+                    AS target
+            FROM (
+                SELECT room, floor(
+                    random() * (max_enemies + 1 - min_enemies) + min_enemies
+                )::INTEGER AS n
+                FROM unnest(room_ids) AS room
+            ) AS counts
+            CROSS JOIN LATERAL generate_series(1, counts.n)
+        ) AS picks
+        CROSS JOIN LATERAL (
+            SELECT id, initial_hit_points FROM enemies
+            WHERE id >= picks.target
+            ORDER BY id LIMIT 1
+        ) AS E;
+
+        -- visible path from start_room to final_room
+        INSERT INTO gates (dungeon, room_from, room_to, hidden)
+        SELECT dungeon_id, room_ids[i], room_ids[i + 1], false
+        FROM generate_series(1, path_length - 1) AS i
+        UNION ALL
+        SELECT dungeon_id, room_ids[path_length], final_room, false;
+
+        -- random gates between the other rooms, with probability 1/2 hidden
         INSERT INTO gates (dungeon, room_from, room_to, hidden)
-        VALUES (dungeon_id, previous_room, final_room, false);
+        SELECT dungeon_id, candidates.room_from, candidates.room_to, random() > 0.5
+        FROM (
+            SELECT DISTINCT
+                LEAST(attempts.room, attempts.other) AS room_from,
+                GREATEST(attempts.room, attempts.other) AS room_to
+            FROM (
+                SELECT room_ids[i] AS room,
+                    room_ids[1 + floor(random() * (n_rooms - 1))::INTEGER] AS other
+                FROM generate_series(1, n_rooms - 1) AS i,
+                    generate_series(1, gates_per_room)
+            ) AS attempts
+            WHERE attempts.room != attempts.other
+        ) AS candidates
+        WHERE NOT EXISTS (
+            SELECT * FROM gates AS G
+            WHERE G.dungeon = dungeon_id
+            AND G.room_from = candidates.room_from
+            AND G.room_to = candidates.room_to
+        );
     END;
 $$ LANGUAGE 'plpgsql';
 
-DROP FUNCTION IF EXISTS create_dungeon(VARCHAR);
-CREATE FUNCTION create_dungeon(user_email VARCHAR(254))
-RETURNS void AS $$
+DROP FUNCTION IF EXISTS generate_dungeon();
+CREATE FUNCTION generate_dungeon() RETURNS INTEGER AS $$
+    -- a complete dungeon layout not assigned to any character yet
     DECLARE
         dungeon_id INTEGER;
         dungeon_start_room INTEGER;
         dungeon_final_room INTEGER;
     BEGIN
-        INSERT INTO dungeons ("character", current_bonusless_hp)
-            SELECT C.id, C.constitution
-            FROM characters AS C
-            WHERE C."user" = user_email
+        INSERT INTO dungeons (current_bonusless_hp) VALUES (0)
             RETURNING id INTO dungeon_id;
         SELECT start_room, final_room FROM generate_rooms(dungeon_id)
             INTO dungeon_start_room, dungeon_final_room;
@@ -228,9 +264,132 @@ RETURNS void AS $$
             final_room = dungeon_final_room,
             current_room = dungeon_start_room
             WHERE id = dungeon_id;
+        RETURN dungeon_id;
+    END;
+$$ LANGUAGE 'plpgsql';
+
+DROP FUNCTION IF EXISTS refill_dungeon_pool(INTEGER, INTEGER);
+CREATE FUNCTION refill_dungeon_pool(pool_size INTEGER, batch_size INTEGER)
+RETURNS INTEGER AS $$
+    -- generates up to batch_size dungeons, until pool_size are waiting;
+    -- returns how many were generated
+    DECLARE
+        missing INTEGER;
+    BEGIN
+        -- one producer at a time, the others have nothing to do
+        IF NOT pg_try_advisory_xact_lock(hashtext('refill_dungeon_pool')) THEN
+            RETURN 0;
+        END IF;
+        missing := LEAST(
+            pool_size - (
+                SELECT count(*) FROM dungeons
+                WHERE "character" IS NULL AND finished_at IS NULL
+            ),
+            batch_size
+        );
+        FOR i IN 1..missing LOOP
+            PERFORM generate_dungeon();
+        END LOOP;
+        RETURN GREATEST(missing, 0);
+    END;
+$$ LANGUAGE 'plpgsql';
+
+DROP FUNCTION IF EXISTS create_dungeon(VARCHAR);
+CREATE FUNCTION create_dungeon(user_email VARCHAR(254))
+RETURNS void AS $$
+    DECLARE
+        dungeon_id INTEGER;
+        character_id INTEGER;
+        character_hp SMALLINT;
+    BEGIN
+        SELECT C.id, C.constitution
+            FROM characters AS C
+            WHERE C."user" = user_email
+            INTO character_id, character_hp;
+        IF character_id IS NULL THEN
+            RAISE 'no character';
+        END IF;
+        -- claim a pre-generated dungeon, skipping those being claimed by
+        -- concurrent transactions
+        SELECT id FROM dungeons
+            WHERE "character" IS NULL AND finished_at IS NULL
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+            INTO dungeon_id;
+        IF dungeon_id IS NULL THEN
+            -- the pool is empty, generate it now
+            dungeon_id := generate_dungeon();
+        END IF;
+        UPDATE dungeons SET
+            "character" = character_id,
+            current_bonusless_hp = character_hp
+            WHERE id = dungeon_id;
     END;
 $$ LANGUAGE 'plpgsql';
 
+-- Ends a dungeon in constant time: a summary goes to dungeons_archive and
+-- the dungeon is detached from its character. Its rooms, gates, items and
+-- enemies are deleted later, off the request path, by
+-- prune_finished_dungeons.
+DROP FUNCTION IF EXISTS finish_dungeon(INTEGER, BOOLEAN);
+CREATE FUNCTION finish_dungeon(dungeon_id INTEGER, died BOOLEAN)
+RETURNS VOID AS $$
+    INSERT INTO dungeons_archive (
+        dungeon,
+        "character",
+        experience_points,
+        hit_points,
+        final_room_reached,
+        died
+    ) SELECT
+        id,
+        "character",
+        experience_points,
+        current_bonusless_hp,
+        current_room = final_room,
+        finish_dungeon.died
+    FROM dungeons
+    WHERE id = dungeon_id AND "character" IS NOT NULL;
+    UPDATE dungeons SET
+        "character" = NULL,
+        finished_at = now()
+        WHERE id = dungeon_id AND "character" IS NOT NULL;
+$$ LANGUAGE 'sql';
+
+-- Deletes up to batch_size finished dungeons, oldest first, with their
+-- layout; returns how many. Run by the API in the background.
+DROP FUNCTION IF EXISTS prune_finished_dungeons(INTEGER);
+CREATE FUNCTION prune_finished_dungeons(batch_size INTEGER)
+RETURNS INTEGER AS $$
+    WITH pruned AS (
+        DELETE FROM dungeons WHERE id IN (
+            SELECT id FROM dungeons
+            WHERE finished_at IS NOT NULL
+            ORDER BY finished_at
+            LIMIT batch_size
+            FOR UPDATE SKIP LOCKED
+        ) RETURNING id
+    )
+    SELECT count(*)::INTEGER FROM pruned;
+$$ LANGUAGE 'sql';
+
+-- The state version of a dungeon changes with anything GET /dungeon shows,
+-- which answers 304 to clients holding the current one. Any update of the
+-- dungeon bumps it: moving (room_changed), fights and searches hurt the
+-- character, using a potion sets the bonuses. take_item and equipping an
+-- item do not touch the dungeon, they bump it explicitly.
+CREATE OR REPLACE FUNCTION bump_state_version() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.state_version := GREATEST(NEW.state_version, OLD.state_version + 1);
+    RETURN NEW;
+END;
+$$ LANGUAGE 'plpgsql';
+DROP TRIGGER IF EXISTS state_changed ON dungeons CASCADE;
+CREATE TRIGGER state_changed
+    BEFORE UPDATE ON dungeons
+    FOR EACH ROW
+    EXECUTE PROCEDURE bump_state_version();
+
 -- TODO: update dungeon XP while killing enemies and visiting rooms
 CREATE OR REPLACE FUNCTION kill_character() RETURNS TRIGGER AS $$
 BEGIN
@@ -239,8 +398,7 @@ BEGIN
         FROM dungeons AS D 
         WHERE D."character" = NEW."character"
         AND C.id = NEW."character";
-    DELETE FROM dungeons
-        WHERE dungeons.id = NEW.id;
+    PERFORM finish_dungeon(NEW.id, true);
     RETURN NULL;
 END;
 $$ LANGUAGE 'plpgsql';
@@ -389,71 +547,358 @@ RETURNS TABLE (
     id INTEGER,
     room INTEGER
 ) AS $$ 
-        SELECT gates.id,
-        CASE 
-            WHEN dungeons.current_room = gates.room_from
-            THEN gates.room_to
-            ELSE gates.room_from
-        END
+        -- one branch per gate side, so both can use their index
+        SELECT gates.id, gates.room_to
         FROM characters JOIN dungeons
         ON characters.id = dungeons."character"
         JOIN gates
         ON gates.room_from = dungeons.current_room
-        OR gates.room_to = dungeons.current_room
+        WHERE characters."user" = user_email
+        AND gates.hidden = false
+    UNION ALL
+        SELECT gates.id, gates.room_from
+        FROM characters JOIN dungeons
+        ON characters.id = dungeons."character"
+        JOIN gates
+        ON gates.room_to = dungeons.current_room
         WHERE characters."user" = user_email
         AND gates.hidden = false;
 $$ LANGUAGE 'sql';
 
-DROP FUNCTION IF EXISTS end_dungeon(VARCHAR);
-CREATE FUNCTION end_dungeon(user_email VARCHAR(254)) RETURNS VOID AS $$
-    DELETE FROM dungeons WHERE dungeons."character" = (
-        SELECT id FROM characters WHERE "user" = user_email LIMIT 1
+-- The items and enemies dungeons are made of, for clients of the compact
+-- dungeon state. catalog_version, in defaults, changes with them.
+DROP FUNCTION IF EXISTS get_catalog_version();
+CREATE FUNCTION get_catalog_version() RETURNS INTEGER AS $$
+    SELECT value FROM defaults WHERE key = 'catalog_version';
+$$ LANGUAGE 'sql' STABLE;
+
+DROP FUNCTION IF EXISTS get_catalog();
+CREATE FUNCTION get_catalog() RETURNS JSON AS $$
+    SELECT json_build_object(
+        'version', get_catalog_version(),
+        'items', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id', I.id,
+                'name', I.name,
+                'description', I.description,
+                'attack', I.attack,
+                'defence', I.defence,
+                'wisdom', I.wisdom,
+                'hit_points', I.hit_points,
+                'category', I.category
+            ) ORDER BY I.id), '[]')
+            FROM items AS I
+        ),
+        'enemies', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id', E.id,
+                'name', E.name,
+                'description', E.description,
+                'attack', E.attack,
+                'defence', E.defence,
+                'damage', E.damage,
+                'hit_points', E.initial_hit_points
+            ) ORDER BY E.id), '[]')
+            FROM enemies AS E
+        )
     );
 $$ LANGUAGE 'sql';
 
-DROP FUNCTION IF EXISTS follow_gate(VARCHAR, INTEGER);
-CREATE FUNCTION follow_gate(user_email VARCHAR(254), gate_id INTEGER)
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE defaults SET value = value + 1 WHERE key = 'catalog_version';
+    RETURN NULL;
+END;
+$$ LANGUAGE 'plpgsql';
+DROP TRIGGER IF EXISTS items_changed ON items CASCADE;
+CREATE TRIGGER items_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON items
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE bump_catalog_version();
+DROP TRIGGER IF EXISTS enemies_changed ON enemies CASCADE;
+CREATE TRIGGER enemies_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON enemies
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE bump_catalog_version();
+
+-- The functions keyed by the id of a live dungeon, the *_by_id ones, are
+-- those the API calls: it resolves the player with get_player when it
+-- authenticates them, keeps the ids with the credentials and passes them
+-- through. Each of them reads the dungeon by primary key, once, with
+-- require_dungeon. The functions keyed by user email resolve the dungeon
+-- with player_dungeon and call them; they stay for psql and the scripts.
+DROP FUNCTION IF EXISTS get_player(VARCHAR);
+CREATE FUNCTION get_player(user_email VARCHAR(254))
 RETURNS TABLE (
-    type VARCHAR,
-    id INTEGER,
-    damage SMALLINT,
-    value SMALLINT,
-    dice SMALLINT,
-    hit BOOLEAN
+    character_id INTEGER,
+    dungeon_id INTEGER
 ) AS $$
+    SELECT C.id, D.id
+    FROM characters AS C LEFT JOIN dungeons AS D
+        ON D."character" = C.id
+    WHERE C."user" = user_email;
+$$ LANGUAGE 'sql';
+
+DROP FUNCTION IF EXISTS player_dungeon(VARCHAR);
+CREATE FUNCTION player_dungeon(user_email VARCHAR(254))
+RETURNS INTEGER AS $$
+    SELECT dungeon_id FROM get_player(user_email);
+$$ LANGUAGE 'sql';
+
+-- The dungeon with the given id while it is played. Raises no_data_found
+-- (SQLSTATE P0002) once it is over, which tells the API that the dungeon
+-- it keeps for the player is stale.
+DROP FUNCTION IF EXISTS require_dungeon(INTEGER);
+CREATE FUNCTION require_dungeon(dungeon_id INTEGER)
+RETURNS dungeons AS $$
 DECLARE
-    room_over_gate INTEGER;
-    user_character INTEGER;
-    user_dungeon INTEGER;
-    user_current_room INTEGER;
+    live dungeons;
 BEGIN
-    CREATE TEMP TABLE run_away_fights ON COMMIT DROP AS
-        SELECT * FROM fight_enemy(user_email, NULL);
-    SELECT characters.id
-        FROM characters
-        WHERE characters."user" = user_email
-        LIMIT 1
-        INTO user_character;
-    SELECT dungeons.id, dungeons.current_room
-        FROM dungeons
-        WHERE dungeons."character" = user_character
-        LIMIT 1
-        INTO user_dungeon, user_current_room;
-    SELECT
-        CASE WHEN user_current_room = gates.room_from
-            THEN gates.room_to
-            ELSE gates.room_from
-        END
-        FROM gates
-        WHERE gates.id = gate_id
-        INTO room_over_gate;
-    UPDATE dungeons SET
-        current_room = room_over_gate
-        WHERE dungeons."character" = user_character;
-    RETURN QUERY SELECT * FROM run_away_fights;
+    SELECT * FROM dungeons AS D
+        WHERE D.id = dungeon_id
+        AND D."character" IS NOT NULL
+        INTO live;
+    IF NOT FOUND THEN
+        RAISE 'no dungeon %', dungeon_id USING ERRCODE = 'no_data_found';
+    END IF;
+    RETURN live;
+END;
+$$ LANGUAGE 'plpgsql';
+
+-- The ETag of GET /dungeon, also the version in get_dungeon_state: the
+-- state version alone would repeat across the dungeons of a player
+DROP FUNCTION IF EXISTS get_dungeon_version_by_id(INTEGER);
+CREATE FUNCTION get_dungeon_version_by_id(dungeon_id INTEGER)
+RETURNS TEXT AS $$
+    SELECT L.id || '.' || L.state_version
+    FROM require_dungeon(dungeon_id) AS L;
+$$ LANGUAGE 'sql';
+
+DROP FUNCTION IF EXISTS get_dungeon_version(VARCHAR);
+CREATE FUNCTION get_dungeon_version(user_email VARCHAR(254))
+RETURNS TEXT AS $$
+    SELECT D.id || '.' || D.state_version
+    FROM dungeons AS D
+    WHERE D.id = player_dungeon(user_email);
+$$ LANGUAGE 'sql';
+
+-- Parts of the dungeon state, shaped like get_dungeon_state, for the ones
+-- named in `parts`: 'character' (without the bag), 'bag', 'room' (its id
+-- and description), 'items', 'enemies' and 'gates'. The version is always
+-- there. Clients holding a state merge a part of it in, see notify_dungeon.
+-- NULL once the dungeon is over.
+--
+-- In the compact form the bag, items and enemies only have their own id,
+-- the id of what they are in the catalog and, for enemies, their hit
+-- points: the rest is in get_catalog, whose version is added.
+DROP FUNCTION IF EXISTS get_dungeon_parts(VARCHAR, VARCHAR[]);
+DROP FUNCTION IF EXISTS get_dungeon_parts_by_id(INTEGER, VARCHAR[]);
+DROP FUNCTION IF EXISTS get_dungeon_parts_by_id(INTEGER, VARCHAR[], BOOLEAN);
+CREATE FUNCTION get_dungeon_parts_by_id(
+    dungeon_id INTEGER,
+    parts VARCHAR[],
+    compact BOOLEAN DEFAULT false
+) RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'version', D.id || '.' || D.state_version,
+        'character', CASE WHEN 'character' = ANY(parts) THEN jsonb_build_object(
+            'name', C.name,
+            'description', C.description,
+            'strength', C.strength,
+            'intellect', C.intellect,
+            'dexterity', C.dexterity,
+            'constitution', C.constitution,
+            'room_attack_bonus', D.room_attack_bonus,
+            'room_defence_bonus', D.room_defence_bonus,
+            'room_wisdom_bonus', D.room_wisdom_bonus,
+            'room_hit_points_bonus', D.room_hit_points_bonus,
+            'attack', (C.strength + C.dexterity) / 2 + D.room_attack_bonus,
+            'defence', (C.constitution + C.dexterity) / 2 + D.room_defence_bonus,
+            'wisdom', C.intellect + D.room_wisdom_bonus,
+            'hit_points', D.current_bonusless_hp + D.room_hit_points_bonus,
+            'equipped_defence_item', C.equipped_defence_item,
+            'equipped_attack_item', C.equipped_attack_item
+        ) ELSE '{}' END || CASE WHEN 'bag' = ANY(parts) AND compact THEN jsonb_build_object(
+            'bag', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                    'id', CI.id,
+                    'item', CI.item
+                )), '[]')
+                FROM character_items AS CI
+                WHERE CI."character" = C.id
+            )
+        ) WHEN 'bag' = ANY(parts) THEN jsonb_build_object(
+            'bag', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                    'id', CI.id,
+                    'name', I.name,
+                    'description', I.description,
+                    'attack', I.attack,
+                    'defence', I.defence,
+                    'wisdom', I.wisdom,
+                    'hit_points', I.hit_points,
+                    'category', I.category
+                )), '[]')
+                FROM character_items AS CI JOIN items AS I
+                    ON I.id = CI.item
+                WHERE CI."character" = C.id
+            )
+        ) ELSE '{}' END,
+        'room', CASE WHEN 'room' = ANY(parts) THEN jsonb_build_object(
+            'id', R.id,
+            'description', RD.description
+        ) ELSE '{}' END || CASE WHEN 'items' = ANY(parts) AND compact THEN jsonb_build_object(
+            'items', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                    'id', RI.id,
+                    'item', RI.item
+                )), '[]')
+                FROM room_items AS RI
+                WHERE RI.room = R.id
+                AND RI.hidden = false
+            )
+        ) WHEN 'items' = ANY(parts) THEN jsonb_build_object(
+            'items', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                    'id', RI.id,
+                    'name', I.name,
+                    'description', I.description,
+                    'attack', I.attack,
+                    'defence', I.defence,
+                    'wisdom', I.wisdom,
+                    'hit_points', I.hit_points,
+                    'category', I.category
+                )), '[]')
+                FROM room_items AS RI JOIN items AS I
+                    ON I.id = RI.item
+                WHERE RI.room = R.id
+                AND RI.hidden = false
+            )
+        ) ELSE '{}' END || CASE WHEN 'enemies' = ANY(parts) AND compact THEN jsonb_build_object(
+            'enemies', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                    'id', RE.id,
+                    'enemy', RE.enemy,
+                    'hit_points', RE.current_hit_points
+                )), '[]')
+                FROM room_enemies AS RE
+                WHERE RE.room = R.id
+            )
+        ) WHEN 'enemies' = ANY(parts) THEN jsonb_build_object(
+            'enemies', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                    'id', RE.id,
+                    'name', E.name,
+                    'description', E.description,
+                    'attack', E.attack,
+                    'defence', E.defence,
+                    'damage', E.damage,
+                    'hit_points', RE.current_hit_points
+                )), '[]')
+                FROM room_enemies AS RE JOIN enemies AS E
+                    ON E.id = RE.enemy
+                WHERE RE.room = R.id
+            )
+        ) ELSE '{}' END || CASE WHEN 'gates' = ANY(parts) THEN jsonb_build_object(
+            'gates', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                    'id', G.id,
+                    'room', G.room
+                )), '[]')
+                FROM (
+                    SELECT id, room_to AS room FROM gates
+                    WHERE room_from = R.id AND hidden = false
+                    UNION ALL
+                    SELECT id, room_from AS room FROM gates
+                    WHERE room_to = R.id AND hidden = false
+                ) AS G
+            )
+        ) ELSE '{}' END
+    ) || CASE WHEN compact THEN jsonb_build_object(
+        'catalog_version', get_catalog_version()
+    ) ELSE '{}' END
+    FROM dungeons AS D JOIN characters AS C
+        ON C.id = D."character"
+    JOIN rooms AS R
+        ON R.id = D.current_room
+    JOIN rooms_descriptions AS RD
+        ON RD.id = R.description
+    WHERE D.id = dungeon_id;
+$$ LANGUAGE 'sql';
+
+-- the same document GET /dungeon used to assemble from get_character,
+-- get_character_items, get_room, get_room_items, get_room_enemies and
+-- get_room_gates, built with a single join path
+DROP FUNCTION IF EXISTS get_dungeon_state_by_id(INTEGER);
+DROP FUNCTION IF EXISTS get_dungeon_state_by_id(INTEGER, BOOLEAN);
+CREATE FUNCTION get_dungeon_state_by_id(
+    dungeon_id INTEGER,
+    compact BOOLEAN DEFAULT false
+) RETURNS JSON AS $$
+    SELECT get_dungeon_parts_by_id(
+        L.id,
+        ARRAY['character', 'bag', 'room', 'items', 'enemies', 'gates'],
+        compact
+    )::JSON
+    FROM require_dungeon(dungeon_id) AS L;
+$$ LANGUAGE 'sql';
+
+DROP FUNCTION IF EXISTS get_dungeon_state(VARCHAR);
+CREATE FUNCTION get_dungeon_state(user_email VARCHAR(254))
+RETURNS JSON AS $$
+    SELECT get_dungeon_parts_by_id(
+        player_dungeon(user_email),
+        ARRAY['character', 'bag', 'room', 'items', 'enemies', 'gates']
+    )::JSON;
+$$ LANGUAGE 'sql';
+
+-- Tells the API, listening on dungeon_changes, that `event` changed the
+-- given parts of the dungeon played by character_id, which callers take
+-- before the event: a character who died is no longer in the dungeon. The
+-- payload is {"user", "event", "state"}, with state null when the dungeon
+-- is over. A payload is at most 8000 bytes: when the parts do not fit,
+-- state has only the version and "refetch" is true.
+DROP FUNCTION IF EXISTS notify_dungeon(VARCHAR, VARCHAR, VARCHAR[]);
+DROP FUNCTION IF EXISTS notify_dungeon(INTEGER, INTEGER, VARCHAR, VARCHAR[]);
+CREATE FUNCTION notify_dungeon(
+    character_id INTEGER,
+    dungeon_id INTEGER,
+    event VARCHAR,
+    parts VARCHAR[]
+) RETURNS VOID AS $$
+DECLARE
+    user_email VARCHAR(254);
+    state JSONB := get_dungeon_parts_by_id(dungeon_id, parts);
+    payload TEXT;
+BEGIN
+    SELECT C."user" FROM characters AS C
+        WHERE C.id = character_id
+        INTO user_email;
+    payload := jsonb_build_object(
+        'user', user_email,
+        'event', event,
+        'state', state
+    )::TEXT;
+    IF octet_length(payload) > 7900 THEN
+        payload := jsonb_build_object(
+            'user', user_email,
+            'event', event,
+            'state', jsonb_build_object('version', state->'version'),
+            'refetch', true
+        )::TEXT;
+    END IF;
+    PERFORM pg_notify('dungeon_changes', payload);
 END;
 $$ LANGUAGE 'plpgsql';
 
+DROP FUNCTION IF EXISTS end_dungeon(VARCHAR);
+CREATE FUNCTION end_dungeon(user_email VARCHAR(254)) RETURNS VOID AS $$
+    SELECT finish_dungeon(D.id, false)
+    FROM characters AS C JOIN dungeons AS D
+        ON D."character" = C.id
+    WHERE C."user" = user_email;
+$$ LANGUAGE 'sql';
+
 CREATE OR REPLACE FUNCTION kill_enemy() RETURNS TRIGGER AS $$
 BEGIN
     DELETE FROM room_enemies AS RE
@@ -469,8 +914,9 @@ CREATE TRIGGER enemy_fight
     EXECUTE PROCEDURE kill_enemy();
 
 -- TODO: bug, fight with two enemies and dungeon gets incoherent
-DROP FUNCTION IF EXISTS fight_enemy(VARCHAR, INTEGER);
-CREATE FUNCTION fight_enemy(user_email VARCHAR(254), enemy_id INTEGER)
+DROP FUNCTION IF EXISTS fight(VARCHAR, INTEGER);
+DROP FUNCTION IF EXISTS fight_by_id(INTEGER, INTEGER);
+CREATE FUNCTION fight_by_id(dungeon_id INTEGER, enemy_id INTEGER)
 RETURNS TABLE (
     type VARCHAR,
     id INTEGER,
@@ -479,105 +925,200 @@ RETURNS TABLE (
     dice SMALLINT,
     hit BOOLEAN
 ) AS $$
-DECLARE
-    fight RECORD;
-BEGIN
-    CREATE TEMP TABLE fights ON COMMIT DROP AS
-    SELECT 
-        R.type::VARCHAR AS type,
-        R.id::INTEGER AS id,
-        R.damage::SMALLINT AS damage,
-        R.value::SMALLINT AS value,
-        R.dice::SMALLINT AS dice,
-        R.value + R.dice > 12 AS hit
-    FROM (
-        (SELECT
+    -- A single statement: the dices are rolled once in the fights CTE,
+    -- which both updates and the result read.
+    WITH player AS (
+        SELECT
+            D.id AS dungeon,
+            D.current_room,
+            (C.strength + C.dexterity) / 2 + D.room_attack_bonus AS attack,
+            (C.constitution + C.dexterity) / 2 + D.room_defence_bonus AS defence,
+            C.equipped_attack_item
+        FROM dungeons AS D JOIN characters AS C
+            ON C.id = D."character"
+        WHERE D.id = dungeon_id
+    ), rolls AS (
+        SELECT
             'attacking' AS type,
-            enemy_id AS id,
-            items.hit_points AS damage,
-            ((characters.strength + characters.dexterity) / 2 + D.room_attack_bonus - enemies.defence) AS value,
-            (floor(random() * 20) + 1) AS dice
-        FROM characters JOIN character_items
-            ON characters.equipped_attack_item = character_items.id
-        JOIN items
-            ON items.id = character_items.item
-        JOIN dungeons AS D
-            ON D."character" = characters.id
-        JOIN room_enemies
-            ON room_enemies.id = enemy_id
-        JOIN enemies
-            ON room_enemies.enemy = enemies.id
-        WHERE characters."user" = user_email
-        LIMIT 1)
-    UNION
-        (SELECT 
-            'defending' AS "type",
-            room_enemies.id AS id,
-            enemies.damage AS damage,
-            enemies.attack - ((characters.constitution + characters.dexterity) / 2 + D.room_defence_bonus) AS value,
+            RE.id,
+            I.hit_points AS damage,
+            P.attack - E.defence AS value,
             floor(random() * 20) + 1 AS dice
-            FROM room_enemies JOIN enemies
-                ON room_enemies.enemy = enemies.id
-            JOIN dungeons
-                ON room_enemies.room = dungeons.current_room
-            JOIN characters
-                ON dungeons."character" = characters.id
-            JOIN dungeons AS D
-                ON D."character" = characters.id
-            WHERE characters."user" = user_email)
-    ) AS R;
-    UPDATE dungeons
-        SET current_bonusless_hp = GREATEST(
-            current_bonusless_hp - (
-                SELECT SUM(fights.damage)
-                FROM fights
-                WHERE fights."type" = 'defending'
-                AND fights.hit = true
-            ),
-            0
-        ) WHERE dungeons."character" = (
-            SELECT C.id FROM characters AS C WHERE C."user" = user_email
-        );
-    UPDATE room_enemies AS RE
-        SET current_hit_points = RE.current_hit_points - fights.damage
-        FROM fights
-        WHERE RE.id = fights.id
-        AND fights."type" = 'attacking' AND fights.hit;
-    RETURN QUERY SELECT * FROM fights;
+        FROM player AS P JOIN character_items AS CI
+            ON CI.id = P.equipped_attack_item
+        JOIN items AS I
+            ON I.id = CI.item
+        JOIN room_enemies AS RE
+            ON RE.id = enemy_id
+            AND RE.room = P.current_room
+        JOIN enemies AS E
+            ON E.id = RE.enemy
+    UNION ALL
+        SELECT
+            'defending' AS type,
+            RE.id,
+            E.damage,
+            E.attack - P.defence AS value,
+            floor(random() * 20) + 1 AS dice
+        FROM player AS P JOIN room_enemies AS RE
+            ON RE.room = P.current_room
+        JOIN enemies AS E
+            ON E.id = RE.enemy
+    ), fights AS (
+        SELECT
+            R.type::VARCHAR AS type,
+            R.id::INTEGER AS id,
+            R.damage::SMALLINT AS damage,
+            R.value::SMALLINT AS value,
+            R.dice::SMALLINT AS dice,
+            R.value + R.dice > 12 AS hit
+        FROM rolls AS R
+    ), hurt_character AS (
+        UPDATE dungeons AS D
+            SET current_bonusless_hp = GREATEST(
+                D.current_bonusless_hp - COALESCE((
+                    SELECT SUM(F.damage)
+                    FROM fights AS F
+                    WHERE F.type = 'defending'
+                    AND F.hit
+                ), 0),
+                0
+            )
+            FROM player AS P
+            WHERE D.id = P.dungeon
+    ), hurt_enemy AS (
+        UPDATE room_enemies AS RE
+            SET current_hit_points = RE.current_hit_points - F.damage
+            FROM fights AS F
+            WHERE RE.id = F.id
+            AND F.type = 'attacking' AND F.hit
+    )
+    SELECT * FROM fights;
+$$ LANGUAGE 'sql';
+
+DROP FUNCTION IF EXISTS follow_gate_by_id(INTEGER, INTEGER);
+CREATE FUNCTION follow_gate_by_id(dungeon_id INTEGER, gate_id INTEGER)
+RETURNS TABLE (
+    type VARCHAR,
+    id INTEGER,
+    damage SMALLINT,
+    value SMALLINT,
+    dice SMALLINT,
+    hit BOOLEAN
+) AS $$
+DECLARE
+    live dungeons := require_dungeon(dungeon_id);
+BEGIN
+    -- running away, the enemies left in the room attack once more
+    RETURN QUERY SELECT * FROM fight_by_id(dungeon_id, NULL);
+    -- unless they killed the character, through a gate of the room
+    UPDATE dungeons AS D SET
+        current_room = CASE WHEN D.current_room = G.room_from
+            THEN G.room_to
+            ELSE G.room_from
+        END
+        FROM gates AS G
+        WHERE D.id = dungeon_id
+        AND D."character" IS NOT NULL
+        AND G.id = gate_id
+        AND G.dungeon = D.id
+        AND D.current_room IN (G.room_from, G.room_to);
+    PERFORM notify_dungeon(
+        live."character",
+        dungeon_id,
+        'follow_gate',
+        ARRAY['character', 'room', 'items', 'enemies', 'gates']
+    );
 END;
 $$ LANGUAGE 'plpgsql';
 
-DROP FUNCTION IF EXISTS take_item(VARCHAR, INTEGER);
-CREATE FUNCTION take_item(user_email VARCHAR(254), item_id INTEGER)
+DROP FUNCTION IF EXISTS follow_gate(VARCHAR, INTEGER);
+CREATE FUNCTION follow_gate(user_email VARCHAR(254), gate_id INTEGER)
+RETURNS TABLE (
+    type VARCHAR,
+    id INTEGER,
+    damage SMALLINT,
+    value SMALLINT,
+    dice SMALLINT,
+    hit BOOLEAN
+) AS $$
+    SELECT * FROM follow_gate_by_id(player_dungeon(user_email), gate_id);
+$$ LANGUAGE 'sql';
+
+DROP FUNCTION IF EXISTS fight_enemy_by_id(INTEGER, INTEGER);
+CREATE FUNCTION fight_enemy_by_id(dungeon_id INTEGER, enemy_id INTEGER)
+RETURNS TABLE (
+    type VARCHAR,
+    id INTEGER,
+    damage SMALLINT,
+    value SMALLINT,
+    dice SMALLINT,
+    hit BOOLEAN
+) AS $$
+DECLARE
+    live dungeons := require_dungeon(dungeon_id);
+BEGIN
+    RETURN QUERY SELECT * FROM fight_by_id(dungeon_id, enemy_id);
+    PERFORM notify_dungeon(
+        live."character", dungeon_id, 'fight_enemy', ARRAY['character', 'enemies']
+    );
+END;
+$$ LANGUAGE 'plpgsql';
+
+DROP FUNCTION IF EXISTS fight_enemy(VARCHAR, INTEGER);
+CREATE FUNCTION fight_enemy(user_email VARCHAR(254), enemy_id INTEGER)
+RETURNS TABLE (
+    type VARCHAR,
+    id INTEGER,
+    damage SMALLINT,
+    value SMALLINT,
+    dice SMALLINT,
+    hit BOOLEAN
+) AS $$
+    SELECT * FROM fight_enemy_by_id(player_dungeon(user_email), enemy_id);
+$$ LANGUAGE 'sql';
+
+DROP FUNCTION IF EXISTS take_item_by_id(INTEGER, INTEGER);
+CREATE FUNCTION take_item_by_id(dungeon_id INTEGER, item_id INTEGER)
 RETURNS INTEGER AS $$
 DECLARE
+    live dungeons := require_dungeon(dungeon_id);
     character_item_id INTEGER;
 BEGIN
-    INSERT INTO character_items ("character", item) (
-        SELECT characters.id, room_items.item
-            FROM room_items JOIN dungeons
-                ON dungeons.current_room = room_items.room
-            JOIN characters
-                ON characters.id = dungeons."character"
-            WHERE characters."user" = user_email
-                AND room_items.id = item_id
-        ) RETURNING id INTO character_item_id;
-    DELETE FROM room_items WHERE room_items.id = item_id;
+    WITH taken AS (
+        DELETE FROM room_items AS RI
+            WHERE RI.id = item_id
+            AND RI.room = live.current_room
+            RETURNING RI.item
+    ) INSERT INTO character_items ("character", item)
+        SELECT live."character", T.item FROM taken AS T
+        RETURNING id INTO character_item_id;
+    UPDATE dungeons SET state_version = state_version + 1
+        WHERE dungeons.id = dungeon_id;
+    PERFORM notify_dungeon(
+        live."character", dungeon_id, 'take_item', ARRAY['bag', 'items']
+    );
     RETURN character_item_id;
 END;
 $$ LANGUAGE 'plpgsql';
 
-DROP FUNCTION IF EXISTS use_item(VARCHAR, INTEGER);
-CREATE FUNCTION use_item(user_email VARCHAR(254), character_item_id INTEGER)
+DROP FUNCTION IF EXISTS take_item(VARCHAR, INTEGER);
+CREATE FUNCTION take_item(user_email VARCHAR(254), item_id INTEGER)
+RETURNS INTEGER AS $$
+    SELECT take_item_by_id(player_dungeon(user_email), item_id);
+$$ LANGUAGE 'sql';
+
+DROP FUNCTION IF EXISTS use_item_by_id(INTEGER, INTEGER);
+CREATE FUNCTION use_item_by_id(dungeon_id INTEGER, character_item_id INTEGER)
 RETURNS VOID AS $$
 DECLARE
-    character_id INTEGER;
+    live dungeons := require_dungeon(dungeon_id);
 BEGIN
-    SELECT id FROM characters WHERE "user" = user_email INTO character_id;
     CASE (
         SELECT category FROM items JOIN character_items
         ON items.id = character_items.item
         WHERE character_items.id = character_item_id
+        AND character_items."character" = live."character"
     ) WHEN 'consumable' THEN
         UPDATE dungeons
             SET (
@@ -593,22 +1134,34 @@ BEGIN
                     room_hit_points_bonus + I.hit_points
                 FROM character_items AS CI JOIN items AS I
                 ON CI.item = I.id
-                WHERE CI."character" = character_id
-                AND CI.id = character_item_id
+                WHERE CI.id = character_item_id
             )
-            WHERE dungeons."character" = character_id;
+            WHERE dungeons.id = dungeon_id;
             DELETE FROM character_items AS CI
                 WHERE CI.id = character_item_id;
     WHEN 'defence' THEN
         UPDATE characters SET equipped_defence_item = character_item_id
-        WHERE characters.id = character_id;
+        WHERE characters.id = live."character";
+        UPDATE dungeons SET state_version = state_version + 1
+        WHERE dungeons.id = dungeon_id;
     WHEN 'attack' THEN
         UPDATE characters SET equipped_attack_item = character_item_id
-        WHERE characters.id = character_id;
+        WHERE characters.id = live."character";
+        UPDATE dungeons SET state_version = state_version + 1
+        WHERE dungeons.id = dungeon_id;
     END CASE;
+    PERFORM notify_dungeon(
+        live."character", dungeon_id, 'use_item', ARRAY['character', 'bag']
+    );
 END;
 $$ LANGUAGE 'plpgsql';
 
+DROP FUNCTION IF EXISTS use_item(VARCHAR, INTEGER);
+CREATE FUNCTION use_item(user_email VARCHAR(254), character_item_id INTEGER)
+RETURNS VOID AS $$
+    SELECT use_item_by_id(player_dungeon(user_email), character_item_id);
+$$ LANGUAGE 'sql';
+
 CREATE OR REPLACE FUNCTION reset_bonuses() RETURNS TRIGGER AS $$
 BEGIN
     UPDATE dungeons SET
@@ -625,71 +1178,70 @@ CREATE TRIGGER room_changed AFTER UPDATE
     WHEN (NEW.current_room IS DISTINCT FROM OLD.current_room)
     EXECUTE PROCEDURE reset_bonuses();
 
-CREATE OR REPLACE FUNCTION room_search(user_email VARCHAR(254)) RETURNS TABLE(
+DROP FUNCTION IF EXISTS room_search_by_id(INTEGER);
+CREATE FUNCTION room_search_by_id(dungeon_id INTEGER) RETURNS TABLE(
     type VARCHAR,
     id INTEGER,
     roll INTEGER
 ) AS $$
 DECLARE
-    character_id INTEGER;
+    live dungeons := require_dungeon(dungeon_id);
     wisdom INTEGER;
-    roll INTEGER;
 BEGIN
-    SELECT C.id FROM characters AS C WHERE "user" = user_email INTO character_id;
-    IF (EXISTS (SELECT room_enemies.enemy FROM room_enemies JOIN dungeons
-        ON room_enemies.room = dungeons.current_room
-        WHERE dungeons."character" = character_id)
+    IF (EXISTS (SELECT RE.enemy FROM room_enemies AS RE
+        WHERE RE.room = live.current_room)
     ) THEN
         RAISE 'cant search, enemies left';
     END IF;
-    IF (SELECT (D.current_bonusless_hp + room_hit_points_bonus) <= 1 FROM dungeons AS D WHERE D."character" = character_id
-    ) THEN
+    IF live.current_bonusless_hp + live.room_hit_points_bonus <= 1 THEN
         RAISE 'cant search, or die';
     END IF;
-    IF (SELECT (D.room_hit_points_bonus > 0) FROM dungeons AS D
-        WHERE D."character" = character_id
-    ) THEN
-        UPDATE dungeons SET room_hit_points_bonus = room_hit_points_bonus - 1 WHERE dungeons."character" = character_id;
+    IF live.room_hit_points_bonus > 0 THEN
+        UPDATE dungeons SET room_hit_points_bonus = room_hit_points_bonus - 1 WHERE dungeons.id = dungeon_id;
     ELSE
-        UPDATE dungeons SET current_bonusless_hp = current_bonusless_hp - 1 WHERE dungeons."character" = character_id;
+        UPDATE dungeons SET current_bonusless_hp = current_bonusless_hp - 1 WHERE dungeons.id = dungeon_id;
     END IF;
-    SELECT C.intellect + D.room_wisdom_bonus
-        FROM characters AS C JOIN dungeons AS D
-        ON C.id = D."character"
-        WHERE C."user" = user_email
+    SELECT C.intellect + live.room_wisdom_bonus
+        FROM characters AS C
+        WHERE C.id = live."character"
         INTO wisdom;
     SELECT CEIL(RANDOM() * 20) INTO roll; 
     IF (roll < wisdom) THEN
         WITH hiddens AS (
             (
                 SELECT 'item' AS type, RI.id FROM room_items AS RI
-                WHERE RI.room = (
-                    SELECT D.current_room FROM dungeons AS D
-                    WHERE D."character" = character_id
-                ) AND
-                RI.hidden = TRUE
+                WHERE RI.room = live.current_room
+                AND RI.hidden = TRUE
+            ) UNION (
+                SELECT 'gate' AS type, G.id FROM gates AS G
+                WHERE G.room_from = live.current_room
+                AND G.hidden = TRUE
             ) UNION (
                 SELECT 'gate' AS type, G.id FROM gates AS G
-                WHERE (
-                    G.room_from = (
-                        SELECT D.current_room FROM dungeons AS D
-                        WHERE D."character" = character_id
-                    ) OR
-                    G.room_to = (
-                        SELECT D.current_room FROM dungeons AS D
-                        WHERE D."character" = character_id
-                    )
-                ) AND G.hidden = TRUE
+                WHERE G.room_to = live.current_room
+                AND G.hidden = TRUE
             )
         ) SELECT H.type, H.id FROM hiddens AS H
             OFFSET RANDOM() * (SELECT COUNT(*) FROM hiddens) LIMIT 1
             INTO type, id;
         IF (type = 'item') THEN
-            UPDATE room_items SET hidden = FALSE WHERE room_items.id = room_search.id;
+            UPDATE room_items SET hidden = FALSE WHERE room_items.id = room_search_by_id.id;
         ELSE
-            UPDATE gates SET hidden = FALSE WHERE gates.id = room_search.id;
+            UPDATE gates SET hidden = FALSE WHERE gates.id = room_search_by_id.id;
         END IF;
     END IF;
+    PERFORM notify_dungeon(
+        live."character", dungeon_id, 'room_search', ARRAY['character', 'items', 'gates']
+    );
     RETURN QUERY SELECT type, id, roll;
 END;
 $$ LANGUAGE 'plpgsql';
+
+DROP FUNCTION IF EXISTS room_search(VARCHAR);
+CREATE FUNCTION room_search(user_email VARCHAR(254)) RETURNS TABLE(
+    type VARCHAR,
+    id INTEGER,
+    roll INTEGER
+) AS $$
+    SELECT * FROM room_search_by_id(player_dungeon(user_email));
+$$ LANGUAGE 'sql';
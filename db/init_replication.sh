@@ -0,0 +1,9 @@
+#!/usr/bin/env bash
+# Lets the db_replica service of docker-compose stream from this server,
+# see replica.sh. Run by the postgres image when it creates the database.
+
+set -e
+
+psql --username="$POSTGRES_USER" --quiet \
+    --command="CREATE ROLE replicator WITH REPLICATION LOGIN"
+echo 'host replication replicator all trust' >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,109 @@
+"""Helpers shared by the Python database tools in this directory.
+
+They talk to postgres directly with psycopg2, using DATABASE_URL like the
+API does. Capturing plans needs a role allowed to LOAD 'auto_explain',
+which usually means a superuser.
+"""
+
+import json
+import os
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+
+DEFAULT_DATABASE_URL = 'postgres://postgres@localhost:5432/dungeon_as_db'
+
+# tables holding rows for every player, as opposed to the game catalog
+PER_PLAYER_TABLES = {
+    'users',
+    'rolls',
+    'characters',
+    'character_items',
+    'dungeons',
+    'dungeons_archive',
+    'rooms',
+    'gates',
+    'room_items',
+    'room_enemies',
+}
+
+
+def connect(dsn=None):
+    return psycopg2.connect(
+        dsn or os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    )
+
+
+class PlanCapture:
+    """Collects the plans auto_explain logs for every nested statement.
+
+    auto_explain messages are sent to the client as LOG notices, which
+    psycopg2 appends to connection.notices. A list there is trimmed to its
+    last 50 notices, fewer than cascading statements log: a deque is not.
+    """
+
+    def __init__(self, connection, analyze=False):
+        self.connection = connection
+        self.analyze = analyze
+        self.connection.notices = deque()
+
+    def enable(self):
+        # SET is transactional: call it again after every rollback
+        with self.connection.cursor() as cursor:
+            cursor.execute("LOAD 'auto_explain'")
+            cursor.execute("SET auto_explain.log_min_duration = 0")
+            cursor.execute("SET auto_explain.log_nested_statements = on")
+            cursor.execute("SET auto_explain.log_format = 'json'")
+            cursor.execute("SET auto_explain.log_analyze = %s",
+                           ('on' if self.analyze else 'off',))
+            cursor.execute("SET auto_explain.log_buffers = %s",
+                           ('on' if self.analyze else 'off',))
+            cursor.execute("SET client_min_messages = log")
+        self.connection.notices.clear()
+
+    @contextmanager
+    def capture(self):
+        """Yields a list that is filled with the plans logged meanwhile."""
+        plans = []
+        self.connection.notices.clear()
+        yield plans
+        for notice in self.connection.notices:
+            start = notice.find('{')
+            if 'plan:' in notice and start != -1:
+                plans.append(json.loads(notice[start:]))
+        self.connection.notices.clear()
+
+
+def plan_nodes(node):
+    """Every node of an EXPLAIN (FORMAT JSON) plan tree, depth first."""
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def seed_players(cursor, count, prefix='seed'):
+    """Creates `count` players, each with a character and a live dungeon,
+    through the same functions the API calls."""
+    cursor.execute('''
+        DO $$
+        DECLARE
+            email VARCHAR;
+            roll_ids INTEGER[];
+        BEGIN
+            FOR i IN 1..%(count)s LOOP
+                email := %(prefix)s || '_' || i || '@example.com';
+                INSERT INTO users (email, nickname, password_hash)
+                VALUES (email, %(prefix)s || '_' || i, 'x');
+                SELECT array_agg(id) FROM get_character_dices(email)
+                    INTO roll_ids;
+                PERFORM create_character(
+                    'seed', 'seeded character',
+                    roll_ids[1], roll_ids[2], roll_ids[3], roll_ids[4],
+                    email
+                );
+                PERFORM create_dungeon(email);
+            END LOOP;
+        END;
+        $$
+    ''', {'count': count, 'prefix': prefix})
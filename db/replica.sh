@@ -0,0 +1,24 @@
+#!/usr/bin/env bash
+# Runs a hot standby of the db service of docker-compose, streaming its
+# changes: the first time it copies it with pg_basebackup, waiting for it
+# to be up, afterwards it resumes from where it was.
+
+set -e
+
+primary=${PRIMARY_HOST:-db}
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    mkdir -p "$PGDATA"
+    chown postgres "$PGDATA"
+    chmod 700 "$PGDATA"
+    until gosu postgres pg_basebackup --host="$primary" --username=replicator \
+        --pgdata="$PGDATA" --wal-method=stream --write-recovery-conf; do
+        echo "waiting for $primary"
+        rm -rf "${PGDATA:?}"/*
+        sleep 1
+    done
+fi
+
+exec docker-entrypoint.sh postgres \
+    -c hot_standby=on \
+    -c shared_preload_libraries=pg_stat_statements
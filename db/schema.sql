@@ -1,4 +1,5 @@
 DROP TABLE IF EXISTS defaults CASCADE;
+DROP TABLE IF EXISTS dungeons_archive CASCADE;
 DROP TABLE IF EXISTS character_items CASCADE;
 DROP TABLE IF EXISTS room_enemies CASCADE;
 DROP TABLE IF EXISTS room_items CASCADE;
@@ -83,7 +84,9 @@ CREATE TABLE rooms (
 
 CREATE TABLE dungeons (
 	id SERIAL PRIMARY KEY,
-	character INTEGER NOT NULL UNIQUE REFERENCES characters(id) ON DELETE CASCADE,
+	-- NULL while the dungeon waits in the pool of pre-generated layouts,
+	-- and once finished
+	character INTEGER UNIQUE REFERENCES characters(id) ON DELETE CASCADE,
     current_bonusless_hp SMALLINT NOT NULL,
 	room_attack_bonus SMALLINT NOT NULL DEFAULT 0,
 	room_defence_bonus SMALLINT NOT NULL DEFAULT 0,
@@ -91,7 +94,12 @@ CREATE TABLE dungeons (
 	room_hit_points_bonus SMALLINT NOT NULL DEFAULT 0,
 	current_room INTEGER REFERENCES rooms(id),
 	final_room INTEGER REFERENCES rooms(id),
-    experience_points INTEGER NOT NULL DEFAULT 0
+    experience_points INTEGER NOT NULL DEFAULT 0,
+    -- bumped on every change of what GET /dungeon shows, see bump_state_version
+    state_version INTEGER NOT NULL DEFAULT 1,
+    -- set by finish_dungeon, the rows are then deleted in batches by
+    -- prune_finished_dungeons
+    finished_at TIMESTAMP
 );
 
 ALTER TABLE rooms ADD CONSTRAINT rooms_dungeon_fkey FOREIGN KEY (dungeon) REFERENCES dungeons(id) ON DELETE CASCADE;
@@ -129,3 +137,39 @@ CREATE TABLE gates (
     UNIQUE (dungeon, room_from, room_to),
     UNIQUE (dungeon, room_to, room_from)
 );
+
+-- What is left of a dungeon once finished, see finish_dungeon
+CREATE TABLE dungeons_archive (
+    dungeon INTEGER PRIMARY KEY,
+    character INTEGER NOT NULL REFERENCES characters(id) ON DELETE CASCADE,
+    experience_points INTEGER NOT NULL,
+    hit_points SMALLINT NOT NULL,
+    final_room_reached BOOLEAN NOT NULL,
+    died BOOLEAN NOT NULL,
+    finished_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Secondary indexes for the per-player lookups done by functions.sql.
+-- characters("user"), dungeons("character") and gates(dungeon, ...) are
+-- already covered by their UNIQUE constraints.
+CREATE INDEX rolls_user_idx ON rolls ("user");
+CREATE INDEX character_items_character_idx ON character_items ("character");
+-- referenced by characters.equipped_*_item: deleting a used item checks them
+CREATE INDEX characters_equipped_defence_item_idx ON characters (equipped_defence_item);
+CREATE INDEX characters_equipped_attack_item_idx ON characters (equipped_attack_item);
+CREATE INDEX rooms_dungeon_idx ON rooms (dungeon);
+-- referenced by rooms: deleting a dungeon's rooms checks them
+CREATE INDEX dungeons_current_room_idx ON dungeons (current_room);
+CREATE INDEX dungeons_final_room_idx ON dungeons (final_room);
+-- pre-generated dungeons waiting to be claimed by create_dungeon
+CREATE INDEX dungeons_pool_idx ON dungeons (id)
+    WHERE "character" IS NULL AND finished_at IS NULL;
+-- finished dungeons waiting to be pruned, oldest first
+CREATE INDEX dungeons_finished_idx ON dungeons (finished_at)
+    WHERE finished_at IS NOT NULL;
+CREATE INDEX room_enemies_room_idx ON room_enemies (room);
+CREATE INDEX room_items_room_idx ON room_items (room);
+-- a gate joins two rooms, it is looked up from either side
+CREATE INDEX gates_room_from_idx ON gates (room_from);
+CREATE INDEX gates_room_to_idx ON gates (room_to);
+CREATE INDEX dungeons_archive_character_idx ON dungeons_archive ("character");
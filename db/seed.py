@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Bulk seed generator for scale testing functions.sql.
+
+Loads, with COPY and in one transaction, a game catalog and a population
+of players sized by --scale. Every unit of scale is:
+
+    1000 users, each with a character and a bag of 3 + --bag items
+    3000 archived dungeons (--archived per player)
+    50 items, 20 enemies and 20 room descriptions in the catalog
+
+--live sets the fraction of the players who also get a live dungeon,
+generated by create_dungeon like the API does. Seeded players log in
+with the password 'seed_password'.
+
+    DATABASE_URL=postgres://postgres@localhost/dungeon_as_db \\
+        ./seed.py --scale 1000    # a million players
+"""
+
+import argparse
+import hashlib
+import hmac
+import io
+import random
+import time
+
+from pgtools import connect
+
+PASSWORD = 'seed_password'
+
+# per unit of scale
+USERS = 1000
+ITEMS = 50
+ENEMIES = 20
+ROOM_DESCRIPTIONS = 20
+
+CATEGORIES = ('attack', 'defence', 'consumable')
+
+
+def password_hash(password, salt='seedsalt'):
+    """The format of the password-hash package used by the API:
+    algorithm$salt$iterations$hmac(salt, password)."""
+    digest = hmac.new(salt.encode(), password.encode(), hashlib.sha1)
+    return 'sha1${}$1${}'.format(salt, digest.hexdigest())
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value)
+
+
+def copy_rows(cursor, table, columns, rows, chunk_size=100000):
+    """COPYs `rows`, tuples of values for `columns`, into `table` a chunk
+    at a time, so memory stays flat however many rows there are."""
+    statement = 'COPY {} ({}) FROM STDIN'.format(table, ', '.join(columns))
+    total = 0
+    while True:
+        buffer = io.StringIO()
+        count = 0
+        for row in rows:
+            buffer.write('\t'.join(copy_value(v) for v in row))
+            buffer.write('\n')
+            count += 1
+            if count == chunk_size:
+                break
+        if count == 0:
+            return total
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        total += count
+
+
+def reserve_ids(cursor, table, count):
+    """Takes `count` ids from the serial of `table`, returns the first."""
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+    sequence, = cursor.fetchone()
+    cursor.execute('SELECT nextval(%s)', (sequence,))
+    first, = cursor.fetchone()
+    cursor.execute('SELECT setval(%s, %s)', (sequence, first + count - 1))
+    return first
+
+
+def stat():
+    return random.randint(-6, 6)
+
+
+def finished_at():
+    # some time in the last year
+    seconds_ago = random.randint(0, 86400 * 365)
+    return time.strftime(
+        '%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - seconds_ago)
+    )
+
+
+def seed_catalog(cursor, scale):
+    copy_rows(cursor, 'items', (
+        'name', 'description', 'attack', 'defence', 'wisdom', 'hit_points',
+        'category'
+    ), (
+        ('item_{}'.format(i), 'seeded item {}'.format(i),
+         stat(), stat(), stat(), stat(), random.choice(CATEGORIES))
+        for i in range(ITEMS * scale)
+    ))
+    copy_rows(cursor, 'enemies', (
+        'name', 'description', 'attack', 'defence', 'initial_hit_points',
+        'damage'
+    ), (
+        ('enemy_{}'.format(i), 'seeded enemy {}'.format(i),
+         random.randint(1, 10), random.randint(0, 6),
+         random.randint(1, 20), random.randint(1, 6))
+        for i in range(ENEMIES * scale)
+    ))
+    copy_rows(cursor, 'rooms_descriptions', ('description',), (
+        ('seeded room {}'.format(i),)
+        for i in range(ROOM_DESCRIPTIONS * scale)
+    ))
+
+
+def seed_players(cursor, players, bag, archived, prefix):
+    """Users, characters with their bags, and archived dungeons."""
+    cursor.execute('''
+        SELECT key, value FROM defaults WHERE key LIKE 'initial\\_%\\_item'
+    ''')
+    initial = dict(cursor.fetchall())
+    initial_items = [
+        initial['initial_defence_item'],
+        initial['initial_attack_item'],
+        initial['initial_consumable_item'],
+    ]
+    cursor.execute('SELECT id FROM items')
+    item_ids = [item for item, in cursor.fetchall()]
+    bag_size = len(initial_items) + bag
+
+    first_character = reserve_ids(cursor, 'characters', players)
+    first_item = reserve_ids(cursor, 'character_items', players * bag_size)
+    first_dungeon = reserve_ids(cursor, 'dungeons', players * archived) \
+        if archived else None
+    email = '{}_{{}}@example.com'.format(prefix).format
+    hashed = password_hash(PASSWORD)
+
+    copy_rows(cursor, 'users', ('email', 'nickname', 'password_hash'), (
+        (email(i), '{}_{}'.format(prefix, i), hashed)
+        for i in range(players)
+    ))
+
+    # characters point to their equipped items, which point back to them:
+    # the equipped item keys are checked once both tables are loaded
+    cursor.execute('''
+        ALTER TABLE characters
+            DROP CONSTRAINT characters_equipped_defence_item_fkey,
+            DROP CONSTRAINT characters_equipped_attack_item_fkey
+    ''')
+    copy_rows(cursor, 'characters', (
+        'id', 'name', 'description', 'experience_points', 'strength',
+        'intellect', 'dexterity', 'constitution', 'equipped_defence_item',
+        'equipped_attack_item', '"user"'
+    ), (
+        (first_character + i, 'seed', 'seeded character',
+         random.randint(0, 1000), random.randint(3, 18),
+         random.randint(3, 18), random.randint(3, 18),
+         random.randint(3, 18), first_item + i * bag_size,
+         first_item + i * bag_size + 1, email(i))
+        for i in range(players)
+    ))
+    copy_rows(cursor, 'character_items', ('id', '"character"', 'item'), (
+        (first_item + i * bag_size + j, first_character + i,
+         initial_items[j] if j < len(initial_items)
+         else random.choice(item_ids))
+        for i in range(players)
+        for j in range(bag_size)
+    ))
+    cursor.execute('''
+        ALTER TABLE characters
+            ADD CONSTRAINT characters_equipped_defence_item_fkey
+                FOREIGN KEY (equipped_defence_item)
+                REFERENCES character_items(id),
+            ADD CONSTRAINT characters_equipped_attack_item_fkey
+                FOREIGN KEY (equipped_attack_item)
+                REFERENCES character_items(id)
+    ''')
+
+    if archived:
+        copy_rows(cursor, 'dungeons_archive', (
+            'dungeon', '"character"', 'experience_points', 'hit_points',
+            'final_room_reached', 'died', 'finished_at'
+        ), (
+            (first_dungeon + i * archived + j, first_character + i,
+             random.randint(0, 200), random.randint(0, 18),
+             random.random() < 0.3, random.random() < 0.5,
+             finished_at())
+            for i in range(players)
+            for j in range(archived)
+        ))
+    return first_character
+
+
+def seed_live_dungeons(cursor, first_character, count):
+    cursor.execute('''
+        SELECT create_dungeon("user") FROM characters
+        WHERE id >= %s AND id < %s
+    ''', (first_character, first_character + count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', default=None,
+                        help='defaults to $DATABASE_URL')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='in thousands of players')
+    parser.add_argument('--bag', type=int, default=2,
+                        help='items in each bag besides the initial ones')
+    parser.add_argument('--archived', type=int, default=3,
+                        help='finished dungeons per player')
+    parser.add_argument('--live', type=float, default=0.01,
+                        help='fraction of the players in a dungeon')
+    parser.add_argument('--prefix', default='seed',
+                        help='of the seeded emails and nicknames')
+    parser.add_argument('--random-seed', type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.random_seed)
+    players = USERS * args.scale
+    connection = connect(args.dsn)
+    with connection, connection.cursor() as cursor:
+        start = time.perf_counter()
+        seed_catalog(cursor, args.scale)
+        print('catalog in {:.1f}s'.format(time.perf_counter() - start))
+
+        start = time.perf_counter()
+        first_character = seed_players(
+            cursor, players, args.bag, args.archived, args.prefix
+        )
+        print('{} players in {:.1f}s'.format(
+            players, time.perf_counter() - start
+        ))
+
+        start = time.perf_counter()
+        live = int(players * args.live)
+        seed_live_dungeons(cursor, first_character, live)
+        print('{} live dungeons in {:.1f}s'.format(
+            live, time.perf_counter() - start
+        ))
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
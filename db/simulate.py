@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+"""Offline simulator of dungeon runs, for balancing data.sql.
+
+Plays many runs at once as NumPy arrays, with the rules of functions.sql:
+dungeons laid out like generate_rooms, characters rolled like
+get_character_dices, fights like fight_by_id (a hit is value + d20 > 12,
+every enemy in the room strikes back each round), room bonuses from
+use_item reset on room change, and searches like room_search_by_id.
+
+Every run follows the same policy along the visible path to the final
+room: in each room drink the last consumable taken when there are enemies
+(--potions), fight the enemies in id order, take the visible items,
+search --searches times taking what is found, then follow the gate. A
+better weapon is equipped when taken. A run is stuck when a fight lasts
+--max-rounds rounds.
+
+    ./simulate.py --runs 1000000 --searches 2 --potions
+    ./simulate.py --dump-catalog catalog.json    # from the database
+    ./simulate.py --catalog catalog.json         # edited, no database
+    ./simulate.py --cross-check 500              # against the functions
+
+The catalog, items, enemies and defaults, is read from DATABASE_URL
+unless --catalog is given. --cross-check plays runs through the functions
+too, each one in a transaction that is rolled back, and fails if a metric
+of the simulation differs from theirs by more than --tolerance standard
+errors.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from pgtools import connect
+
+# generate_rooms
+MAX_ITEMS = 10
+MIN_ENEMIES = 1
+MAX_ENEMIES = 2
+ITEM_HIDDEN = 0.8  # random() > 0.2
+GATE_HIDDEN = 0.5  # random() > 0.5
+
+HIT = 12  # a roll hits when value + dice > HIT
+CATEGORIES = ('defence', 'attack', 'consumable')
+DEFENCE, ATTACK, CONSUMABLE = range(3)
+PLAYING, FINAL, DIED, STUCK = range(4)
+
+ITEM_COLUMNS = ('id', 'attack', 'defence', 'wisdom', 'hit_points', 'category')
+ENEMY_COLUMNS = ('id', 'attack', 'defence', 'initial_hit_points', 'damage')
+
+
+class Catalog:
+    """Items, enemies and defaults, as arrays indexed in id order."""
+
+    def __init__(self, items, enemies, defaults):
+        self.items = {k: np.asarray(v, dtype=np.int32) for k, v in items.items()}
+        self.enemies = {k: np.asarray(v, dtype=np.int32)
+                        for k, v in enemies.items()}
+        self.defaults = defaults
+
+    @classmethod
+    def load(cls, cursor):
+        cursor.execute('''
+            SELECT id, attack, defence, wisdom, hit_points, category::TEXT
+            FROM items ORDER BY id
+        ''')
+        items = dict(zip(ITEM_COLUMNS, map(list, zip(*cursor.fetchall()))))
+        items['category'] = [CATEGORIES.index(c) for c in items['category']]
+        cursor.execute('''
+            SELECT id, attack, defence, initial_hit_points, damage
+            FROM enemies ORDER BY id
+        ''')
+        enemies = dict(zip(ENEMY_COLUMNS, map(list, zip(*cursor.fetchall()))))
+        cursor.execute('SELECT key, value FROM defaults')
+        return cls(items, enemies, dict(cursor.fetchall()))
+
+    @classmethod
+    def read(cls, path):
+        with open(path) as f:
+            catalog = json.load(f)
+        items = {k: [item[k] for item in catalog['items']]
+                 for k in ITEM_COLUMNS}
+        items['category'] = [CATEGORIES.index(c) for c in items['category']]
+        enemies = {k: [enemy[k] for enemy in catalog['enemies']]
+                   for k in ENEMY_COLUMNS}
+        return cls(items, enemies, catalog['defaults'])
+
+    def write(self, path):
+        items = [dict(zip(ITEM_COLUMNS, map(int, row)))
+                 for row in zip(*(self.items[k] for k in ITEM_COLUMNS))]
+        for item in items:
+            item['category'] = CATEGORIES[item['category']]
+        enemies = [dict(zip(ENEMY_COLUMNS, map(int, row)))
+                   for row in zip(*(self.enemies[k] for k in ENEMY_COLUMNS))]
+        with open(path, 'w') as f:
+            json.dump({
+                'items': items,
+                'enemies': enemies,
+                'defaults': self.defaults,
+            }, f, indent=2)
+
+    def default(self, key, value):
+        return self.defaults.get(key, value)
+
+    def item(self, item_id):
+        """The index of an item id."""
+        return int(np.searchsorted(self.items['id'], item_id))
+
+    def pick(self, table, rng, shape):
+        """Indexes sampled like generate_rooms: the first id at or above a
+        uniform target between the smallest and largest id."""
+        ids = table['id']
+        return np.searchsorted(ids, rng.integers(ids[0], ids[-1] + 1, shape))
+
+    def path_length(self):
+        """Rooms on the path before the final room."""
+        n_rooms = max(self.default('dungeon_rooms', 10), 2)
+        return min(max(self.default('dungeon_path_rooms', 5), 2), n_rooms) - 1
+
+
+class Summary:
+    """Counts over runs, from the simulation or the functions, and the
+    metrics computed from them."""
+
+    COUNTS = (
+        'runs', 'final', 'died', 'stuck', 'rounds', 'rounds_squared',
+        'attack_rolls', 'attack_hits', 'defence_rolls', 'defence_hits',
+        'searches', 'found_items', 'found_gates', 'final_hp',
+        'final_hp_squared',
+    )
+
+    def __init__(self, path_length):
+        self.counts = dict.fromkeys(self.COUNTS, 0)
+        self.died_in = [0] * path_length
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] += int(value)
+
+    def metrics(self):
+        """name => (value, variance of one sample, samples)."""
+        c = self.counts
+
+        def proportion(hits, n):
+            p = hits / n if n else 0.0
+            return p, p * (1 - p), n
+
+        def mean(total, squared, n):
+            m = total / n if n else 0.0
+            return m, (squared / n - m * m) if n else 0.0, n
+
+        metrics = {
+            'reached the final room': proportion(c['final'], c['runs']),
+            'died': proportion(c['died'], c['runs']),
+            'stuck': proportion(c['stuck'], c['runs']),
+        }
+        for room, died in enumerate(self.died_in):
+            metrics['died in room {}'.format(room)] = \
+                proportion(died, c['runs'])
+        metrics.update({
+            'attack hit rate': proportion(c['attack_hits'], c['attack_rolls']),
+            'enemy hit rate': proportion(c['defence_hits'], c['defence_rolls']),
+            'fight rounds per run':
+                mean(c['rounds'], c['rounds_squared'], c['runs']),
+            'hit points at the final room':
+                mean(c['final_hp'], c['final_hp_squared'], c['final']),
+            'items found per search':
+                proportion(c['found_items'], c['searches']),
+            'gates found per search':
+                proportion(c['found_gates'], c['searches']),
+        })
+        return metrics
+
+
+def simulate_batch(catalog, rng, n, policy, summary):
+    """Plays n runs and adds them to summary."""
+    items, enemies = catalog.items, catalog.enemies
+    n_rooms = max(catalog.default('dungeon_rooms', 10), 2)
+    gates_per_room = catalog.default('dungeon_gates_per_room', 2)
+    path_length = catalog.path_length()
+    others = n_rooms - 1  # the rooms but the final one, path first
+    rows = np.arange(n)
+
+    # the rooms on the path, the only ones visited
+    slots = np.arange(MAX_ITEMS)
+    room_items = catalog.pick(items, rng, (n, path_length, MAX_ITEMS))
+    item_count = rng.integers(0, MAX_ITEMS + 1, (n, path_length))
+    item_present = slots < item_count[..., None]
+    item_hidden = item_present \
+        & (rng.random((n, path_length, MAX_ITEMS)) < ITEM_HIDDEN)
+    room_enemies = catalog.pick(enemies, rng, (n, path_length, MAX_ENEMIES))
+    enemy_count = rng.integers(MIN_ENEMIES, MAX_ENEMIES + 1, (n, path_length))
+    enemy_present = np.arange(MAX_ENEMIES) < enemy_count[..., None]
+
+    # hidden random gates, found by searching either of their rooms
+    attempt_room = np.repeat(np.arange(others), gates_per_room)
+    attempt_other = rng.integers(0, others, (n, attempt_room.size))
+    low = np.minimum(attempt_room, attempt_other)
+    high = np.maximum(attempt_room, attempt_other)
+    on_path = (high == low + 1) & (high <= path_length - 1)
+    code = np.where((low != high) & ~on_path, low * others + high, -1)
+    code.sort(axis=1)
+    distinct = np.ones(code.shape, dtype=bool)
+    distinct[:, 1:] = code[:, 1:] != code[:, :-1]
+    hidden = distinct & (code >= 0) & (rng.random(code.shape) < GATE_HIDDEN)
+    gate_rows = np.broadcast_to(rows[:, None], code.shape)[hidden]
+    hidden_gates = np.zeros((n, others), dtype=np.int32)
+    np.add.at(hidden_gates, (gate_rows, code[hidden] // others), 1)
+    np.add.at(hidden_gates, (gate_rows, code[hidden] % others), 1)
+
+    # characters: four rolls of 3d6 for strength, intellect, dexterity and
+    # constitution, hit points as much as constitution
+    strength, intellect, dexterity, constitution = \
+        rng.integers(1, 7, (4, n, 3)).sum(axis=2)
+    hp = constitution.copy()
+    weapon = np.full(n, items['hit_points'][
+        catalog.item(catalog.default('initial_attack_item', 2))])
+    # a stack of consumables, with room for one more than can be taken
+    bag = np.zeros((n, 2 + path_length * MAX_ITEMS), dtype=np.int64)
+    bag[:, 0] = catalog.item(catalog.default('initial_consumable_item', 3))
+    bag_size = np.ones(n, dtype=np.int64)
+
+    outcome = np.full(n, PLAYING)
+    rounds = np.zeros(n, dtype=np.int64)
+    counts = dict.fromkeys((
+        'attack_rolls', 'attack_hits', 'defence_rolls', 'defence_hits',
+        'searches', 'found_items', 'found_gates'), 0)
+
+    def take(mask, item):
+        """take_item, then use_item on a better weapon."""
+        category = items['category'][item]
+        damage = items['hit_points'][item]
+        better = mask & (category == ATTACK) & (damage > weapon)
+        weapon[better] = damage[better]
+        consumable = mask & (category == CONSUMABLE)
+        bag[rows[consumable], bag_size[consumable]] = item[consumable]
+        bag_size[consumable] += 1
+
+    for room in range(path_length):
+        bonus_attack = np.zeros(n, dtype=np.int64)
+        bonus_defence = np.zeros(n, dtype=np.int64)
+        bonus_wisdom = np.zeros(n, dtype=np.int64)
+        bonus_hp = np.zeros(n, dtype=np.int64)
+        kinds = room_enemies[:, room]
+        enemy_hp = np.where(enemy_present[:, room],
+                            enemies['initial_hit_points'][kinds], 0)
+        alive = enemy_present[:, room] & (enemy_hp > 0)
+
+        if policy.potions:
+            drink = (outcome == PLAYING) & alive.any(axis=1) & (bag_size > 0)
+            bag_size[drink] -= 1
+            potion = bag[rows, bag_size]
+            bonus_attack += np.where(drink, items['attack'][potion], 0)
+            bonus_defence += np.where(drink, items['defence'][potion], 0)
+            bonus_wisdom += np.where(drink, items['wisdom'][potion], 0)
+            bonus_hp += np.where(drink, items['hit_points'][potion], 0)
+
+        for _ in range(policy.max_rounds):
+            fighting = (outcome == PLAYING) & alive.any(axis=1)
+            if not fighting.any():
+                break
+            # the rolls of a round are made together: an enemy killed by
+            # the attack still strikes back
+            target = alive.argmax(axis=1)
+            value = (strength + dexterity) // 2 + bonus_attack \
+                - enemies['defence'][kinds[rows, target]]
+            hit = fighting & (value + rng.integers(1, 21, n) > HIT)
+            enemy_hp[rows, target] -= np.where(hit, weapon, 0)
+            striking = fighting[:, None] & alive
+            value = enemies['attack'][kinds] \
+                - ((constitution + dexterity) // 2 + bonus_defence)[:, None]
+            struck = striking \
+                & (value + rng.integers(1, 21, (n, MAX_ENEMIES)) > HIT)
+            damage = np.where(struck, enemies['damage'][kinds], 0).sum(axis=1)
+            hp = np.where(fighting, np.maximum(hp - damage, 0), hp)
+            alive &= enemy_hp > 0
+            rounds += fighting
+            counts['attack_rolls'] += fighting.sum()
+            counts['attack_hits'] += hit.sum()
+            counts['defence_rolls'] += striking.sum()
+            counts['defence_hits'] += struck.sum()
+            died = fighting & (hp <= 0)
+            outcome[died] = DIED
+            summary.died_in[room] += int(died.sum())
+        outcome[(outcome == PLAYING) & alive.any(axis=1)] = STUCK
+
+        for slot in range(MAX_ITEMS):
+            take((outcome == PLAYING) & item_present[:, room, slot]
+                 & ~item_hidden[:, room, slot], room_items[:, room, slot])
+
+        hidden_items = item_hidden[:, room].copy()
+        gates_left = hidden_gates[:, room].copy()
+        for _ in range(policy.searches):
+            searching = (outcome == PLAYING) & (hp + bonus_hp > 1)
+            from_bonus = searching & (bonus_hp > 0)
+            bonus_hp -= from_bonus
+            hp -= searching & ~from_bonus
+            roll = rng.integers(1, 21, n)
+            n_items = hidden_items.sum(axis=1)
+            pool = n_items + gates_left
+            # OFFSET random() * count rounds to the nearest: half the time
+            # the last offset is past the end and nothing is found. The
+            # order of the hidden things is unspecified, taken as random.
+            found = searching & (roll < intellect + bonus_wisdom) & (pool > 0) \
+                & (np.rint(rng.random(n) * pool) < pool)
+            pick = (rng.random(n) * pool).astype(np.int64)
+            found_item = found & (pick < n_items)
+            slot = (hidden_items.cumsum(axis=1) > pick[:, None]).argmax(axis=1)
+            hidden_items[rows[found_item], slot[found_item]] = False
+            take(found_item, room_items[rows, room, slot])
+            gates_left -= found & ~found_item
+            counts['searches'] += searching.sum()
+            counts['found_items'] += found_item.sum()
+            counts['found_gates'] += (found & ~found_item).sum()
+
+        if room == path_length - 1:
+            outcome[outcome == PLAYING] = FINAL
+
+    final = outcome == FINAL
+    summary.add(
+        runs=n,
+        final=final.sum(),
+        died=(outcome == DIED).sum(),
+        stuck=(outcome == STUCK).sum(),
+        rounds=rounds.sum(),
+        rounds_squared=(rounds ** 2).sum(),
+        final_hp=hp[final].sum(),
+        final_hp_squared=(hp[final].astype(np.int64) ** 2).sum(),
+        **counts
+    )
+
+
+def simulate(catalog, runs, batch, policy, seed):
+    rng = np.random.default_rng(seed)
+    summary = Summary(catalog.path_length())
+    done = 0
+    while done < runs:
+        n = min(batch, runs - done)
+        simulate_batch(catalog, rng, n, policy, summary)
+        done += n
+    return summary
+
+
+def play_live(cursor, catalog, policy, index, summary):
+    """Plays a run through the functions with the policy of the simulation.
+    The caller rolls it back."""
+    path_length = catalog.path_length()
+    email = 'simulate_{}@example.com'.format(index)
+    cursor.execute("INSERT INTO users VALUES (%s, %s, 'x')",
+                   (email, 'simulate_{}'.format(index)))
+    cursor.execute('SELECT id FROM get_character_dices(%s)', (email,))
+    rolls = [roll for roll, in cursor.fetchall()]
+    cursor.execute('''
+        SELECT create_character('simulate', 'simulated', %s, %s, %s, %s, %s)
+    ''', (*rolls[:4], email))
+    # what create_dungeon does with an empty pool: each run is rolled
+    # back, claiming from the pool would play the same layout every time
+    cursor.execute('SELECT generate_dungeon()')
+    dungeon, = cursor.fetchone()
+    cursor.execute('''
+        UPDATE dungeons AS D SET
+            "character" = C.id,
+            current_bonusless_hp = C.constitution
+        FROM characters AS C
+        WHERE D.id = %s AND C."user" = %s
+        RETURNING D.final_room
+    ''', (dungeon, email))
+    final_room, = cursor.fetchone()
+    cursor.execute('''
+        SELECT id FROM rooms WHERE dungeon = %s AND id != %s
+        ORDER BY id LIMIT %s
+    ''', (dungeon, final_room, path_length))
+    path = [room for room, in cursor.fetchall()] + [final_room]
+
+    weapon = int(catalog.items['hit_points'][
+        catalog.item(catalog.default('initial_attack_item', 2))])
+    cursor.execute('''
+        SELECT CI.id FROM character_items AS CI
+        JOIN characters AS C ON C.id = CI."character"
+        WHERE C."user" = %s AND CI.item = %s
+    ''', (email, catalog.default('initial_consumable_item', 3)))
+    bag = [item for item, in cursor.fetchall()]
+    rounds = 0
+
+    def state():
+        cursor.execute('''
+            SELECT get_dungeon_parts_by_id(
+                %s, ARRAY['character', 'items', 'enemies']
+            )
+        ''', (dungeon,))
+        return cursor.fetchone()[0]
+
+    def take(room_item):
+        nonlocal weapon
+        cursor.execute('SELECT item FROM room_items WHERE id = %s',
+                       (room_item,))
+        item = catalog.item(cursor.fetchone()[0])
+        cursor.execute('SELECT take_item_by_id(%s, %s)', (dungeon, room_item))
+        character_item, = cursor.fetchone()
+        category = catalog.items['category'][item]
+        damage = int(catalog.items['hit_points'][item])
+        if category == ATTACK and damage > weapon:
+            cursor.execute('SELECT use_item_by_id(%s, %s)',
+                           (dungeon, character_item))
+            weapon = damage
+        elif category == CONSUMABLE:
+            bag.append(character_item)
+
+    def finish(**counts):
+        summary.add(runs=1, rounds=rounds, rounds_squared=rounds ** 2,
+                    **counts)
+
+    current = state()
+    for room in range(path_length):
+        enemies = sorted(e['id'] for e in current['enemies'])
+        if policy.potions and enemies and bag:
+            cursor.execute('SELECT use_item_by_id(%s, %s)',
+                           (dungeon, bag.pop()))
+        fought = 0
+        while enemies and fought < policy.max_rounds:
+            cursor.execute('SELECT type, hit FROM fight_enemy_by_id(%s, %s)',
+                           (dungeon, enemies[0]))
+            for kind, hit in cursor.fetchall():
+                prefix = 'attack' if kind == 'attacking' else 'defence'
+                summary.add(**{prefix + '_rolls': 1, prefix + '_hits': hit})
+            fought += 1
+            rounds += 1
+            current = state()
+            if current is None:
+                summary.died_in[room] += 1
+                return finish(died=1)
+            enemies = sorted(e['id'] for e in current['enemies'])
+        if enemies:
+            return finish(stuck=1)
+
+        for item in sorted(i['id'] for i in current['items']):
+            take(item)
+        for _ in range(policy.searches):
+            if state()['character']['hit_points'] <= 1:
+                break
+            cursor.execute('SELECT type, id FROM room_search_by_id(%s)',
+                           (dungeon,))
+            kind, found = cursor.fetchone()
+            summary.add(searches=1)
+            if found is not None and kind == 'item':
+                summary.add(found_items=1)
+                take(found)
+            elif found is not None:
+                summary.add(found_gates=1)
+
+        cursor.execute('''
+            SELECT id FROM gates WHERE room_from = %s AND room_to = %s
+        ''', (path[room], path[room + 1]))
+        gate, = cursor.fetchone()
+        cursor.execute('SELECT * FROM follow_gate_by_id(%s, %s)',
+                       (dungeon, gate))
+        current = state()
+    hp = current['character']['hit_points']
+    finish(final=1, final_hp=hp, final_hp_squared=hp * hp)
+
+
+def play_live_runs(connection, catalog, policy, runs):
+    summary = Summary(catalog.path_length())
+    with connection.cursor() as cursor:
+        for index in range(runs):
+            play_live(cursor, catalog, policy, index, summary)
+            connection.rollback()
+    return summary
+
+
+def cross_check(simulated, live, tolerance):
+    """Prints both summaries side by side; returns the metrics differing by
+    more than tolerance standard errors."""
+    differing = []
+    sim_metrics, live_metrics = simulated.metrics(), live.metrics()
+    print('{:<32} {:>10} {:>10} {:>6}'.format(
+        'metric', 'simulated', 'functions', 'z'))
+    for name, (value, variance, n) in sim_metrics.items():
+        live_value, live_variance, live_n = live_metrics[name]
+        if not n or not live_n:
+            print('{:<32} {:>10} {:>10}'.format(name, '-', '-'))
+            continue
+        error = math.sqrt(variance / n + live_variance / live_n)
+        if error:
+            z = abs(value - live_value) / error
+        else:
+            z = 0.0 if value == live_value else math.inf
+        flag = ''
+        if z > tolerance:
+            differing.append(name)
+            flag = ' differs'
+        print('{:<32} {:>10.4f} {:>10.4f} {:>6.1f}{}'.format(
+            name, value, live_value, z, flag))
+    return differing
+
+
+def print_summary(summary):
+    for name, (value, variance, n) in summary.metrics().items():
+        print('{:<32} {:>10.4f}  (n={})'.format(name, value, n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', default=None,
+                        help='defaults to $DATABASE_URL')
+    parser.add_argument('--catalog', metavar='FILE',
+                        help='read the catalog from a JSON file')
+    parser.add_argument('--dump-catalog', metavar='FILE',
+                        help='write the catalog of the database and exit')
+    parser.add_argument('--runs', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=100000,
+                        help='runs simulated at once')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--searches', type=int, default=0,
+                        help='searches in each room')
+    parser.add_argument('--potions', action='store_true',
+                        help='drink a consumable before fighting')
+    parser.add_argument('--max-rounds', type=int, default=100)
+    parser.add_argument('--cross-check', type=int, default=0, metavar='RUNS',
+                        help='also play this many runs through the functions')
+    parser.add_argument('--tolerance', type=float, default=4.0,
+                        help='standard errors allowed by --cross-check')
+    parser.add_argument('--json', action='store_true',
+                        help='print the counts as JSON')
+    args = parser.parse_args()
+
+    connection = None
+    if args.catalog:
+        catalog = Catalog.read(args.catalog)
+    else:
+        connection = connect(args.dsn)
+        with connection.cursor() as cursor:
+            catalog = Catalog.load(cursor)
+        connection.rollback()
+    if args.dump_catalog:
+        catalog.write(args.dump_catalog)
+        return
+
+    start = time.perf_counter()
+    simulated = simulate(
+        catalog, args.runs, args.batch, args, args.seed
+    )
+    print('{} runs simulated in {:.1f}s'.format(
+        args.runs, time.perf_counter() - start), file=sys.stderr)
+
+    if not args.cross_check:
+        if args.json:
+            json.dump({'counts': simulated.counts,
+                       'died_in': simulated.died_in}, sys.stdout, indent=2)
+            print()
+        else:
+            print_summary(simulated)
+        return
+
+    if connection is None:
+        connection = connect(args.dsn)
+    start = time.perf_counter()
+    live = play_live_runs(connection, catalog, args, args.cross_check)
+    connection.close()
+    print('{} runs played through the functions in {:.1f}s'.format(
+        args.cross_check, time.perf_counter() - start), file=sys.stderr)
+    differing = cross_check(simulated, live, args.tolerance)
+    sys.exit(1 if differing else 0)
+
+
+if __name__ == '__main__':
+    main()
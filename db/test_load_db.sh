@@ -1,4 +1,4 @@
 #!/bin/sh
 
-./docker_init_db.sh schema.sql functions.sql data.sql # && \
+./bootstrap.sh # && \
 # curl -u test@example.com:test_password localhost:8000/dices -I
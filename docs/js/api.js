@@ -110,6 +110,67 @@ var api = function() {
         return ajax(options);
     };
 
+    // Streams the Server-Sent Events of url, read with fetch: EventSource
+    // can not send the Authorization header. Calls onMessage with the data
+    // of each event, and with {refetch: true} once a dropped stream is open
+    // again, as events may have been missed meanwhile. Calls onOpen with
+    // true when a stream opens, with false when it is refused, fails or
+    // ends; refused ones (no dungeon, logged out) are not retried. Returns
+    // false when the browser can not read streams.
+    var events = function(url, onMessage, onOpen) {
+        if (!window.fetch || !window.TextDecoder || !window.ReadableStream) {
+            return false;
+        }
+        var connect = function(reconnecting) {
+            var reconnect = function() {
+                onOpen(false);
+                setTimeout(function() {
+                    connect(true);
+                }, 1000);
+            };
+            fetch(apiUrl + '/' + url, {
+                headers: {
+                    'Authorization': 'Basic ' + btoa(email + ':' + password)
+                }
+            }).then(response => {
+                if (!response.ok) {
+                    onOpen(false);
+                    return;
+                }
+                onOpen(true);
+                if (reconnecting) {
+                    onMessage({refetch: true});
+                }
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                var buffer = '';
+                var read = function() {
+                    return reader.read().then(chunk => {
+                        if (chunk.done) {
+                            return reconnect();
+                        }
+                        buffer += decoder.decode(chunk.value, {stream: true});
+                        const messages = buffer.split('\n\n');
+                        buffer = messages.pop();
+                        messages.forEach(message => {
+                            const data = message.split('\n')
+                                .filter(line => line.startsWith('data:'))
+                                .map(line => line.slice(5))
+                                .join('\n');
+                            if (data) {
+                                onMessage(JSON.parse(data));
+                            }
+                        });
+                        return read();
+                    });
+                };
+                return read();
+            }).catch(reconnect);
+        };
+        connect(false);
+        return true;
+    };
+
     var logout = function() {
         localStorage.removeItem('email');
         localStorage.removeItem('password');
@@ -127,6 +188,7 @@ var api = function() {
         get: get,
         post: post,
         del: del,
+        events: events,
         ifLogged: ifLogged,
         ifNotLogged: ifNotLogged,
         ifHasCharacter: ifHasCharacter,
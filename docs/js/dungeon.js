@@ -1,5 +1,6 @@
 var dungeon = function() {
     var dungeonStatus;
+    var streaming = false;
 
     var init = function() {
         api.ifNotLogged(function () {
@@ -18,6 +19,11 @@ var dungeon = function() {
         getDungeonStatus().then(dungeonStatus => {
             updateDungeonStatus(dungeonStatus);
         });
+        api.ifLogged(function() {
+            api.events('dungeon/events', changeHandler, open => {
+                streaming = open;
+            });
+        });
         $('#button-logout').click(logoutHandler);
         $('#button-end-dungeon').click(endDungeonHandler);
         $('#button-delete-user').click(deleteUserHandler);
@@ -67,7 +73,7 @@ var dungeon = function() {
                 api.post({
                     url: `dungeon/item/${itemToPick}`,
                     success: () => {
-                        getDungeonStatus().then(dungeonStatus => {
+                        refresh(dungeonStatus => {
                             updateCharacterBag(dungeonStatus);
                             updateRoomItems(dungeonStatus);
                         });
@@ -107,7 +113,7 @@ var dungeon = function() {
                 api.post({
                     url: `dungeon/bag/${itemToUse}`,
                     success: () => {
-                        getDungeonStatus().then(dungeonStatus => {
+                        refresh(dungeonStatus => {
                             updateCharacterBag(dungeonStatus);
                             updateCharacter(dungeonStatus);
                         });
@@ -122,7 +128,7 @@ var dungeon = function() {
         api.get({
             url: 'dungeon/search',
             success: data => {
-                getDungeonStatus().then(s => {
+                refresh(s => {
                     updateCharacter(s);
                     updateCharacterBag(s);
                     updateGates(s);
@@ -167,7 +173,7 @@ var dungeon = function() {
                 api.get({
                     url: `dungeon/gate/${gateToRunTo}`,
                     success: fights => {
-                        getDungeonStatus().then(dungeonStatus => {
+                        refresh(dungeonStatus => {
                             updateDungeonStatus(dungeonStatus);
                         });
                         window.alert(fights.map(fight => {
@@ -212,7 +218,7 @@ var dungeon = function() {
             api.post({
                 url: `dungeon/enemy/${enemyToFight}`,
                 success: fights => {
-                    getDungeonStatus().then(dungeonStatus => {
+                    refresh(dungeonStatus => {
                         updateEnemies(dungeonStatus);
                         updateCharacter(dungeonStatus);
                     });
@@ -427,12 +433,53 @@ var dungeon = function() {
         redirect.redirect('login');
     };
 
+    // after an action: the events stream brings its changes, without one
+    // the state is fetched again
+    var refresh = function(update) {
+        if (!streaming) {
+            getDungeonStatus().then(update);
+        }
+    };
+
+    // merges a change into the state: objects are merged, anything else,
+    // arrays too, replaced
+    var merge = function(state, change) {
+        Object.keys(change).forEach(key => {
+            const value = change[key];
+            if (value && typeof value === 'object' && !Array.isArray(value)
+                && state[key]
+            ) {
+                merge(state[key], value);
+            } else {
+                state[key] = value;
+            }
+        });
+        return state;
+    };
+
+    var changeHandler = function(change) {
+        if (change.state === null) {
+            // the character died
+            redirect.redirect('dashboard');
+        } else if (change.refetch || !dungeonStatus) {
+            getDungeonStatus().then(dungeonStatus => {
+                updateDungeonStatus(dungeonStatus);
+            });
+        } else {
+            updateDungeonStatus(merge(dungeonStatus, change.state));
+        }
+    };
+
     var getDungeonStatus = function() {
+        // jQuery sends the ETag of the last answer, a 304 keeps the state
         return api.get({
             url: 'dungeon',
-            success: (data => {
+            ifModified: true
+        }).then((data, textStatus) => {
+            if (textStatus !== 'notmodified') {
                 dungeonStatus = data;
-            })
+            }
+            return dungeonStatus;
         });
     };
 